@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Autocorrelación espacial entre corregimientos: I de Moran y Gi* de Getis-Ord
+
+Usa el grafo de contigüidad que precalcula preparar_geo.py
+(data/geo/vecinos_queen.npz / vecinos_rook.npz, CSR) y lo recorre con
+sumas acumuladas de NumPy: el rezago espacial de todas las permutaciones
+de un lote sale de una sola operación, sin bucles por corregimiento.
+
+    I de Moran   ¿la variable se agrupa en el territorio? (pesos
+                 estandarizados por fila; significancia por permutaciones)
+    Gi*          puntos calientes y fríos: corregimientos cuyo vecindario
+                 (incluido él mismo) suma más o menos de lo esperado;
+                 pseudo p por permutaciones condicionales
+
+Clases de punto caliente (hotspot_clase): ±3, ±2, ±1 con p < 0.01, 0.05,
+0.10 según el signo de z; 0 = no significativo. Es la métrica "hotspots"
+de choropleth_cobertura.py.
+
+Uso:
+    python autocorrelacion.py                           # gap, cobertura_pct y cobertura_menores_pct
+    python autocorrelacion.py --columnas gap --contiguidad rook --permutaciones 9999
+"""
+
+import argparse
+import os
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+import preparar_geo
+
+GEOPARQUET_PATH = "data/geo/corregimientos.parquet"
+
+COLUMNAS = ["gap", "cobertura_pct", "cobertura_menores_pct"]
+
+PERMUTACIONES = 999
+
+# Elementos (corregimientos × permutaciones × vecinos) por lote de Gi*
+LOTE_PERMUTACIONES = 4_000_000
+
+# Significancia (pseudo p) de cada nivel de clase
+NIVELES = [(0.01, 3), (0.05, 2), (0.10, 1)]
+
+# Clase → etiqueta, de la más fría a la más caliente
+CLASES_HOTSPOT = {
+    -3: "Punto frío (99%)",
+    -2: "Punto frío (95%)",
+    -1: "Punto frío (90%)",
+    0: "No significativo",
+    1: "Punto caliente (90%)",
+    2: "Punto caliente (95%)",
+    3: "Punto caliente (99%)",
+}
+
+
+@dataclass
+class Grafo:
+    """Vecinos en CSR: los de la fila k son indices[indptr[k]:indptr[k + 1]]"""
+    ids: np.ndarray
+    indptr: np.ndarray
+    indices: np.ndarray
+
+    @property
+    def n(self) -> int:
+        return len(self.ids)
+
+    @property
+    def cardinalidad(self) -> np.ndarray:
+        return np.diff(self.indptr)
+
+    def rezago(self, valores) -> np.ndarray:
+        """Suma de los valores de los vecinos de cada fila
+
+        valores de forma (n,) o (lotes, n): todas las filas y lotes a la vez
+        (sumas acumuladas sobre los vecinos, filas sin vecinos → 0).
+        """
+        valores = np.asarray(valores, dtype=float)
+        acumulado = np.cumsum(valores[..., self.indices], axis=-1)
+        acumulado = np.concatenate([np.zeros(valores.shape[:-1] + (1,)), acumulado], axis=-1)
+        return acumulado[..., self.indptr[1:]] - acumulado[..., self.indptr[:-1]]
+
+    def alinear(self, ids) -> "Grafo":
+        """El grafo restringido a ids y en su orden (vecinos fuera de ids se descartan)"""
+        ids = np.asarray(ids, dtype="int64")
+        posicion = {int(i): k for k, i in enumerate(ids)}
+        mapa = np.array([posicion.get(int(i), -1) for i in self.ids], dtype="int64")
+        filas = mapa[np.repeat(np.arange(self.n), self.cardinalidad)]
+        columnas = mapa[self.indices]
+        validas = (filas >= 0) & (columnas >= 0)
+        indptr, indices = preparar_geo.matriz_csr(len(ids), filas[validas], columnas[validas])
+        return Grafo(ids, indptr, indices)
+
+
+def cargar_grafo(contiguidad: str = "queen", path: str = GEOPARQUET_PATH, ids=None):
+    """Grafo de preparar_geo.py (alineado a ids si se indican); None si falta o está viejo"""
+    ruta = preparar_geo.ruta_vecinos(path, contiguidad)
+    if not os.path.exists(ruta):
+        print(f"   ⚠️ No existe {ruta} (ejecutar preparar_geo.py)")
+        return None
+    datos = np.load(ruta)
+    if str(datos["huella"]) != preparar_geo.huella_archivo(path):
+        print(f"   ⚠️ La geometría cambió desde preparar_geo.py; {ruta} no corresponde")
+        return None
+    grafo = Grafo(datos["ids"], datos["indptr"], datos["indices"])
+    return grafo if ids is None else grafo.alinear(ids)
+
+
+def _validos(valores, grafo: Grafo):
+    """Valores finitos y el grafo restringido a ellos"""
+    valores = np.asarray(valores, dtype=float)
+    validos = np.isfinite(valores)
+    if validos.all():
+        return valores, grafo, validos
+    return valores[validos], grafo.alinear(grafo.ids[validos]), validos
+
+
+def _pseudo_p(mayores, permutaciones: int):
+    """Pseudo p de una cola (la del lado observado): (extremos + 1) / (permutaciones + 1)"""
+    extremos = np.minimum(mayores, permutaciones - mayores)
+    return (extremos + 1) / (permutaciones + 1)
+
+
+def moran(valores, grafo: Grafo, permutaciones: int = PERMUTACIONES, semilla: int = 0) -> dict:
+    """I de Moran global con pesos estandarizados por fila
+
+    Las permutaciones se evalúan en lotes: cada fila del lote es una
+    permutación de los valores y el rezago de todas sale de un rezago().
+    Valores faltantes se excluyen (y sus aristas del grafo).
+    """
+    x, grafo, _ = _validos(valores, grafo)
+    n = len(x)
+    k = grafo.cardinalidad
+    con_vecinos = k > 0
+    divisor = np.where(con_vecinos, k, 1)
+    s0 = con_vecinos.sum()
+    esperado = -1 / (n - 1)
+
+    def estadistico(z):
+        # z de forma (..., n) centrada
+        return n / s0 * (z * grafo.rezago(z) / divisor).sum(axis=-1) / (z * z).sum(axis=-1)
+
+    z = x - x.mean()
+    if s0 == 0 or not (z * z).sum():
+        return {"I": np.nan, "esperado": esperado, "z_sim": np.nan, "p_sim": np.nan, "n": n}
+    observado = estadistico(z)
+
+    rng = np.random.default_rng(semilla)
+    lote = max(1, LOTE_PERMUTACIONES // max(len(grafo.indices), n))
+    simulados = []
+    for inicio in range(0, permutaciones, lote):
+        cuantas = min(lote, permutaciones - inicio)
+        simulados.append(estadistico(rng.permuted(np.tile(z, (cuantas, 1)), axis=1)))
+    simulados = np.concatenate(simulados) if simulados else np.array([])
+
+    return {
+        "I": float(observado),
+        "esperado": esperado,
+        "z_sim": float((observado - simulados.mean()) / simulados.std()) if permutaciones else np.nan,
+        "p_sim": float(_pseudo_p((simulados >= observado).sum(), permutaciones)) if permutaciones else np.nan,
+        "n": n,
+    }
+
+
+def clases_hotspot(z, p) -> np.ndarray:
+    """±3/±2/±1 según p (NIVELES) y el signo de z; 0 si no es significativo, NaN si falta"""
+    z = np.asarray(z, dtype=float)
+    p = np.asarray(p, dtype=float)
+    nivel = np.zeros(len(z))
+    for umbral, valor in reversed(NIVELES):
+        nivel[p < umbral] = valor
+    clases = np.sign(z) * nivel
+    clases[np.isnan(z) | np.isnan(p)] = np.nan
+    return clases
+
+
+def getis_ord(valores, grafo: Grafo, permutaciones: int = PERMUTACIONES, semilla: int = 0) -> dict:
+    """Gi* (pesos binarios, incluye al propio corregimiento) de cada corregimiento
+
+    z es el Gi* analítico; p_sim sale de permutaciones condicionales: para
+    cada corregimiento se fija su valor y sus k vecinos se sortean entre
+    los otros n - 1. Las mismas permutaciones sirven a todos (se salta el
+    propio índice), así que un lote es un solo arreglo corregimientos ×
+    permutaciones × vecinos. Retorna arreglos del largo de valores (NaN
+    donde faltan datos).
+    """
+    x, grafo, validos = _validos(valores, grafo)
+    n = len(x)
+    k = grafo.cardinalidad
+    pesos = k + 1
+    suma_local = x + grafo.rezago(x)
+
+    media = x.mean()
+    desvio = np.sqrt((x * x).mean() - media * media)
+    escala = desvio * np.sqrt((n * pesos - pesos * pesos) / (n - 1))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(escala > 0, (suma_local - media * pesos) / escala, 0.0)
+
+    mayores = np.zeros(n, dtype="int64")
+    k_max = int(k.max()) if n else 0
+    if permutaciones and k_max and n > 1:
+        rng = np.random.default_rng(semilla)
+        posiciones = np.arange(k_max)
+        propio = np.arange(n)[:, None, None]
+        lote = max(1, LOTE_PERMUTACIONES // (n * k_max))
+        for inicio in range(0, permutaciones, lote):
+            cuantas = min(lote, permutaciones - inicio)
+            # k_max índices distintos de 0..n-2 por permutación; >= i salta al propio
+            sorteo = rng.random((cuantas, n - 1)).argsort(axis=1)[:, :k_max]
+            otros = sorteo[None] + (sorteo[None] >= propio)
+            vecinos = np.where(posiciones < k[:, None, None], x[otros], 0.0)
+            simulada = x[:, None] + vecinos.sum(axis=-1)
+            mayores += (simulada >= suma_local[:, None]).sum(axis=1)
+    p_sim = _pseudo_p(mayores, permutaciones) if permutaciones else np.full(n, np.nan)
+
+    resultado = {}
+    for nombre, arreglo in (("z", z), ("p_sim", p_sim)):
+        completo = np.full(len(validos), np.nan)
+        completo[validos] = arreglo
+        resultado[nombre] = completo
+    resultado["clase"] = clases_hotspot(resultado["z"], resultado["p_sim"])
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="I de Moran y puntos calientes (Gi*) por corregimiento"
+    )
+    parser.add_argument("--columnas", nargs="+", default=COLUMNAS,
+                        help=f"Columnas a analizar (default: {' '.join(COLUMNAS)})")
+    parser.add_argument("--contiguidad", choices=preparar_geo.CONTIGUIDADES, default="queen",
+                        help="Grafo de vecinos (default: queen)")
+    parser.add_argument("--permutaciones", type=int, default=PERMUTACIONES,
+                        help=f"Permutaciones para la significancia (default: {PERMUTACIONES})")
+    parser.add_argument("--semilla", type=int, default=0, help="Semilla aleatoria (default: 0)")
+    args = parser.parse_args()
+
+    import choropleth_cobertura as choropleth
+
+    gdf = choropleth.load_data("bajo")
+    grafo = cargar_grafo(args.contiguidad, ids=gdf["id_corr_int"].astype("int64").to_numpy())
+    if grafo is None:
+        raise SystemExit(1)
+    k = grafo.cardinalidad
+    print(f"\n🕸️ Contigüidad {args.contiguidad}: {grafo.n} corregimientos, "
+          f"{len(grafo.indices) // 2:,} pares de vecinos, {int((k == 0).sum())} sin vecinos")
+
+    for columna in args.columnas:
+        if columna not in gdf.columns:
+            print(f"\n⚠️ Columna no encontrada: {columna}")
+            continue
+        valores = gdf[columna].to_numpy(dtype=float, na_value=np.nan)
+        inicio = time.perf_counter()
+        global_ = moran(valores, grafo, args.permutaciones, args.semilla)
+        local = getis_ord(valores, grafo, args.permutaciones, args.semilla)
+        segundos = time.perf_counter() - inicio
+
+        print(f"\n📊 {columna} (n={global_['n']}, {args.permutaciones} permutaciones, {segundos:.2f} s)")
+        print(f"   I de Moran: {global_['I']:.4f} (esperado {global_['esperado']:.4f}, "
+              f"z_sim {global_['z_sim']:.2f}, p_sim {global_['p_sim']:.4f})")
+        clases = local["clase"]
+        for clase in sorted(CLASES_HOTSPOT, reverse=True):
+            cuantos = int((clases == clase).sum())
+            if cuantos:
+                print(f"   {CLASES_HOTSPOT[clase]:22} {cuantos:>5}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de arranque de pysql.py
+
+Mide el tiempo de pared de una consulta trivial (SELECT COUNT(*)) lanzada
+como proceso nuevo, tal como ocurre en loops de shell y cron, y verifica
+que el camino rápido (DuckDB con salida csv/json/table) no importe pandas
+ni SQLAlchemy.
+
+Uso:
+    python benchmark_arranque.py                       # DuckDB temporal
+    python benchmark_arranque.py --duckdb censo_2023.duckdb --repeticiones 20
+    python benchmark_arranque.py --max-ms 400          # falla si la mediana supera 400 ms
+
+Sale con código 1 si se importa un módulo prohibido o se supera --max-ms.
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PYSQL = str(Path(__file__).parent / "pysql.py")
+
+# Módulos que no deben cargarse en el camino rápido
+MODULOS_PROHIBIDOS = ("pandas", "sqlalchemy", "numpy", "pyarrow")
+
+
+def crear_db_temporal(directorio: str) -> str:
+    """Crea una base DuckDB mínima para medir solo el arranque"""
+    import duckdb
+
+    db_path = os.path.join(directorio, "bench.duckdb")
+    con = duckdb.connect(db_path)
+    con.execute("CREATE TABLE t AS SELECT range AS id FROM range(1000)")
+    con.close()
+    return db_path
+
+
+def modulos_importados(cmd) -> set:
+    """Módulos de primer nivel importados por el proceso (via -X importtime)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime"] + cmd,
+        capture_output=True, text=True,
+    )
+    modulos = set()
+    for linea in result.stderr.splitlines():
+        if linea.startswith("import time:") and "|" in linea:
+            nombre = linea.rsplit("|", 1)[1].strip()
+            modulos.add(nombre.split(".")[0])
+    return modulos
+
+
+def medir(cmd, repeticiones: int) -> list:
+    """Tiempo de pared (ms) de cada ejecución"""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        subprocess.run([sys.executable] + cmd, capture_output=True, check=True)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de arranque de pysql.py")
+    parser.add_argument("--duckdb", metavar="FILE", help="Archivo DuckDB (default: uno temporal)")
+    parser.add_argument("--query", default=None, help="Consulta (default: SELECT COUNT(*))")
+    parser.add_argument("--repeticiones", type=int, default=10, help="Ejecuciones por formato (default: 10)")
+    parser.add_argument("--max-ms", type=float, default=None,
+                        help="Mediana máxima permitida en ms (default: sin límite)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = args.duckdb or crear_db_temporal(tmp)
+        query = args.query or ("SELECT COUNT(*) FROM planilla" if args.duckdb else "SELECT COUNT(*) FROM t")
+
+        # Línea base: solo el intérprete
+        base = statistics.median(medir(["-c", "pass"], args.repeticiones))
+        print(f"Intérprete Python: {base:7.1f} ms (mediana)")
+
+        fallo = False
+        for fmt in ("csv", "json", "table"):
+            cmd = [PYSQL, "--duckdb", db_path, "-Q", query, "-o", fmt]
+            tiempos = medir(cmd, args.repeticiones)
+            mediana = statistics.median(tiempos)
+            prohibidos = sorted(modulos_importados(cmd) & set(MODULOS_PROHIBIDOS))
+            print(f"pysql -o {fmt:5}: {mediana:7.1f} ms (mediana), "
+                  f"min {min(tiempos):.1f} ms, max {max(tiempos):.1f} ms")
+            if prohibidos:
+                print(f"   ❌ Importa en el camino rápido: {', '.join(prohibidos)}")
+                fallo = True
+            if args.max_ms is not None and mediana > args.max_ms:
+                print(f"   ❌ Supera el máximo de {args.max_ms:.0f} ms")
+                fallo = True
+
+    if fallo:
+        sys.exit(1)
+    print("✅ Arranque dentro de lo esperado")
+
+
+if __name__ == "__main__":
+    main()
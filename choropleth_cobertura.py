@@ -15,101 +15,285 @@ Uso:
     # Mapa de cobertura de menores de 18 años
     python choropleth_cobertura.py --metric cobertura_menores --output mapa_cobertura_menores.html
 
+    # Puntos calientes y fríos de la brecha (Gi*; requiere preparar_geo.py)
+    python choropleth_cobertura.py --metric hotspots --hotspot-column gap --output mapa_hotspots.html
+
     # Mostrar en navegador
     python choropleth_cobertura.py --metric cobertura --output mapa.html --show
 """
 
 import argparse
+import json
 import os
+import re
 import geopandas as gpd
 import duckdb
 import folium
+from branca.element import MacroElement
 from folium import plugins
-import pandas as pd
+from jinja2 import Template
+import numpy as np
+import shapely
 import webbrowser
 import tempfile
 
+from clasificacion import METODOS, clasificar, clasificar_categorias
+from compat_duckdb import tabla_arrow
+from topologia import DECODIFICADOR_JS, codificar
+import autocorrelacion
+import detalle_corregimientos
+import preparar_geo
+import recursos_web
+
 # Configuración
 GEOPARQUET_PATH = "data/geo/corregimientos.parquet"
 SHAPEFILE_PATH = "/home/rodolfoarispe/Descargas/Panama_Corregimientos_Boundaries_2024/Corregimientos_2024.shp"
 DB_PATH = "censo_2023.duckdb"
 
+# Métricas disponibles (ver get_color_scale)
+METRICS = ["cobertura", "gap", "pobreza_general", "pobreza_extrema", "cobertura_menores", "hotspots"]
 
-def load_detailed_beneficiaries():
-    """Carga datos desglosados de beneficiarios por programa y menores de 18"""
-    conn = duckdb.connect(DB_PATH)
-    
-    # Query: beneficiarios por programa y menores de 18 de la planilla por corregimiento
-    detailed_data = conn.execute("""
-        SELECT 
-            id_correg,
-            COALESCE(SUM(CASE WHEN Programa = 'ANGEL GUARDIAN' THEN 1 ELSE 0 END), 0) as benef_angel_guardian,
-            COALESCE(SUM(CASE WHEN Programa = 'B/. 120 A LOS 65' THEN 1 ELSE 0 END), 0) as benef_120_65,
-            COALESCE(SUM(CASE WHEN Programa = 'RED DE OPORTUNIDADES' THEN 1 ELSE 0 END), 0) as benef_red_oportunidades,
-            COALESCE(SUM(CASE WHEN Programa = 'SENAPAN' THEN 1 ELSE 0 END), 0) as benef_senapan,
-            COALESCE(SUM(Menores_18), 0) as menores_18_beneficiarios
-        FROM planilla
-        GROUP BY id_correg
-    """).df()
-    
-    conn.close()
-    return detailed_data
+# Colores de las clases de punto caliente (autocorrelacion.CLASES_HOTSPOT):
+# azul frío → gris no significativo → rojo caliente
+HOTSPOT_COLORS = {
+    -3: "#2166ac", -2: "#67a9cf", -1: "#d1e5f0", 0: "#eeeeee",
+    1: "#fddbc7", 2: "#ef8a62", 3: "#b2182b",
+}
 
+# Estilo común de los polígonos (el color de relleno depende de la métrica)
+FEATURE_STYLE = {
+    "color": "#333333",
+    "weight": 0.5,
+    "opacity": 0.7,
+    "fillOpacity": 0.8,
+}
 
-def load_census_minors():
-    """Carga cantidad de menores de 18 del censo por corregimiento"""
-    conn = duckdb.connect(DB_PATH)
-    
-    # Query: menores de 18 años del censo por corregimiento
-    census_minors = conn.execute("""
-        SELECT 
-            CONCAT(
-                LPAD(PROVINCIA, 2, '0'),
-                LPAD(DISTRITO, 2, '0'),
-                LPAD(CORREG, 2, '0')
-            )::BIGINT as id_correg,
-            COUNT(*) as menores_18_censo
-        FROM personas
-        WHERE CAST(P03_EDAD AS INTEGER) < 18 AND P03_EDAD IS NOT NULL
-        GROUP BY PROVINCIA, DISTRITO, CORREG
-    """).df()
-    
-    conn.close()
-    return census_minors
+# Popup de cada corregimiento: una sola plantilla que el navegador completa
+# con las propiedades de la feature ({clave} → valor formateado; {metrica} y
+# {valor} son la métrica activa)
+POPUP_TEMPLATE = " ".join("""
+    <div style="font-family: Arial; font-size: 11px; width: 280px;">
+        <!-- UBICACIÓN -->
+        <div style="background-color: #f5f5f5; padding: 5px; border-radius: 3px; margin-bottom: 8px;">
+            <b style="font-size: 13px;">{corregimiento_nombre}</b><br>
+            <span style="color: #666;">{distrito_nombre}, {provincia_nombre}</span>
+        </div>
+        
+        <!-- CONTEXTO DEMOGRÁFICO (General a Específico) -->
+        <div style="margin-bottom: 8px;">
+            <b style="color: #333;">Población Total:</b> {pob}<br>
+            <b style="color: #d9534f;">Pobres Extremos:</b> {pe} ({ppe}%)<br>
+            <b style="color: #f0ad4e;">Pobres Generales:</b> {pg} ({ppg}%)<br>
+            <b style="color: #5bc0de;">Menores de 18 (Censo):</b> {m18}
+        </div>
+        
+        <hr style="margin: 6px 0; border: none; border-top: 1px solid #ddd;">
+        
+        <!-- COBERTURA DE PROGRAMAS -->
+        <div style="margin-bottom: 8px;">
+            <b style="color: #333;">Beneficiarios Totales:</b> {ben}<br>
+            <b style="color: #27ae60;">{metrica}:</b> {valor}
+        </div>
+        
+        <!-- DESGLOSE POR PROGRAMA Y MENORES BENEFICIARIOS -->
+        <div style="background-color: #fffacd; padding: 5px; border-left: 3px solid #ffc107; margin-bottom: 8px;">
+            <b style="font-size: 10px; color: #333;">Beneficiarios por Programa:</b><br>
+            <span style="font-size: 10px;">
+                • B/. 120 a los 65: {b65}<br>
+                • Red de Oportunidades: {bro}<br>
+                • Ángel Guardián: {bag}<br>
+                • SENAPAN: {bsn}
+            </span><br>
+            <b style="font-size: 10px; color: #333;">Menores de 18:</b> <span style="font-size: 10px;">{m18b}</span>
+        </div>
+        
+        <!-- GAP DE COBERTURA -->
+        <div style="background-color: #ffe6e6; padding: 5px; border-left: 3px solid #dc3545; margin-bottom: 4px;">
+            <b style="color: #c82333;">Gap (Sin Cobertura):</b> {gap}
+        </div>
+    </div>
+    """.split())
+
+# Campos numéricos del popup: clave compacta → (columna, decimales)
+POPUP_FIELDS = {
+    "pob": ("total_personas", 0),
+    "pe": ("pobres_extremos", 0),
+    "ppe": ("pct_pobreza_extrema_personas", 1),
+    "pg": ("pobres_general", 0),
+    "ppg": ("pct_pobreza_general_personas", 1),
+    "m18": ("menores_18_censo", 0),
+    "ben": ("beneficiarios_total", 0),
+    "b65": ("benef_120_65", 0),
+    "bro": ("benef_red_oportunidades", 0),
+    "bag": ("benef_angel_guardian", 0),
+    "bsn": ("benef_senapan", 0),
+    "m18b": ("menores_18_beneficiarios", 0),
+    "gap": ("gap", 0),
+}
+
+# Nombres cortos de los programas en la tabla de detalle del popup
+PROGRAM_LABELS = {
+    "B/. 120 A LOS 65": "120 a los 65",
+    "RED DE OPORTUNIDADES": "Red de Oport.",
+    "ANGEL GUARDIAN": "Ángel Guardián",
+    "SENAPAN": "SENAPAN",
+}
+
+# Drill-down: zoom desde el que se muestra cada nivel (el primero va embebido
+# en el HTML, los demás se cargan al acercarse) y divisor de id_corr
+LEVEL_ZOOM = {"provincias": 0, "distritos": 8, "corregimientos": 10}
+
+# Conteos que se suman al agregar corregimientos en distritos/provincias
+SUM_COLUMNS = [
+    "total_personas", "pobres_general", "pobres_extremos", "pobres_total",
+    "beneficiarios_total", "gap", "menores_18_censo", "menores_18_beneficiarios",
+    "benef_120_65", "benef_red_oportunidades", "benef_angel_guardian", "benef_senapan",
+]
+
+# Niveles de detalle de geometría (columnas geom_<nivel> de preparar_geo.py)
+# y decimales con que se escriben las coordenadas WGS84 de cada uno
+DETALLES = {
+    "completo": 6,  # ~0.1 m
+    "alto": 5,      # ~1 m
+    "medio": 5,
+    "bajo": 4,      # ~10 m
+}
+
+
+# Beneficiarios por programa y menores de 18 de la planilla, por corregimiento
+BENEFICIARIOS_SQL = """
+    SELECT 
+        id_correg,
+        COALESCE(SUM(CASE WHEN Programa = 'ANGEL GUARDIAN' THEN 1 ELSE 0 END), 0) as benef_angel_guardian,
+        COALESCE(SUM(CASE WHEN Programa = 'B/. 120 A LOS 65' THEN 1 ELSE 0 END), 0) as benef_120_65,
+        COALESCE(SUM(CASE WHEN Programa = 'RED DE OPORTUNIDADES' THEN 1 ELSE 0 END), 0) as benef_red_oportunidades,
+        COALESCE(SUM(CASE WHEN Programa = 'SENAPAN' THEN 1 ELSE 0 END), 0) as benef_senapan,
+        COALESCE(SUM(Menores_18), 0) as menores_18_beneficiarios
+    FROM planilla
+    GROUP BY id_correg
+"""
+
+# Menores de 18 años del censo por corregimiento
+MENORES_CENSO_SQL = """
+    SELECT 
+        CONCAT(
+            LPAD(PROVINCIA, 2, '0'),
+            LPAD(DISTRITO, 2, '0'),
+            LPAD(CORREG, 2, '0')
+        )::BIGINT as id_correg,
+        COUNT(*) as menores_18_censo
+    FROM personas
+    WHERE CAST(P03_EDAD AS INTEGER) < 18 AND P03_EDAD IS NOT NULL
+    GROUP BY PROVINCIA, DISTRITO, CORREG
+"""
+
+# Atributos del GeoParquet + desgloses de planilla y censo en una sola
+# consulta; {geo_excluir} quita las columnas de geometría que no se usan
+DATOS_SQL = """
+    WITH geo AS (
+        SELECT * {geo_excluir} FROM read_parquet($ruta, file_row_number = true)
+    ),
+    beneficiarios AS ({beneficiarios}),
+    menores AS ({menores})
+    SELECT
+        geo.* EXCLUDE (file_row_number),
+        COALESCE(b.benef_angel_guardian, 0)::BIGINT AS benef_angel_guardian,
+        COALESCE(b.benef_120_65, 0)::BIGINT AS benef_120_65,
+        COALESCE(b.benef_red_oportunidades, 0)::BIGINT AS benef_red_oportunidades,
+        COALESCE(b.benef_senapan, 0)::BIGINT AS benef_senapan,
+        COALESCE(b.menores_18_beneficiarios, 0)::BIGINT AS menores_18_beneficiarios,
+        COALESCE(m.menores_18_censo, 0)::BIGINT AS menores_18_censo,
+        ROUND(CASE WHEN COALESCE(m.menores_18_censo, 0) > 0
+                   THEN COALESCE(b.menores_18_beneficiarios, 0) * 100.0 / m.menores_18_censo
+                   ELSE 0 END, 2) AS cobertura_menores_pct
+    FROM geo
+    LEFT JOIN beneficiarios b ON b.id_correg = geo.id_corr_int
+    LEFT JOIN menores m ON m.id_correg = geo.id_corr_int
+    ORDER BY geo.file_row_number
+"""
+
+
+def geoparquet_schema(path):
+    """Columnas del GeoParquet y {columna de geometría: CRS} según sus metadatos"""
+    import pyarrow.parquet as pq
+    from pyproj import CRS
+
+    esquema = pq.read_schema(path)
+    geo = json.loads((esquema.metadata or {}).get(b"geo", b'{"columns": {}}'))
+    geometrias = {
+        columna: CRS.from_json_dict(info["crs"]) if info.get("crs") else CRS.from_epsg(4326)
+        for columna, info in geo["columns"].items()
+    }
+    return esquema.names, geometrias
 
 
-def load_data():
-    """Carga datos geográficos desde GeoParquet (o shapefile si no existe)"""
+def detail_column(columns, detail):
+    """Columna de geometría de un nivel de detalle (la WGS84 precalculada si existe)"""
+    candidatas = [preparar_geo.columna_wgs84(detail),
+                  "geometry" if detail == "completo" else preparar_geo.columna_nivel(detail)]
+    for columna in candidatas:
+        if columna in columns:
+            return columna
+    print(f"   ⚠️ Sin geometría '{detail}' en el GeoParquet (ejecutar preparar_geo.py); "
+          f"se usa la completa")
+    return None
+
+
+def load_data(detail=None):
+    """Carga datos geográficos desde GeoParquet (o shapefile si no existe)
+
+    Con GeoParquet, atributos, desglose de planilla y menores del censo
+    salen de una sola consulta DuckDB; en Python solo se decodifica la
+    geometría (WKB). Con detail se lee únicamente la geometría de ese
+    nivel, como columna "geometry" (igual que select_detail(load_data(), detail)).
+    """
     import os
 
     # Intentar cargar GeoParquet primero (más eficiente)
     if os.path.exists(GEOPARQUET_PATH):
-        print(f"📥 Cargando {GEOPARQUET_PATH}...")
-        gdf = gpd.read_parquet(GEOPARQUET_PATH)
-        print(f"   ✓ {len(gdf)} corregimientos cargados")
-        
-        # Enriquecer con datos desglosados de beneficiarios
-        print(f"📥 Cargando datos desglosados por programa...")
-        detailed_benef = load_detailed_beneficiaries()
-        gdf = gdf.merge(detailed_benef, left_on='id_corr_int', right_on='id_correg', how='left')
-        
-        # Enriquecer con menores de 18 del censo
-        print(f"📥 Cargando menores de 18 del censo...")
-        census_minors = load_census_minors()
-        gdf = gdf.merge(census_minors, left_on='id_corr_int', right_on='id_correg', how='left')
-        
-        # Llenar NaN con 0
-        for col in ['benef_angel_guardian', 'benef_120_65', 'benef_red_oportunidades', 'benef_senapan', 'menores_18_beneficiarios', 'menores_18_censo']:
-            gdf[col] = gdf[col].fillna(0).astype('int64')
-
-        gdf["cobertura_menores_pct"] = (
-            (gdf["menores_18_beneficiarios"] / gdf["menores_18_censo"] * 100)
-            .replace([float("inf"), float("-inf")], 0)
-            .fillna(0)
-            .round(2)
-        )
-        print(f"   ✓ Datos desglosados agregados")
-        
+        print(f"📥 Cargando {GEOPARQUET_PATH} con planilla y censo...")
+        columnas, geometrias = geoparquet_schema(GEOPARQUET_PATH)
+
+        # Columnas de preparar_geo.py: solo si corresponden a la geometría actual
+        derivadas = [c for c in preparar_geo.columnas_derivadas() if c in columnas]
+        if derivadas and not preparar_geo.metadatos_vigentes(
+            GEOPARQUET_PATH, preparar_geo.huella_archivo(GEOPARQUET_PATH)
+        ):
+            print("   ⚠️ La geometría cambió desde preparar_geo.py; se ignoran las columnas "
+                  "precalculadas (volver a ejecutarlo)")
+        else:
+            derivadas = []
+
+        usadas = [c for c in geometrias if c in columnas and c not in derivadas]
+        if detail is not None:
+            usadas = [detail_column(usadas, detail) or "geometry"]
+        excluir = [c for c in columnas if (c in geometrias or c in derivadas) and c not in usadas]
+        geo_excluir = f"EXCLUDE ({', '.join(excluir)})" if excluir else ""
+
+        conn = duckdb.connect(DB_PATH, read_only=True)
+        try:
+            # Geometría como WKB aunque la extensión spatial esté cargada
+            conn.execute("SET enable_geoparquet_conversion = false")
+            resultado = conn.execute(
+                DATOS_SQL.format(geo_excluir=geo_excluir, beneficiarios=BENEFICIARIOS_SQL,
+                                 menores=MENORES_CENSO_SQL),
+                {"ruta": GEOPARQUET_PATH},
+            )
+            tabla = tabla_arrow(resultado)
+        finally:
+            conn.close()
+
+        # Atributos a pandas; la geometría se decodifica directo desde Arrow
+        df = tabla.drop_columns(usadas).to_pandas()
+        for columna in usadas:
+            df.insert(tabla.column_names.index(columna), columna, gpd.GeoSeries(
+                shapely.from_wkb(tabla.column(columna).to_numpy(zero_copy_only=False)),
+                index=df.index, crs=geometrias[columna],
+            ))
+        gdf = gpd.GeoDataFrame(df, geometry=usadas[0] if detail is not None else "geometry")
+        if gdf.geometry.name != "geometry":
+            gdf = gdf.rename_geometry("geometry")
+        print(f"   ✓ {len(gdf)} corregimientos con datos desglosados")
         return gdf
 
     # Fallback: cargar shapefile y crear GeoParquet
@@ -118,7 +302,7 @@ def load_data():
     gdf["id_corr_int"] = gdf["ID_CORR"].astype(int)
 
     print("📥 Cargando datos de BD...")
-    conn = duckdb.connect(DB_PATH)
+    conn = duckdb.connect(DB_PATH, read_only=True)
 
     # Query de datos con cobertura
     db_data = conn.execute(
@@ -186,9 +370,126 @@ def load_data():
         }
     )
 
+    return gdf if detail is None else select_detail(gdf, detail)
+
+
+def select_detail(gdf, detail="medio"):
+    """Deja como geometría activa la del nivel de detalle pedido
+
+    Prefiere la versión WGS84 precalculada (wgs84_<nivel>), que evita
+    reproyectar al dibujar el mapa.
+    """
+    columna = detail_column(gdf.columns, detail) or gdf.geometry.name
+    otras = [c for c in gdf.columns
+             if c != columna and (c == "geometry" or c.startswith(("geom_", "wgs84_")))]
+    gdf = gdf.set_geometry(columna).drop(columns=otras)
+    if columna != "geometry":
+        gdf = gdf.rename_geometry("geometry")
     return gdf
 
 
+def aggregate_metrics(gdf, divisor):
+    """Métricas por distrito (divisor 100) o provincia (10000)
+
+    Los conteos se suman y los porcentajes se recalculan con los totales
+    (no se promedian los porcentajes de cada corregimiento).
+    """
+    clave = (gdf["id_corr_int"] // divisor).astype("int64").rename("id")
+    sumas = gdf[[c for c in SUM_COLUMNS if c in gdf.columns]].groupby(clave).sum()
+
+    def razon(numerador, denominador, factor):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            valores = sumas[numerador] / sumas[denominador] * factor
+        return valores.replace([np.inf, -np.inf], np.nan).fillna(0)
+
+    sumas["pobres_total"] = sumas.get("pobres_total", sumas["pobres_general"])
+    sumas["cobertura_pct"] = razon("beneficiarios_total", "pobres_total", 100).round(2)
+    sumas["pct_pobreza_general_personas"] = razon("pobres_general", "total_personas", 1)
+    sumas["pct_pobreza_extrema_personas"] = razon("pobres_extremos", "total_personas", 1)
+    if "menores_18_censo" in sumas.columns:
+        sumas["cobertura_menores_pct"] = razon("menores_18_beneficiarios", "menores_18_censo", 100).round(2)
+    return sumas.reset_index()
+
+
+def load_levels(gdf):
+    """Provincias y distritos disueltos (preparar_geo.py) con sus métricas agregadas
+
+    Retorna {nivel: GeoDataFrame WGS84} o None si los archivos no existen o
+    no corresponden a la geometría actual.
+    """
+    huella_actual = preparar_geo.huella_archivo(GEOPARQUET_PATH)
+    niveles = {}
+    for nombre, (divisor, _) in preparar_geo.AGREGADOS.items():
+        ruta = preparar_geo.ruta_agregado(GEOPARQUET_PATH, nombre)
+        if not preparar_geo.metadatos_vigentes(ruta, huella_actual):
+            print(f"   ⚠️ Sin {ruta} vigente (ejecutar preparar_geo.py); mapa sin drill-down")
+            return None
+        geo = gpd.read_parquet(ruta)
+        niveles[nombre] = geo.merge(aggregate_metrics(gdf, divisor), on="id", how="left")
+        print(f"   ✓ {len(geo)} {nombre} con métricas agregadas")
+    return niveles
+
+
+def prepare_wgs84(gdf, decimals=6):
+    """
+    GeoDataFrame en WGS84 con coordenadas redondeadas a `decimals`.
+
+    Si ya está en EPSG:4326 no se reproyecta. El redondeo es después de
+    proyectar: los bordes compartidos tienen los mismos vértices y se
+    redondean igual.
+    """
+    if gdf.crs is not None and gdf.crs.to_epsg() == 4326:
+        gdf_wgs84 = gdf.copy()
+    else:
+        gdf_wgs84 = gdf.to_crs(epsg=4326)
+    gdf_wgs84.geometry = shapely.transform(
+        gdf_wgs84.geometry.values, lambda coords: np.round(coords, decimals)
+    )
+    return gdf_wgs84
+
+
+def representative_points(gdf):
+    """(lon, lat) WGS84 del punto representativo de cada corregimiento
+
+    Usa las columnas de preparar_geo.py; si no están, lo calcula en el CRS
+    métrico (el centroide en grados no es el centro real).
+    """
+    if all(c in gdf.columns for c in preparar_geo.COLUMNAS_PUNTO):
+        return gdf["punto_lon"].to_numpy(), gdf["punto_lat"].to_numpy()
+    metrico = gdf.geometry.to_crs(preparar_geo.CRS_METRICO)
+    puntos = gpd.GeoSeries(
+        preparar_geo.puntos_representativos(metrico.values), crs=metrico.crs
+    ).to_crs(4326)
+    return puntos.x.to_numpy(), puntos.y.to_numpy()
+
+
+def feature_bounds(gdf, gdf_wgs84):
+    """Extensión WGS84 [oeste, sur, este, norte] de cada corregimiento
+
+    Usa las columnas bbox_* de preparar_geo.py (geometría completa); si no
+    están, la calcula de la geometría ya proyectada del mapa.
+    """
+    if all(c in gdf.columns for c in preparar_geo.COLUMNAS_BBOX):
+        return gdf[preparar_geo.COLUMNAS_BBOX].to_numpy(dtype=float)
+    return shapely.bounds(gdf_wgs84.geometry.values)
+
+
+def compact_values(values, decimals):
+    """Valores redondeados para las propiedades (enteros sin decimales, NaN → None)"""
+    values = np.round(np.asarray(values, dtype=float), decimals)
+    if decimals == 0:
+        return [None if np.isnan(v) else int(v) for v in values]
+    return [None if np.isnan(v) else float(v) for v in values]
+
+
+def js_number_format(tooltip_format):
+    """[decimales, sufijo, separador de miles] de un formato tipo "{:,.2f}%" """
+    match = re.fullmatch(r"\{:(,?)\.(\d+)f\}(.*)", tooltip_format)
+    if not match:
+        return [2, "", True]
+    return [int(match.group(2)), match.group(3), bool(match.group(1))]
+
+
 def get_color_scale(metric):
     """Retorna configuración de colores según métrica"""
     if metric == "cobertura":
@@ -236,23 +537,532 @@ def get_color_scale(metric):
             "colormap": "RdYlGn",  # Rojo -> Amarillo -> Verde
             "tooltip_format": "{:.2f}%",
         }
+    elif metric == "hotspots":
+        return {
+            "name": "Puntos calientes (Gi*)",
+            "column": "hotspot_clase",
+            "vmin": -3,
+            "vmax": 3,
+            "colormap": None,
+            "tooltip_format": "{:.0f}",
+            # Clases fijas (valor, etiqueta, color) en vez de una escala
+            "categories": [(clase, etiqueta, HOTSPOT_COLORS[clase])
+                           for clase, etiqueta in autocorrelacion.CLASES_HOTSPOT.items()],
+        }
     else:
         raise ValueError(f"Métrica no válida: {metric}")
 
 
-def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"):
-    """Crea mapa interactivo tipo choropleth"""
-
-    color_config = get_color_scale(metric)
+def metric_values(gdf, color_config):
+    """Valores de la métrica (NaN si la capa no la tiene, p. ej. hotspots en provincias)"""
     column = color_config["column"]
+    if column not in gdf.columns:
+        return np.full(len(gdf), np.nan)
+    return gdf[column].to_numpy(dtype=float, na_value=np.nan)
+
+
+def classify_metric(values, color_config, classification="lineal", n_classes=5):
+    """Clasificación de colores y formato JS de una métrica
+
+    Las métricas con "categories" usan sus colores fijos y el formato lleva
+    además la etiqueta de cada clase ({valor: etiqueta}).
+    """
+    formato = js_number_format(color_config["tooltip_format"])
+    if "categories" in color_config:
+        categorias = color_config["categories"]
+        formato.append({str(valor): etiqueta for valor, etiqueta, _ in categorias})
+        return clasificar_categorias(values, categorias), formato
+    clases = clasificar(
+        values,
+        color_config["colormap"],
+        metodo=classification,
+        clases=n_classes,
+        vmin=color_config["vmin"],
+        vmax=color_config["vmax"],
+    )
+    return clases, formato
+
+
+def add_hotspots(gdf, column="gap", contiguity="queen", permutations=autocorrelacion.PERMUTACIONES):
+    """Agrega hotspot_clase, hotspot_z y hotspot_p: Gi* de column por corregimiento
+
+    Usa el grafo de vecinos de preparar_geo.py (ver autocorrelacion.py); si
+    falta o no corresponde a la geometría, las columnas quedan en NaN.
+    """
+    gdf = gdf.copy()
+    grafo = None
+    if "id_corr_int" in gdf.columns:
+        grafo = autocorrelacion.cargar_grafo(
+            contiguity, GEOPARQUET_PATH, ids=gdf["id_corr_int"].astype("int64").to_numpy()
+        )
+    if grafo is None:
+        print("   ⚠️ Sin grafo de vecinos: la métrica hotspots queda sin datos")
+        for columna in ("hotspot_clase", "hotspot_z", "hotspot_p"):
+            gdf[columna] = np.nan
+        return gdf
+
+    resultado = autocorrelacion.getis_ord(
+        gdf[column].to_numpy(dtype=float, na_value=np.nan), grafo, permutations
+    )
+    gdf["hotspot_clase"] = resultado["clase"]
+    gdf["hotspot_z"] = resultado["z"]
+    gdf["hotspot_p"] = resultado["p_sim"]
+    print(f"   ✓ Puntos calientes de {column} (Gi*, {contiguity}): "
+          f"{int((resultado['clase'] > 0).sum())} calientes, "
+          f"{int((resultado['clase'] < 0).sum())} fríos")
+    return gdf
+
+
+class MapScript(MacroElement):
+    """Bloque JS que se ejecuta después de crear el mapa (puede usar su variable)"""
+
+    _template = Template("{% macro script(this, kwargs) %}{{ this.code }}{% endmacro %}")
+
+    def __init__(self, code):
+        super().__init__()
+        self._name = "MapScript"
+        self.code = code
+
+
+def layer_data(capa, nombre, id_column, decimals, output_format="geojson"):
+    """Expresión JS con la FeatureCollection de una capa (GeoJSON o TopoJSON)
+
+    Retorna (expresión, datos serializados, topología o None).
+    """
+    if output_format == "topojson":
+        topo = codificar(
+            capa.geometry.values,
+            capa.drop(columns="geometry").to_dict("records"),
+            escala=10.0 ** -decimals,
+            nombre=nombre,
+            ids=capa[id_column].tolist(),
+        )
+        data_json = json.dumps(topo, ensure_ascii=False, separators=(",", ":"))
+        expresion = f"topoFeatures({{}}, '{nombre}')"
+    else:
+        topo = None
+        data_json = capa.to_json(ensure_ascii=False, separators=(",", ":"))
+        expresion = "{}"
+    # En el HTML, "</" se escapa para no cerrar el <script> desde un popup
+    return expresion.format(data_json.replace("</", "<\\/")), data_json, topo
+
+
+def bundle_layer(capa, nombre, metrics, directorio, id_column, decimals, output_format="geojson"):
+    """Escribe una capa como recursos versionados: geometría + uno por métrica
+
+    La geometría lleva solo lo que no depende de la métrica (id, nombres,
+    campos del popup); cada métrica es {"color": [...], "v": [...]} en el
+    orden de las features. Retorna {"archivo": ..., "metricas": {métrica: ...}}
+    con rutas relativas al HTML.
+    """
+    metricas = [c for c in capa.columns if c.startswith(("color_", "v_"))]
+    _, data_json, _ = layer_data(capa.drop(columns=metricas), nombre, id_column, decimals,
+                                 output_format)
+    carpeta = os.path.join(directorio, recursos_web.DIRECTORIO)
+    archivo = recursos_web.escribir_recurso(carpeta, nombre, data_json.encode("utf-8"))
+    recursos = {"archivo": f"{recursos_web.DIRECTORIO}/{archivo}", "metricas": {}}
+    total = recursos_web.tamanos(carpeta, archivo)
+    for key in metrics:
+        valores = json.dumps({"color": capa[f"color_{key}"].tolist(), "v": capa[f"v_{key}"].tolist()},
+                             separators=(",", ":"))
+        nombre_metrica = recursos_web.escribir_recurso(carpeta, f"{nombre}-{key}",
+                                                       valores.encode("utf-8"))
+        recursos["metricas"][key] = f"{recursos_web.DIRECTORIO}/{nombre_metrica}"
+        for ext, tamano in recursos_web.tamanos(carpeta, nombre_metrica).items():
+            total[ext] = total.get(ext, 0) + tamano
+    print(f"   ✓ {nombre}: {archivo} + {len(metrics)} métrica(s) en {recursos_web.DIRECTORIO}/ ("
+          + ", ".join(f"{ext} {tamano / 1024:.0f} KB" for ext, tamano in total.items()) + ")")
+    return recursos
+
+
+def add_layer(m, capa, metrics, output_file, decimals, output_format="geojson", levels=None,
+              bundle=False, details=False):
+    """
+    Agrega la capa de corregimientos, construida en el navegador a partir de
+    una sola FeatureCollection (o TopoJSON). Color y valor de cada métrica
+    son propiedades (color_<métrica>, v_<métrica>); cambiarMetrica()
+    recolorea sin recargar la geometría. Tooltip y popup se generan al
+    abrirse, desde POPUP_TEMPLATE y las propiedades numéricas. capasPorId
+    indexa cada capa por id_corr para el panel de búsqueda.
+
+    Con levels ({"provincias": capa, "distritos": capa}) el mapa hace
+    drill-down: el primer nivel de LEVEL_ZOOM va embebido y los demás se
+    escriben como <salida>_<nivel>.js, que el navegador carga con un
+    <script> (funciona también desde file://) al pasar su zoom. Click en
+    una provincia o distrito acerca al nivel siguiente.
+
+    Con output_format="topojson" la geometría va con arcos compartidos,
+    cuantizados y con deltas, y además se guarda <salida>.topojson para
+    otros consumidores web.
+
+    Con bundle=True nada va embebido: cada nivel se escribe con
+    bundle_layer() en assets/ (junto al HTML, compartido por los mapas del
+    directorio) y el navegador pide con fetch la geometría y solo las
+    métricas que se muestran.
+
+    Con details=True el popup de un corregimiento pide al abrirse
+    detalle/<id_corr>.json (de detalle_corregimientos.py, junto al HTML) y
+    agrega el desglose por programa, sexo, elegibilidad y menores.
+    """
+    capas = {**(levels or {}), "corregimientos": capa}
+    orden = sorted(capas, key=LEVEL_ZOOM.get) if levels else ["corregimientos"]
+    base = os.path.splitext(output_file)[0]
+
+    niveles_js = []
+    datos_embebidos = None
+    for i, nombre in enumerate(orden):
+        id_column = "id_corr" if nombre == "corregimientos" else "id"
+        if bundle:
+            recursos = bundle_layer(capas[nombre], nombre, metrics, os.path.dirname(output_file),
+                                    id_column, decimals, output_format)
+            niveles_js.append({"nombre": nombre, "desde": LEVEL_ZOOM[nombre] if levels else 0,
+                               **recursos})
+            continue
+        data_script, data_json, topo = layer_data(capas[nombre], nombre, id_column, decimals,
+                                                  output_format)
+        if topo is not None and nombre == "corregimientos":
+            topo_file = base + ".topojson"
+            with open(topo_file, "w", encoding="utf-8") as f:
+                f.write(data_json)
+            print(f"   ✓ TopoJSON: {topo_file} ({len(topo['arcs'])} arcos, "
+                  f"{len(data_json) / 1024 / 1024:.2f} MB)")
+        nivel = {"nombre": nombre, "desde": LEVEL_ZOOM[nombre] if levels else 0, "archivo": None}
+        if i == 0:
+            datos_embebidos = data_script
+        else:
+            archivo = f"{base}_{nombre}.js"
+            with open(archivo, "w", encoding="utf-8") as f:
+                f.write(f"registrarNivel('{nombre}', {data_script});\n")
+            nivel["archivo"] = os.path.basename(archivo)
+            print(f"   ✓ {nombre}: {nivel['archivo']} ({os.path.getsize(archivo) / 1024:.0f} KB, "
+                  f"se carga desde zoom {nivel['desde']})")
+        niveles_js.append(nivel)
+
+    decoder = DECODIFICADOR_JS if output_format == "topojson" else ""
+    map_name = m.get_name()
+    if bundle:
+        decodificar = "topoFeatures(datos, nivel.nombre)" if output_format == "topojson" else "datos"
+        cargador = f"""
+    function pedirJSON(url) {{
+        return fetch(url).then(function(r) {{
+            if (!r.ok) throw new Error(url + ': HTTP ' + r.status);
+            return r.json();
+        }});
+    }}
+
+    // Color y valor de una métrica: se piden una vez por nivel y se
+    // copian a las propiedades de cada feature (mismo orden)
+    function completarMetrica(nivel, metrica) {{
+        nivel.valores = nivel.valores || {{}};
+        if (!nivel.valores[metrica]) {{
+            nivel.valores[metrica] = pedirJSON(nivel.metricas[metrica]).then(function(valores) {{
+                nivel.features.forEach(function(f, i) {{
+                    f.properties['color_' + metrica] = valores.color[i];
+                    f.properties['v_' + metrica] = valores.v[i];
+                }});
+            }});
+        }}
+        return nivel.valores[metrica].then(function() {{
+            // Si cambió la métrica mientras tanto, completar también la nueva
+            if (metrica !== metricaActiva) return completarMetrica(nivel, metricaActiva);
+        }});
+    }}
+
+    function cargarNivel(nivel) {{
+        pedirJSON(nivel.archivo).then(function(datos) {{
+            datos = {decodificar};
+            nivel.features = datos.features;
+            return completarMetrica(nivel, metricaActiva).then(function() {{
+                registrarNivel(nivel.nombre, datos);
+            }});
+        }}).catch(function(error) {{
+            nivel.cargando = false;
+            console.error('No se pudo cargar el nivel ' + nivel.nombre, error);
+        }});
+    }}
+
+    function conMetrica(metrica, listo) {{
+        Promise.all(niveles.filter(function(n) {{ return n.features; }}).map(function(n) {{
+            return completarMetrica(n, metrica);
+        }})).then(function() {{ if (metrica === metricaActiva) listo(); }});
+    }}
+"""
+        inicio = "actualizarNivel();"
+    else:
+        cargador = """
+    function cargarNivel(nivel) {
+        var script = document.createElement('script');
+        script.src = nivel.archivo;
+        document.body.appendChild(script);
+    }
+
+    function conMetrica(metrica, listo) { listo(); }
+"""
+        inicio = f"registrarNivel(niveles[0].nombre, {datos_embebidos});"
+    MapScript(f"""
+    {decoder}
+    var metricas = {json.dumps(metrics, ensure_ascii=False)};
+    var metricaActiva = {json.dumps(next(iter(metrics)))};
+    var plantillaPopup = {json.dumps(POPUP_TEMPLATE, ensure_ascii=False)};
+    var formatosPopup = {json.dumps({k: [d, "", True] for k, (_, d) in POPUP_FIELDS.items()})};
+
+    function formatear(v, f) {{
+        if (v === null || v === undefined) return 'N/A';
+        if (f[3]) return f[3][v] || String(v);
+        return v.toLocaleString('en-US', {{
+            minimumFractionDigits: f[0], maximumFractionDigits: f[0], useGrouping: f[2]
+        }}) + f[1];
+    }}
+
+    function valorActivo(p) {{
+        return formatear(p['v_' + metricaActiva], metricas[metricaActiva].format);
+    }}
+
+    function popupCorregimiento(p) {{
+        return plantillaPopup.replace(/\{{(\w+)\}}/g, function(_, clave) {{
+            if (clave === 'metrica') return metricas[metricaActiva].name;
+            if (clave === 'valor') return valorActivo(p);
+            if (clave in formatosPopup) return formatear(p[clave], formatosPopup[clave]);
+            return p[clave] === undefined ? '' : p[clave];
+        }});
+    }}
+
+    function estiloCorregimiento(feature) {{
+        return Object.assign({{fillColor: feature.properties['color_' + metricaActiva]}}, {json.dumps(FEATURE_STYLE)});
+    }}
+
+    // Detalle del corregimiento: se pide al abrir el popup y queda en caché
+    // (null si no hay archivo para ese id)
+    var detalleDir = {json.dumps(detalle_corregimientos.DIRECTORIO if details else None)};
+    var etiquetasPrograma = {json.dumps(PROGRAM_LABELS, ensure_ascii=False)};
+    var detalles = {{}};
+    var pedidosDetalle = {{}};
+
+    function cargarDetalle(id) {{
+        if (!pedidosDetalle[id]) {{
+            pedidosDetalle[id] = fetch(detalleDir + '/' + id + '.json').then(function(r) {{
+                return r.ok ? r.json() : null;
+            }}).catch(function() {{
+                return null;
+            }}).then(function(d) {{
+                detalles[id] = d;
+            }});
+        }}
+        return pedidosDetalle[id];
+    }}
+
+    function tablaDetalle(titulo, encabezado, filas) {{
+        var celda = function(v, i) {{
+            return '<td style="padding: 1px 3px; text-align: ' + (i ? 'right' : 'left') + ';">' + v + '</td>';
+        }};
+        return '<b style="color: #333;">' + titulo + '</b>'
+            + '<table style="border-collapse: collapse; width: 100%; margin: 2px 0 6px 0;">'
+            + '<tr style="background-color: #f5f5f5;">' + encabezado.map(celda).join('') + '</tr>'
+            + filas.map(function(f, i) {{
+                var estilo = i === filas.length - 1 ? ' style="font-weight: bold; border-top: 1px solid #ccc;"' : '';
+                return '<tr' + estilo + '>' + f.map(celda).join('') + '</tr>';
+            }}).join('') + '</table>';
+    }}
+
+    function htmlDetalle(id) {{
+        if (!detalleDir) return '';
+        var d = detalles[id], cuerpo;
+        if (d === undefined) {{
+            cuerpo = '<i style="color: #666;">Cargando detalle...</i>';
+        }} else if (d === null) {{
+            cuerpo = '<i style="color: #666;">Sin detalle de planilla para este corregimiento</i>';
+        }} else {{
+            var campos = ['total', 'mujeres', 'hombres', 'menores_18', 'elegibles', 'no_elegibles', 'sin_fups', 'sin_pmt'];
+            var total = {{}}, sexo = [], elegibilidad = [];
+            campos.forEach(function(c) {{ total[c] = 0; }});
+            Object.keys(d.programas).sort().forEach(function(programa) {{
+                var r = d.programas[programa], n = function(c) {{ return formatear(r[c], [0, '', true]); }};
+                var nombre = (etiquetasPrograma[programa] || programa).replace(/</g, '&lt;');
+                campos.forEach(function(c) {{ total[c] += r[c]; }});
+                sexo.push([nombre, n('total'), n('mujeres'), n('hombres'), n('menores_18')]);
+                elegibilidad.push([nombre, n('elegibles'), n('no_elegibles'), n('sin_fups'), n('sin_pmt')]);
+            }});
+            var t = function(c) {{ return formatear(total[c], [0, '', true]); }};
+            sexo.push(['Total', t('total'), t('mujeres'), t('hombres'), t('menores_18')]);
+            elegibilidad.push(['Total', t('elegibles'), t('no_elegibles'), t('sin_fups'), t('sin_pmt')]);
+            var edades = Object.keys(d.menores_censo).map(function(g) {{
+                return g + ': ' + formatear(d.menores_censo[g], [0, '', true]);
+            }});
+            cuerpo = tablaDetalle('Beneficiarios por programa y sexo', ['Programa', 'Total', 'Mujeres', 'Hombres', 'Men. 18'], sexo)
+                + tablaDetalle('Elegibilidad', ['Programa', 'Elegibles', 'No eleg.', 'Sin FUPS', 'Sin PMT'], elegibilidad)
+                + '<b style="color: #333;">Menores de 18 (Censo) por edad:</b> ' + edades.join(' · ');
+        }}
+        return '<div style="font-family: Arial; font-size: 10px; width: 300px; border-top: 1px solid #ddd; padding-top: 6px;">'
+            + cuerpo + '</div>';
+    }}
+
+    // Índice id_corr → capa Leaflet, armado una vez al cargar (búsqueda O(1))
+    var capasPorId = {{}};
+    var capaCorregimientos = null;
+
+    // Niveles (provincias → distritos → corregimientos) y zoom desde el que se ven
+    var niveles = {json.dumps(niveles_js)};
+    var capasNivel = {{}};
+    var nivelActivo = null;
+    {cargador}
+    function crearCapa(nombre, datos) {{
+        return L.geoJson(datos, {{
+            style: estiloCorregimiento,
+            onEachFeature: function(feature, layer) {{
+                var p = feature.properties;
+                layer.bindTooltip(function() {{
+                    return (p.nombre || p.corregimiento_nombre) + ': ' + valorActivo(p);
+                }}, {{sticky: false}});
+                if (nombre === 'corregimientos') {{
+                    capasPorId[p.id_corr] = layer;
+                    layer.bindPopup(function() {{
+                        return popupCorregimiento(p) + htmlDetalle(p.id_corr);
+                    }}, {{maxWidth: detalleDir ? 320 : 300}});
+                    if (detalleDir) {{
+                        layer.on('popupopen', function(e) {{
+                            cargarDetalle(p.id_corr).then(function() {{
+                                if (e.popup.isOpen()) e.popup.setContent(popupCorregimiento(p) + htmlDetalle(p.id_corr));
+                            }});
+                        }});
+                    }}
+                }} else {{
+                    // Drill-down: acercar hasta el nivel siguiente
+                    layer.on('click', function() {{ {map_name}.fitBounds(layer.getBounds()); }});
+                }}
+            }}
+        }});
+    }}
+
+    function registrarNivel(nombre, datos) {{
+        capasNivel[nombre] = crearCapa(nombre, datos);
+        if (nombre === 'corregimientos') {{
+            capaCorregimientos = capasNivel[nombre];
+            if (typeof alCargarCorregimientos === 'function') alCargarCorregimientos();
+        }}
+        actualizarNivel();
+    }}
+
+    function actualizarLeyenda() {{
+        document.getElementById('leyenda-metrica').innerHTML = metricas[metricaActiva].legend[nivelActivo];
+    }}
+
+    // Muestra el nivel que corresponde al zoom; si no está cargado, pide su
+    // archivo y mientras tanto deja visible el nivel actual
+    function actualizarNivel() {{
+        var zoom = {map_name}.getZoom(), nivel = niveles[0];
+        niveles.forEach(function(n) {{ if (zoom >= n.desde) nivel = n; }});
+        if (!capasNivel[nivel.nombre]) {{
+            if (!nivel.cargando) {{
+                nivel.cargando = true;
+                cargarNivel(nivel);
+            }}
+            return;
+        }}
+        if (nivelActivo === nivel.nombre) return;
+        if (nivelActivo) {map_name}.removeLayer(capasNivel[nivelActivo]);
+        capasNivel[nivel.nombre].setStyle(estiloCorregimiento).addTo({map_name});
+        nivelActivo = nivel.nombre;
+        actualizarLeyenda();
+    }}
+
+    function cambiarMetrica(metrica) {{
+        metricaActiva = metrica;
+        {map_name}.closePopup();
+        conMetrica(metrica, function() {{
+            Object.keys(capasNivel).forEach(function(n) {{ capasNivel[n].setStyle(estiloCorregimiento); }});
+            if (nivelActivo) actualizarLeyenda();
+        }});
+    }}
+
+    {map_name}.on('zoomend', actualizarNivel);
+    {inicio}
+    """).add_to(m)
+
+
+def metric_properties(gdf, color_configs, classification="lineal", n_classes=5, nivel="corregimientos"):
+    """Columnas color_<métrica>/v_<métrica> y descripción de cada métrica para el JS
+
+    La leyenda queda en metricas[métrica]["legend"][nivel]: cada nivel se
+    clasifica por separado (un gap provincial no se compara con uno de
+    corregimiento).
+    """
+    columnas = {}
+    metricas = {}
+    for key, color_config in color_configs.items():
+        valores = metric_values(gdf, color_config)
+        clases, formato = classify_metric(valores, color_config, classification, n_classes)
+        columnas[f"color_{key}"] = clases.colores
+        columnas[f"v_{key}"] = compact_values(valores, formato[0])
+        nota = "Datos: Censo/MDP 2023<br>Planilla: 20261"
+        if "note" in color_config:
+            nota = f"{color_config['note']}<br>{nota}"
+        metricas[key] = {
+            "name": color_config["name"],
+            "format": formato,
+            "legend": {nivel: clases.leyenda_html(
+                color_config["name"],
+                color_config["tooltip_format"],
+                nota=nota,
+            )},
+        }
+    return columnas, metricas
+
+
+def level_layers(levels, color_configs, metricas_js, decimals, classification="lineal", n_classes=5):
+    """Capas compactas de provincias/distritos; agrega sus leyendas a metricas_js"""
+    capas = {}
+    for nombre, nivel_gdf in levels.items():
+        nivel_wgs84 = prepare_wgs84(nivel_gdf, decimals)
+        columnas, metricas = metric_properties(nivel_wgs84, color_configs, classification,
+                                               n_classes, nivel=nombre)
+        for key, metrica in metricas.items():
+            metricas_js[key]["legend"].update(metrica["legend"])
+        etiqueta = (nivel_wgs84["provincia_nombre"].astype(str)
+                    if "provincia_nombre" in nivel_wgs84.columns else "N/A")
+        if "distrito_nombre" in nivel_wgs84.columns:
+            etiqueta = nivel_wgs84["distrito_nombre"].astype(str) + ", " + etiqueta
+        capas[nombre] = gpd.GeoDataFrame(
+            {"id": nivel_wgs84["id"].astype("int64").to_numpy(), "nombre": etiqueta, **columnas},
+            geometry=nivel_wgs84.geometry.values,
+            crs=nivel_wgs84.crs,
+        )
+    return capas
+
+
+def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html", decimals=6,
+                      output_format="geojson", classification="lineal", n_classes=5, levels=None,
+                      bundle=False, details=False, hotspot_column="gap"):
+    """Crea mapa interactivo tipo choropleth
+
+    metric puede ser una métrica o una lista: con varias, la geometría se
+    embebe una sola vez y un selector recolorea el mapa en el navegador.
+    classification es un método de clasificacion.METODOS; colores y
+    leyenda salen de los mismos cortes. levels (de load_levels) activa el
+    drill-down provincia → distrito → corregimiento. Con bundle=True el
+    HTML no lleva geometría ni valores: los pide a assets/ (ver add_layer).
+    Con details=True el popup carga detalle/<id_corr>.json al abrirse
+    (escribirlo antes con detalle_corregimientos.escribir_detalles).
+    La métrica hotspots clasifica el Gi* de hotspot_column (add_hotspots);
+    solo existe a nivel de corregimiento.
+    """
 
-    print(f"\n📊 Creando choropleth para: {color_config['name']}")
-    print(f"   Min: {gdf[column].min():.2f}")
-    print(f"   Max: {gdf[column].max():.2f}")
-    print(f"   Promedio: {gdf[column].mean():.2f}")
+    metrics = [metric] if isinstance(metric, str) else list(metric)
+    color_configs = {k: get_color_scale(k) for k in metrics}
+    if "hotspots" in color_configs:
+        gdf = add_hotspots(gdf, hotspot_column)
+        color_configs["hotspots"]["note"] = (
+            f"Gi* de {hotspot_column} (vecinos queen, {autocorrelacion.PERMUTACIONES} permutaciones)"
+        )
+
+    for color_config in color_configs.values():
+        column = color_config["column"]
+        print(f"\n📊 Creando choropleth para: {color_config['name']}")
+        print(f"   Min: {gdf[column].min():.2f}")
+        print(f"   Max: {gdf[column].max():.2f}")
+        print(f"   Promedio: {gdf[column].mean():.2f}")
 
-    # Transformar a WGS84 para folium
-    gdf_wgs84 = gdf.to_crs(epsg=4326)
+    # WGS84 para folium (ya viene así de preparar_geo.py o de generar_mapas)
+    gdf_wgs84 = prepare_wgs84(gdf, decimals)
     
     # Centro de Panamá (bien centrado)
     center_lat = 8.9824
@@ -270,199 +1080,102 @@ def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"
     bounds = gdf_wgs84.geometry.total_bounds  # [minx, miny, maxx, maxy]
     m.fit_bounds([[bounds[1], bounds[0]], [bounds[3], bounds[2]]])
 
-    # Normalizar colores
-    vmin = color_config["vmin"]
-    vmax = color_config["vmax"] or gdf[column].max()
+    # Color y valor de cada métrica como propiedades de la feature
+    capa_metricas, metricas_js = metric_properties(gdf, color_configs, classification, n_classes)
 
-    # Función para obtener color
-    def get_feature_color(value):
-        if pd.isna(value):
-            return "#888888"
-        
-        # Evitar división por cero
-        if vmax == vmin:
-            normalized = 0.5
-        else:
-            normalized = (value - vmin) / (vmax - vmin)
-        
-        normalized = max(0, min(1, normalized))  # Clamp 0-1
-
-        # Mapeo de colores RGB
-        if color_config["colormap"] == "RdYlGn":
-            # Rojo → Amarillo → Verde
-            if normalized < 0.5:
-                # Rojo a Amarillo
-                r = 255
-                g = int(normalized * 2 * 255)
-                b = 0
-            else:
-                # Amarillo a Verde
-                r = int((1 - normalized) * 2 * 255)
-                g = 255
-                b = 0
-            
-        elif color_config["colormap"] == "YlOrRd":
-            # Amarillo → Naranja → Rojo
-            if normalized < 0.33:
-                r = 255
-                g = int(255 - normalized / 0.33 * 100)
-                b = 0
-            elif normalized < 0.67:
-                r = 255
-                g = int(155 - (normalized - 0.33) / 0.33 * 155)
-                b = 0
-            else:
-                r = 255
-                g = int((1 - normalized) / 0.33 * 100)
-                b = 0
-            
-        elif color_config["colormap"] == "Reds":
-            # Blanco a Rojo
-            r = int(100 + normalized * 155)  # 100-255
-            g = int(100 - normalized * 100)  # 100-0
-            b = int(100 - normalized * 100)  # 100-0
-            
-        elif color_config["colormap"] == "Blues":
-            # Blanco a Azul
-            r = int(100 - normalized * 100)  # 100-0
-            g = int(100 - normalized * 100)  # 100-0
-            b = int(100 + normalized * 155)  # 100-255
+    # Una sola capa (FeatureCollection): cada feature lleva solo un registro
+    # compacto (nombres, números, color/valor por métrica); tooltip y popup
+    # se arman en el navegador con POPUP_TEMPLATE
+    def nombres(columna, alternativa):
+        if columna in gdf_wgs84.columns:
+            return gdf_wgs84[columna].fillna(gdf_wgs84.get(alternativa, 'N/A'))
+        return gdf_wgs84.get(alternativa, 'N/A')
+
+    campos_popup = {}
+    for clave, (columna, decimales) in POPUP_FIELDS.items():
+        if columna in gdf_wgs84.columns:
+            campos_popup[clave] = compact_values(gdf_wgs84[columna], decimales)
         else:
-            r = int(200 * normalized)
-            g = int(200 * normalized)
-            b = int(200 * normalized)
-        
-        return f"#{int(r):02x}{int(g):02x}{int(b):02x}"
-
-    # Agregar features GeoJSON al mapa (usando WGS84)
-    for idx, row in gdf_wgs84.iterrows():
-        # Obtener el valor del GeoDataFrame original (mismo índice)
-        value = gdf.loc[idx, column]
-        color = get_feature_color(value)
-        formatted_value = color_config["tooltip_format"].format(value)
-
-        # Usar nombre de corregimiento (compatibilidad con GeoParquet y shapefile)
-        corr_name = row.get('corregimiento_nombre') or row.get('corregimiento', 'N/A')
-        dist_name = row.get('distrito_nombre') or row.get('distrito', 'N/A')
-        prov_name = row.get('provincia_nombre') or row.get('provincia', 'N/A')
-
-        # Crear popup con información jerárquica (general a específico)
-        # Obtener valores con defaults para compatibilidad
-        benef_angel = int(row.get('benef_angel_guardian', 0))
-        benef_120_65 = int(row.get('benef_120_65', 0))
-        benef_red_oport = int(row.get('benef_red_oportunidades', 0))
-        benef_senapan = int(row.get('benef_senapan', 0))
-        menores_18_censo = int(row.get('menores_18_censo', 0))
-        menores_18_benef = int(row.get('menores_18_beneficiarios', 0))
-        
-        popup_html = f"""
-        <div style="font-family: Arial; font-size: 11px; width: 280px;">
-            <!-- UBICACIÓN -->
-            <div style="background-color: #f5f5f5; padding: 5px; border-radius: 3px; margin-bottom: 8px;">
-                <b style="font-size: 13px;">{corr_name}</b><br>
-                <span style="color: #666;">{dist_name}, {prov_name}</span>
-            </div>
-            
-            <!-- CONTEXTO DEMOGRÁFICO (General a Específico) -->
-            <div style="margin-bottom: 8px;">
-                <b style="color: #333;">Población Total:</b> {row['total_personas']:,.0f}<br>
-                <b style="color: #d9534f;">Pobres Extremos:</b> {row['pobres_extremos']:,.0f} ({row['pct_pobreza_extrema_personas']:.1f}%)<br>
-                <b style="color: #f0ad4e;">Pobres Generales:</b> {row['pobres_general']:,.0f} ({row['pct_pobreza_general_personas']:.1f}%)<br>
-                <b style="color: #5bc0de;">Menores de 18 (Censo):</b> {menores_18_censo:,.0f}
-            </div>
-            
-            <hr style="margin: 6px 0; border: none; border-top: 1px solid #ddd;">
-            
-            <!-- COBERTURA DE PROGRAMAS -->
-            <div style="margin-bottom: 8px;">
-                <b style="color: #333;">Beneficiarios Totales:</b> {row['beneficiarios_total']:,.0f}<br>
-                <b style="color: #27ae60;">{color_config['name']}:</b> {formatted_value}
-            </div>
-            
-            <!-- DESGLOSE POR PROGRAMA Y MENORES BENEFICIARIOS -->
-            <div style="background-color: #fffacd; padding: 5px; border-left: 3px solid #ffc107; margin-bottom: 8px;">
-                <b style="font-size: 10px; color: #333;">Beneficiarios por Programa:</b><br>
-                <span style="font-size: 10px;">
-                    • B/. 120 a los 65: {benef_120_65:,.0f}<br>
-                    • Red de Oportunidades: {benef_red_oport:,.0f}<br>
-                    • Ángel Guardián: {benef_angel:,.0f}<br>
-                    • SENAPAN: {benef_senapan:,.0f}
-                </span><br>
-                <b style="font-size: 10px; color: #333;">Menores de 18:</b> <span style="font-size: 10px;">{menores_18_benef:,.0f}</span>
-            </div>
-            
-            <!-- GAP DE COBERTURA -->
-            <div style="background-color: #ffe6e6; padding: 5px; border-left: 3px solid #dc3545; margin-bottom: 4px;">
-                <b style="color: #c82333;">Gap (Sin Cobertura):</b> {row['gap']:,.0f}
-            </div>
+            campos_popup[clave] = 0
+
+    if "id_corr_int" in gdf_wgs84.columns:
+        ids = gdf_wgs84["id_corr_int"].astype("int64").to_numpy()
+    else:
+        ids = np.arange(len(gdf_wgs84))
+
+    capa = gpd.GeoDataFrame(
+        {
+            "id_corr": ids,
+            "corregimiento_nombre": nombres('corregimiento_nombre', 'corregimiento'),
+            "distrito_nombre": nombres('distrito_nombre', 'distrito'),
+            "provincia_nombre": nombres('provincia_nombre', 'provincia'),
+            **campos_popup,
+            **capa_metricas,
+        },
+        geometry=gdf_wgs84.geometry.values,
+        crs=gdf_wgs84.crs,
+    )
+
+    capas_nivel = None
+    if levels:
+        capas_nivel = level_layers(levels, color_configs, metricas_js, decimals,
+                                   classification, n_classes)
+    add_layer(m, capa, metricas_js, output_file, decimals, output_format, levels=capas_nivel,
+              bundle=bundle, details=details)
+
+    if len(metrics) > 1:
+        opciones = "".join(
+            f"""<label style="display: block; margin: 3px 0; cursor: pointer;">
+                <input type="radio" name="metrica" value="{key}" {"checked" if i == 0 else ""}
+                       onchange="cambiarMetrica(this.value)"> {config['name']}
+            </label>"""
+            for i, (key, config) in enumerate(color_configs.items())
+        )
+        selector_html = f"""
+        <div style="position: fixed; 
+                top: 10px; right: 10px; width: 250px; height: auto; 
+                background-color: white; border:2px solid #333; z-index:9999; 
+                font-size:12px; padding: 10px; border-radius: 5px;
+                box-shadow: 0 2px 6px rgba(0,0,0,0.3);">
+            <p style="margin: 0 0 6px 0; font-weight: bold; font-size: 13px;">📊 Métrica</p>
+            {opciones}
         </div>
         """
+        m.get_root().html.add_child(folium.Element(selector_html))
 
-        # Crear GeoJSON feature desde geometría WGS84
-        feature = {
-            "type": "Feature",
-            "geometry": row.geometry.__geo_interface__,
-            "properties": {
-                "name": corr_name,
-                "corregimiento_nombre": corr_name,
-                "corregimiento": corr_name,
-                "distrito_nombre": dist_name,
-                "provincia_nombre": prov_name
-            }
-        }
 
-        folium.GeoJson(
-            data=feature,
-            style_function=lambda x, color=color: {
-                "fillColor": color, 
-                "color": "#333333",
-                "weight": 0.5,
-                "opacity": 0.7,
-                "fillOpacity": 0.8
-            },
-            popup=folium.Popup(popup_html, max_width=250),
-            tooltip=folium.Tooltip(
-                f"{corr_name}: {formatted_value}", sticky=False
-            ),
-        ).add_to(m)
-
-    # Preparar datos para búsqueda (Provincia → Distrito → Corregimiento)
-    # IMPORTANTE: Usar gdf_wgs84 para obtener coordenadas correctas (lat/lon)
+    # Preparar datos para búsqueda (Provincia → Distrito → Corregimiento),
+    # todo por id_corr: nombres repetidos en distintos distritos no chocan.
+    # Punto representativo y extensión vienen precalculados de preparar_geo.py
     provincias_data = {}
-    corregimientos_coords = {}  # Guardar coordenadas para búsqueda
-    
-    for idx, row in gdf_wgs84.iterrows():
-        prov_name = row.get('provincia_nombre') or row.get('provincia', 'N/A')
-        dist_name = row.get('distrito_nombre') or row.get('distrito', 'N/A')
-        corr_name = row.get('corregimiento_nombre') or row.get('corregimiento', 'N/A')
-        
-        # Calcular centroide EN WGS84 (ya está transformado en gdf_wgs84)
-        try:
-            centroide = row.geometry.centroid
-            lat = centroide.y
-            lon = centroide.x
-        except:
-            lat = center_lat
-            lon = center_lon
-        
-        # Guardar corregimiento con sus coordenadas (WGS84)
-        corregimientos_coords[corr_name] = {'lat': lat, 'lon': lon}
-        
-        if prov_name not in provincias_data:
-            provincias_data[prov_name] = {}
-        if dist_name not in provincias_data[prov_name]:
-            provincias_data[prov_name][dist_name] = []
-        if corr_name not in provincias_data[prov_name][dist_name]:
-            provincias_data[prov_name][dist_name].append({
-                'name': corr_name,
-                'lat': lat,
-                'lon': lon
-            })
-    
+    corregimientos_info = {}
+    lons, lats = representative_points(gdf)
+    extensiones = feature_bounds(gdf, gdf_wgs84)
+
+    for corr_id, prov_name, dist_name, corr_name, lon, lat, (oeste, sur, este, norte) in zip(
+        capa["id_corr"].tolist(), capa["provincia_nombre"], capa["distrito_nombre"],
+        capa["corregimiento_nombre"], lons, lats, extensiones.tolist()
+    ):
+        lat = float(lat) if np.isfinite(lat) else center_lat
+        lon = float(lon) if np.isfinite(lon) else center_lon
+        corregimientos_info[corr_id] = {
+            'name': corr_name,
+            'prov': prov_name,
+            'dist': dist_name,
+            'lat': round(lat, decimals),
+            'lon': round(lon, decimals),
+            'bounds': [[round(sur, decimals), round(oeste, decimals)],
+                       [round(norte, decimals), round(este, decimals)]],
+        }
+        provincias_data.setdefault(prov_name, {}).setdefault(dist_name, []).append([corr_id, corr_name])
+
+    for distritos in provincias_data.values():
+        for corregimientos in distritos.values():
+            corregimientos.sort(key=lambda item: item[1])
+
     # Convertir a JSON para JavaScript
-    import json
-    provincias_json = json.dumps(provincias_data)
-    corregimientos_coords_json = json.dumps(corregimientos_coords)
+    provincias_json = json.dumps(provincias_data, ensure_ascii=False)
+    corregimientos_info_json = json.dumps(corregimientos_info, ensure_ascii=False)
     
     # Agregar panel de búsqueda en esquina superior izquierda
     search_panel_html = f"""
@@ -474,6 +1187,11 @@ def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"
         
         <p style="margin: 0 0 8px 0; font-weight: bold; font-size: 13px;">🔍 Buscar Corregimiento</p>
         
+        <div style="margin-bottom: 8px;">
+            <label style="display: block; font-size: 11px; color: #666; margin-bottom: 2px;">Código (id_corr):</label>
+            <input id="codigo-input" type="text" inputmode="numeric" placeholder="Ej. 80812 + Enter" style="width: 100%; box-sizing: border-box; padding: 5px; font-size: 11px; border: 1px solid #ccc; border-radius: 3px;">
+        </div>
+        
         <div style="margin-bottom: 8px;">
             <label style="display: block; font-size: 11px; color: #666; margin-bottom: 2px;">Provincia:</label>
             <select id="provincia-select" style="width: 100%; padding: 5px; font-size: 11px; border: 1px solid #ccc; border-radius: 3px;">
@@ -505,26 +1223,71 @@ def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"
         </div>
         
         <p style="margin: 0; font-size: 9px; color: #999;">
-            Selecciona provincia, distrito y corregimiento para navegar
+            Escribe el código o selecciona provincia, distrito y corregimiento
         </p>
     </div>
     """
     m.get_root().html.add_child(folium.Element(search_panel_html))
     
     # Agregar JavaScript para interactividad de búsqueda (CON DEBUG)
+    map_name = m.get_name()
     search_script = f"""
     <script>
     console.log('🗺️ Script de búsqueda cargado');
     
+    // provinciasData: provincia → distrito → [[id_corr, nombre], ...]
+    // corregimientosInfo: id_corr → nombre, provincia, distrito, punto y extensión
     var provinciasData = {provincias_json};
-    var corregimientosCoords = {corregimientos_coords_json};
+    var corregimientosInfo = {corregimientos_info_json};
+    var corregimientoResaltado = null;
     
-    console.log('📍 Corregimientos disponibles:', Object.keys(corregimientosCoords).length);
+    console.log('📍 Corregimientos disponibles:', Object.keys(corregimientosInfo).length);
+    
+    // Zoom a la extensión del corregimiento y resaltado, por código.
+    // capasPorId y capaCorregimientos los define el script de la capa; con
+    // drill-down los corregimientos pueden no estar cargados todavía, y el
+    // resaltado queda pendiente hasta alCargarCorregimientos()
+    var corregimientoPendiente = null;
+
+    function resaltarCorregimiento(id) {{
+        // Restaurar el resaltado anterior con el estilo de la métrica activa
+        if (corregimientoResaltado) {{
+            capaCorregimientos.resetStyle(corregimientoResaltado);
+            corregimientoResaltado = null;
+        }}
+        var layer = capasPorId[id];
+        if (!layer) {{
+            corregimientoPendiente = id;
+            return;
+        }}
+        layer.setStyle({{weight: 3, opacity: 1, fillOpacity: 0.9}});
+        layer.bringToFront();
+        corregimientoResaltado = layer;
+    }}
+
+    function alCargarCorregimientos() {{
+        if (corregimientoPendiente !== null) {{
+            var id = corregimientoPendiente;
+            corregimientoPendiente = null;
+            resaltarCorregimiento(id);
+        }}
+    }}
+
+    function irACorregimiento(id) {{
+        var info = corregimientosInfo[id];
+        if (!info) {{
+            return false;
+        }}
+        {map_name}.fitBounds(info.bounds, {{maxZoom: 13}});
+        resaltarCorregimiento(id);
+        return true;
+    }}
     
      // Inicializar búsqueda
      function inicializarBusqueda() {{
          console.log('⏱️ Inicializando búsqueda...');
          
+         var codigoInput = document.getElementById('codigo-input');
          var provinciaSelect = document.getElementById('provincia-select');
          var distritosSelect = document.getElementById('distrito-select');
          var corregimientosSelect = document.getElementById('corregimiento-select');
@@ -539,150 +1302,94 @@ def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"
          
          console.log('✅ Panel de búsqueda encontrado');
         
+        function agregarOpcion(select, valor, texto) {{
+            var option = document.createElement('option');
+            option.value = valor;
+            option.text = texto;
+            select.appendChild(option);
+        }}
+        
+        function llenarDistritos(provincia) {{
+            distritosSelect.innerHTML = '<option value="">-- Seleccionar Distrito --</option>';
+            distritosSelect.disabled = !provincia;
+            if (!provincia) return;
+            Object.keys(provinciasData[provincia]).sort().forEach(function(distrito) {{
+                agregarOpcion(distritosSelect, distrito, distrito);
+            }});
+        }}
+        
+        function llenarCorregimientos(provincia, distrito) {{
+            corregimientosSelect.innerHTML = '<option value="">-- Seleccionar Corregimiento --</option>';
+            corregimientosSelect.disabled = !distrito;
+            if (!distrito) return;
+            provinciasData[provincia][distrito].forEach(function(correg) {{
+                agregarOpcion(corregimientosSelect, correg[0], correg[1] + ' (' + correg[0] + ')');
+            }});
+        }}
+        
         // Llenar provincias
         var provincias = Object.keys(provinciasData).sort();
         console.log('🏘️ Provincias cargadas:', provincias);
-        
         provincias.forEach(function(provincia) {{
-            var option = document.createElement('option');
-            option.value = provincia;
-            option.text = provincia;
-            provinciaSelect.appendChild(option);
+            agregarOpcion(provinciaSelect, provincia, provincia);
         }});
         
         // Cambio de provincia
         provinciaSelect.addEventListener('change', function() {{
             console.log('📍 Provincia seleccionada:', this.value);
-            distritosSelect.innerHTML = '<option value="">-- Seleccionar Distrito --</option>';
-            corregimientosSelect.innerHTML = '<option value="">-- Seleccionar Corregimiento --</option>';
-            corregimientosSelect.disabled = true;
+            llenarDistritos(this.value);
+            llenarCorregimientos(this.value, '');
             zoomButton.disabled = true;
-            
-            if (this.value === '') {{
-                distritosSelect.disabled = true;
-                return;
-            }}
-            
-            distritosSelect.disabled = false;
-            Object.keys(provinciasData[this.value]).sort().forEach(function(distrito) {{
-                var option = document.createElement('option');
-                option.value = distrito;
-                option.text = distrito;
-                distritosSelect.appendChild(option);
-            }});
         }});
         
         // Cambio de distrito
         distritosSelect.addEventListener('change', function() {{
             console.log('🏢 Distrito seleccionado:', this.value);
-            corregimientosSelect.innerHTML = '<option value="">-- Seleccionar Corregimiento --</option>';
+            llenarCorregimientos(provinciaSelect.value, this.value);
             zoomButton.disabled = true;
-            
-            if (this.value === '') {{
-                corregimientosSelect.disabled = true;
-                return;
-            }}
-            
-            corregimientosSelect.disabled = false;
-            var corregimientos = provinciasData[provinciaSelect.value][this.value];
-            corregimientos.forEach(function(correg) {{
-                var option = document.createElement('option');
-                option.value = correg.name;
-                option.text = correg.name;
-                corregimientosSelect.appendChild(option);
-            }});
         }});
         
-        // Cambio de corregimiento
+        // Cambio de corregimiento (el valor es el id_corr)
         corregimientosSelect.addEventListener('change', function() {{
             console.log('🏘️ Corregimiento seleccionado:', this.value);
             zoomButton.disabled = (this.value === '');
-            console.log('🔘 Botón zoom habilitado:', !zoomButton.disabled);
         }});
         
-        // Variable para guardar el layer previamente resaltado
-        var previousHighlightedLayer = null;
-        
         // Click en botón: hacer zoom y resaltar corregimiento
         zoomButton.addEventListener('click', function() {{
-            var corregimientoNombre = corregimientosSelect.value;
-            var coords = corregimientosCoords[corregimientoNombre];
-            
-            if (!corregimientoNombre || !coords) {{
-                return;
-            }}
-            
-            // Buscar el mapa en window
-            var leafletMap = null;
-            for (var key in window) {{
-                try {{
-                    if (window[key] && window[key].setView && typeof window[key].setView === 'function') {{
-                        leafletMap = window[key];
-                        break;
-                    }}
-                }} catch(e) {{}}
-            }}
-            
-            if (!leafletMap) {{
-                return;
-            }}
-            
-            // Hacer zoom
-            leafletMap.setView([coords.lat, coords.lon], 10);
-            
-            // Resetear el layer previamente resaltado
-            if (previousHighlightedLayer && previousHighlightedLayer.setStyle) {{
-                previousHighlightedLayer.setStyle({{
-                    weight: 0.5,
-                    opacity: 0.7,
-                    fillOpacity: 0.8
-                }});
-            }}
-            
-            // Buscar el layer del corregimiento actual
-            if (leafletMap._layers) {{
-                for (var layerId in leafletMap._layers) {{
-                    var layer = leafletMap._layers[layerId];
-                    
-                    if (layer.feature && layer.feature.properties) {{
-                        var props = layer.feature.properties;
-                        var layerCorregName = props['corregimiento_nombre'] || props['corregimiento'] || props['name'] || '';
-                        
-                        if (layerCorregName.toUpperCase() === corregimientoNombre.toUpperCase()) {{
-                            // Resaltar el nuevo layer
-                            if (layer.setStyle) {{
-                                layer.setStyle({{
-                                    weight: 3,
-                                    opacity: 1,
-                                    fillOpacity: 0.9
-                                }});
-                                previousHighlightedLayer = layer;
-                            }}
-                            break;
-                        }}
-                    }}
-                }}
-            }}
+            irACorregimiento(corregimientosSelect.value);
+        }});
+        
+        // Código + Enter: zoom directo y sincronizar los selectores
+        codigoInput.addEventListener('keydown', function(e) {{
+            if (e.key !== 'Enter') return;
+            var id = this.value.trim();
+            var info = corregimientosInfo[id];
+            this.style.borderColor = info ? '#ccc' : '#dc3545';
+            if (!info) return;
+            provinciaSelect.value = info.prov;
+            llenarDistritos(info.prov);
+            distritosSelect.value = info.dist;
+            llenarCorregimientos(info.prov, info.dist);
+            corregimientosSelect.value = id;
+            zoomButton.disabled = false;
+            irACorregimiento(id);
         }});
         
         // Click en botón: limpiar todo
         clearButton.addEventListener('click', function() {{
             // Resetear los dropdowns
+            codigoInput.value = '';
+            codigoInput.style.borderColor = '#ccc';
             provinciaSelect.value = '';
-            distritosSelect.innerHTML = '<option value="">-- Seleccionar Distrito --</option>';
-            distritosSelect.disabled = true;
-            corregimientosSelect.innerHTML = '<option value="">-- Seleccionar Corregimiento --</option>';
-            corregimientosSelect.disabled = true;
+            llenarDistritos('');
+            llenarCorregimientos('', '');
             zoomButton.disabled = true;
             
             // Resetear el layer resaltado
-            if (previousHighlightedLayer && previousHighlightedLayer.setStyle) {{
-                previousHighlightedLayer.setStyle({{
-                    weight: 0.5,
-                    opacity: 0.7,
-                    fillOpacity: 0.8
-                }});
-                previousHighlightedLayer = null;
+            if (corregimientoResaltado) {{
+                capaCorregimientos.resetStyle(corregimientoResaltado);
+                corregimientoResaltado = null;
             }}
         }});
      }}
@@ -699,36 +1406,20 @@ def create_choropleth(gdf, metric="cobertura", output_file="mapa_cobertura.html"
     """
     m.get_root().html.add_child(folium.Element(search_script))
 
-    # Agregar escala de colores (leyenda aproximada)
-    legend_html = f"""
-    <div style="position: fixed; 
+    # Agregar escala de colores (leyenda aproximada de la métrica activa)
+    legend_box = f"""
+    <div id="leyenda-metrica" style="position: fixed; 
             bottom: 50px; right: 50px; width: 250px; height: auto; 
             background-color: white; border:2px solid grey; z-index:9999; 
             font-size:12px; padding: 10px; border-radius: 5px;">
-        <p style="margin: 0 0 10px 0; font-weight: bold;">{color_config['name']}</p>
-        <div style="display: flex; align-items: center; margin: 5px 0;">
-            <div style="width: 20px; height: 20px; background-color: #00cc00; margin-right: 5px;"></div>
-            <span>Alto (>{vmax * 0.75:.0f})</span>
-        </div>
-        <div style="display: flex; align-items: center; margin: 5px 0;">
-            <div style="width: 20px; height: 20px; background-color: #ffff00; margin-right: 5px;"></div>
-            <span>Medio ({vmax * 0.5:.0f} - {vmax * 0.75:.0f})</span>
-        </div>
-        <div style="display: flex; align-items: center; margin: 5px 0;">
-            <div style="width: 20px; height: 20px; background-color: #ff0000; margin-right: 5px;"></div>
-            <span>Bajo ({vmin:.0f} - {vmax * 0.5:.0f})</span>
-        </div>
-        <p style="margin: 10px 0 0 0; font-size: 10px; color: #666;">
-            Datos: Censo/MDP 2023<br>
-            Planilla: 20261
-        </p>
+        {metricas_js[metrics[0]]['legend'][min(capas_nivel or ["corregimientos"], key=LEVEL_ZOOM.get)]}
     </div>
     """
-    m.get_root().html.add_child(folium.Element(legend_html))
+    m.get_root().html.add_child(folium.Element(legend_box))
 
     # Guardar
     m.save(output_file)
-    print(f"✓ Mapa guardado: {output_file}")
+    print(f"✓ Mapa guardado: {output_file} ({os.path.getsize(output_file) / 1024:.0f} KB)")
 
     return output_file
 
@@ -740,12 +1431,59 @@ def main():
     parser.add_argument(
         "--metric",
         default="cobertura",
-        choices=["cobertura", "gap", "pobreza_general", "pobreza_extrema", "cobertura_menores"],
-        help="Métrica a visualizar",
+        choices=METRICS + ["todas"],
+        help="Métrica a visualizar (todas: un solo mapa con selector de métrica)",
     )
     parser.add_argument(
         "--output", default="mapa_cobertura.html", help="Archivo de salida HTML"
     )
+    parser.add_argument(
+        "--detail",
+        default="medio",
+        choices=list(DETALLES),
+        help="Nivel de detalle de la geometría (default: medio; ver preparar_geo.py)",
+    )
+    parser.add_argument(
+        "--format",
+        default="geojson",
+        choices=["geojson", "topojson"],
+        help="Codificación de la geometría en el mapa (topojson: arcos compartidos, "
+             "además guarda <salida>.topojson)",
+    )
+    parser.add_argument(
+        "--classification",
+        default="lineal",
+        choices=METODOS,
+        help="Clasificación de colores: lineal (continua), intervalos, cuantiles o jenks "
+             "(default: lineal)",
+    )
+    parser.add_argument(
+        "--classes", type=int, default=5, help="Número de clases (default: 5)"
+    )
+    parser.add_argument(
+        "--drilldown",
+        action="store_true",
+        help="Provincias al alejar, distritos y corregimientos al acercar (se cargan "
+             "desde <salida>_<nivel>.js; requiere preparar_geo.py)",
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Geometría y métricas como recursos aparte (assets/, con hash y .gz/.br); "
+             "el HTML los pide al abrirse (requiere servidor HTTP)",
+    )
+    parser.add_argument(
+        "--details",
+        action="store_true",
+        help="Escribir detalle/<id_corr>.json junto al HTML; el popup lo pide al abrirse "
+             "(programa, sexo, elegibilidad, menores; requiere servidor HTTP)",
+    )
+    parser.add_argument(
+        "--hotspot-column",
+        default="gap",
+        choices=autocorrelacion.COLUMNAS,
+        help="Variable de la métrica hotspots (Gi* por corregimiento; default: gap)",
+    )
     parser.add_argument(
         "--show", action="store_true", help="Abrir en navegador después de crear"
     )
@@ -754,12 +1492,25 @@ def main():
 
     try:
         # Cargar datos
-        gdf = load_data()
+        gdf = load_data(args.detail)
+        levels = load_levels(gdf) if args.drilldown else None
+        if args.details:
+            detalle_corregimientos.escribir_detalles(os.path.dirname(args.output) or ".", DB_PATH)
 
         # Crear choropleth
-        output_file = create_choropleth(gdf, metric=args.metric, output_file=args.output)
+        output_file = create_choropleth(
+            gdf, metric=METRICS if args.metric == "todas" else args.metric,
+            output_file=args.output, decimals=DETALLES[args.detail],
+            output_format=args.format, classification=args.classification,
+            n_classes=args.classes, levels=levels, bundle=args.bundle, details=args.details,
+            hotspot_column=args.hotspot_column,
+        )
 
-        if args.show:
+        if args.show and (args.bundle or args.details):
+            # fetch no funciona desde file://: servir el directorio del mapa
+            recursos_web.servir(os.path.dirname(output_file) or ".",
+                                pagina=os.path.basename(output_file))
+        elif args.show:
             print(f"\n🌐 Abriendo en navegador...")
             webbrowser.open(f"file://{os.path.abspath(output_file)}")
 
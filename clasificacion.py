@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Clasificación de valores en colores para los mapas (vectorizada con NumPy)
+
+Asigna un color a cada corregimiento de una sola vez (sin funciones por
+fila) y arma la leyenda con los mismos cortes, de modo que lo que se ve en
+el mapa y en la leyenda siempre coincide.
+
+Métodos:
+    lineal      color continuo entre vmin y vmax (la leyenda muestra 5 tramos)
+    intervalos  clases de igual amplitud entre el mínimo y el máximo
+    cuantiles   clases con la misma cantidad de corregimientos
+    jenks       cortes naturales de Jenks (Fisher): minimiza la varianza
+                dentro de cada clase
+
+Para valores que ya son clases (p. ej. puntos calientes de
+autocorrelacion.py), clasificar_categorias asigna un color fijo a cada una.
+
+Paletas: RdYlGn, YlOrRd, Reds, Blues (las de get_color_scale); para una
+métrica nueva basta con indicar "colormap" en su configuración.
+
+Uso:
+    from clasificacion import clasificar
+
+    c = clasificar(gdf["cobertura_pct"], "RdYlGn", metodo="jenks", clases=5)
+    c.colores                    # un color hex por valor
+    c.leyenda_html("Cobertura (%)", "{:.2f}%")
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+METODOS = ["lineal", "intervalos", "cuantiles", "jenks"]
+
+# Color para valores faltantes
+COLOR_NULO = "#888888"
+
+# Paradas de color de cada paleta (de valor bajo a alto)
+PALETAS = {
+    "RdYlGn": ["#ff0000", "#ffff00", "#00ff00"],  # Rojo → Amarillo → Verde
+    "YlOrRd": ["#ffff00", "#ff9b00", "#ff0000"],  # Amarillo → Naranja → Rojo
+    "Reds": ["#646464", "#ff0000"],               # Gris a Rojo
+    "Blues": ["#646464", "#0000ff"],              # Gris a Azul
+}
+
+# Con más valores que esto, Jenks se calcula sobre una muestra por cuantiles
+_JENKS_MAX_VALORES = 3000
+
+
+def _rgb(paleta: str) -> np.ndarray:
+    paradas = PALETAS.get(paleta, ["#000000", "#c8c8c8"])
+    return np.array([[int(h[i:i + 2], 16) for i in (1, 3, 5)] for h in paradas], dtype=float)
+
+
+def colores_paleta(posiciones, paleta: str) -> np.ndarray:
+    """Colores hex para posiciones en [0, 1] de la paleta (interpolación lineal)"""
+    posiciones = np.clip(np.asarray(posiciones, dtype=float), 0, 1)
+    rgb = _rgb(paleta)
+    paradas = np.linspace(0, 1, len(rgb))
+    canales = np.column_stack([np.interp(posiciones, paradas, rgb[:, i]) for i in range(3)])
+    canales = canales.round().astype(int)
+    return np.array([f"#{r:02x}{g:02x}{b:02x}" for r, g, b in canales], dtype=object)
+
+
+def cortes_jenks(valores: np.ndarray, clases: int) -> np.ndarray:
+    """Cortes naturales de Jenks (algoritmo de Fisher, programación dinámica).
+
+    Para cada cantidad de clases m y cada fin j, el costo mínimo es
+    min_i costo[m-1, i-1] + SSD(i..j); SSD sale de sumas acumuladas y la
+    minimización sobre i es vectorial.
+    """
+    x = np.sort(valores)
+    if len(x) > _JENKS_MAX_VALORES:
+        x = np.quantile(x, np.linspace(0, 1, _JENKS_MAX_VALORES))
+    n = len(x)
+    clases = min(clases, len(np.unique(x)))
+    if clases < 2:
+        return np.array([x[0], x[-1]])
+
+    s1 = np.concatenate([[0.0], np.cumsum(x)])
+    s2 = np.concatenate([[0.0], np.cumsum(x * x)])
+    i = np.arange(n)[:, None]          # inicio de la última clase
+    j = np.arange(n)[None, :]          # fin de la última clase
+    cuenta = np.maximum(j - i + 1, 1)
+    suma = s1[j + 1] - s1[i]
+    ssd = np.where(j >= i, s2[j + 1] - s2[i] - suma * suma / cuenta, np.inf)
+
+    costo = ssd[0].copy()              # una clase: de 0 a j
+    inicio = np.zeros((clases, n), dtype=int)
+    for m in range(1, clases):
+        # costo previo hasta i-1 (i >= 1) + SSD de i a j
+        candidatos = np.full((n, n), np.inf)
+        candidatos[1:] = costo[:-1, None] + ssd[1:]
+        inicio[m] = candidatos.argmin(axis=0)
+        costo = candidatos.min(axis=0)
+
+    cortes = [x[-1]]
+    fin = n - 1
+    for m in range(clases - 1, 0, -1):
+        k = inicio[m, fin]
+        cortes.append(x[k - 1])
+        fin = k - 1
+    cortes.append(x[0])
+    return np.array(cortes[::-1])
+
+
+@dataclass
+class Clasificacion:
+    """Resultado: un color por valor y los cortes/colores de cada clase"""
+    metodo: str
+    colores: np.ndarray       # color hex de cada valor
+    cortes: np.ndarray        # límites de clase (clases + 1)
+    colores_clase: list       # color de cada clase (para la leyenda)
+    etiquetas: list = None    # texto de cada clase (solo categorías)
+
+    def leyenda_html(self, titulo: str, formato: str = "{:,.2f}", nota: str = "") -> str:
+        """Contenido HTML de la leyenda, de la clase más alta a la más baja"""
+        filas = []
+        if self.etiquetas is not None:
+            textos = self.etiquetas
+        else:
+            textos = [f"{formato.format(desde)} – {formato.format(hasta)}"
+                      for desde, hasta in zip(self.cortes[:-1], self.cortes[1:])]
+        for texto, color in reversed(list(zip(textos, self.colores_clase))):
+            filas.append(
+                f'<div style="display: flex; align-items: center; margin: 3px 0;">'
+                f'<div style="width: 20px; height: 14px; background-color: {color}; '
+                f'border: 1px solid #999; margin-right: 6px;"></div>'
+                f'<span>{texto}</span></div>'
+            )
+        etiqueta = {"lineal": "escala continua", "intervalos": "intervalos iguales",
+                    "cuantiles": "cuantiles", "jenks": "cortes naturales (Jenks)",
+                    "categorias": "categorías"}[self.metodo]
+        return (
+            f'<p style="margin: 0 0 8px 0; font-weight: bold;">{titulo}</p>'
+            + "".join(filas)
+            + f'<p style="margin: 8px 0 0 0; font-size: 10px; color: #666;">Clasificación: {etiqueta}'
+            + (f"<br>{nota}" if nota else "") + "</p>"
+        )
+
+
+def clasificar(valores, paleta: str, metodo: str = "lineal", clases: int = 5,
+               vmin: float = None, vmax: float = None) -> Clasificacion:
+    """
+    Clasifica todos los valores a la vez.
+
+    vmin/vmax fijan el rango de la escala lineal y de los intervalos (por
+    defecto, el mínimo y máximo de los datos).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método de clasificación no válido: {metodo}")
+    valores = np.asarray(valores, dtype=float)
+    validos = valores[~np.isnan(valores)]
+    colores = np.full(len(valores), COLOR_NULO, dtype=object)
+    if len(validos) == 0:
+        return Clasificacion(metodo, colores, np.array([0.0, 0.0]), [COLOR_NULO])
+
+    bajo = np.nanmin(validos) if vmin is None else vmin
+    alto = np.nanmax(validos) if vmax is None else vmax
+    nulos = np.isnan(valores)
+
+    if metodo == "lineal":
+        rango = alto - bajo
+        posicion = np.full(len(valores), 0.5) if rango == 0 else (valores - bajo) / rango
+        colores[~nulos] = colores_paleta(posicion[~nulos], paleta)
+        cortes = np.linspace(bajo, alto, clases + 1)
+        colores_clase = colores_paleta((np.arange(clases) + 0.5) / clases, paleta).tolist()
+        return Clasificacion(metodo, colores, cortes, colores_clase)
+
+    if metodo == "intervalos":
+        cortes = np.linspace(bajo, alto, clases + 1)
+    elif metodo == "cuantiles":
+        cortes = np.unique(np.quantile(validos, np.linspace(0, 1, clases + 1)))
+    else:
+        cortes = cortes_jenks(validos, clases)
+    if len(cortes) < 2:
+        cortes = np.array([bajo, alto])
+
+    n_clases = len(cortes) - 1
+    # Clase de cada valor: los cortes interiores separan; los extremos se incluyen
+    clase = np.clip(np.searchsorted(cortes[1:-1], valores, side="left"), 0, n_clases - 1)
+    colores_clase = colores_paleta(
+        np.arange(n_clases) / (n_clases - 1) if n_clases > 1 else [0.5], paleta
+    ).tolist()
+    colores[~nulos] = np.array(colores_clase, dtype=object)[clase[~nulos]]
+    return Clasificacion(metodo, colores, cortes, colores_clase)
+
+
+def clasificar_categorias(valores, categorias) -> Clasificacion:
+    """
+    Un color fijo por valor: categorias es [(valor, etiqueta, color), ...]
+    de la clase más baja a la más alta. Valores faltantes o fuera de la
+    lista quedan con COLOR_NULO.
+    """
+    valores = np.asarray(valores, dtype=float)
+    claves = np.array([float(valor) for valor, _, _ in categorias])
+    colores_clase = [color for _, _, color in categorias]
+    if np.any(np.diff(claves) <= 0):
+        raise ValueError("Los valores de las categorías deben ir en orden creciente")
+    posicion = np.clip(np.searchsorted(claves, valores), 0, len(claves) - 1)
+    encontrados = claves[posicion] == valores
+    colores = np.full(len(valores), COLOR_NULO, dtype=object)
+    colores[encontrados] = np.array(colores_clase, dtype=object)[posicion[encontrados]]
+    return Clasificacion("categorias", colores, claves, colores_clase,
+                         [etiqueta for _, etiqueta, _ in categorias])
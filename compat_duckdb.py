@@ -0,0 +1,22 @@
+"""
+Compatibilidad entre versiones de DuckDB para leer resultados como Arrow
+
+DuckDB 1.5 reemplazó fetch_arrow_table() y fetch_record_batch() por
+to_arrow_table() y to_arrow_reader() (las anteriores avisan que están
+obsoletas). Estas funciones usan la nueva si existe y, si no, la anterior.
+Sin dependencias: sirven tanto a pysql.py como a los reportes y mapas.
+"""
+
+
+def tabla_arrow(resultado):
+    """Materializa un resultado DuckDB como tabla Arrow"""
+    if hasattr(resultado, 'to_arrow_table'):
+        return resultado.to_arrow_table()
+    return resultado.fetch_arrow_table()
+
+
+def lector_arrow(resultado, filas_por_lote):
+    """Lee un resultado DuckDB como RecordBatchReader de Arrow, por lotes"""
+    if hasattr(resultado, 'to_arrow_reader'):
+        return resultado.to_arrow_reader(filas_por_lote)
+    return resultado.fetch_record_batch(filas_por_lote)
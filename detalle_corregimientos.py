@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Detalle de beneficiarios por corregimiento, para los popups del mapa
+
+Escribe un JSON chico por corregimiento en <output-dir>/detalle/<id_corr>.json,
+que el mapa pide recién al abrir el popup (choropleth_cobertura.py --details):
+el HTML no crece con el desglose de los ~700 corregimientos.
+
+Cada archivo tiene, por programa de la planilla: total, mujeres, hombres,
+elegibilidad interpretada (elegibles, no elegibles, sin FUPS, sin PMT) y
+menores de 18 en los hogares; además los menores del censo por grupo de
+edad:
+
+    {"id_corr": 80812,
+     "programas": {"RED DE OPORTUNIDADES": {"total": 120, "mujeres": 70, ...}, ...},
+     "menores_censo": {"0-5": 310, "6-11": 402, "12-17": 377}}
+
+Con --parquet también deja las mismas tablas particionadas por
+corregimiento (programas/id_correg=<id>/..., menores_censo/id_correg=<id>/...)
+para leerlas con DuckDB o pandas sin pasar por la base.
+
+Uso:
+    python detalle_corregimientos.py --output-dir mapas
+    python detalle_corregimientos.py --output-dir mapas --parquet data/detalle
+"""
+
+import argparse
+import glob
+import json
+import os
+import time
+
+import duckdb
+
+DB_PATH = "censo_2023.duckdb"
+
+# Subdirectorio de los JSON, junto a los HTML de los mapas
+DIRECTORIO = "detalle"
+
+# Desglose por programa (elegibilidad interpretada como en codificadores.md)
+PROGRAMAS_SQL = """
+    SELECT
+        id_correg,
+        Programa as programa,
+        COUNT(*) as total,
+        COUNT(CASE WHEN Sexo = 'Mujer' THEN 1 END) as mujeres,
+        COUNT(CASE WHEN Sexo = 'Hombre' THEN 1 END) as hombres,
+        COUNT(CASE WHEN Elegibilidad = 'ELEGIBLE' THEN 1 END) as elegibles,
+        COUNT(CASE WHEN Elegibilidad = 'NO ELEGIBLE' THEN 1 END) as no_elegibles,
+        COUNT(CASE WHEN Elegibilidad IS NULL AND Fecha_Ultima_FUPS IS NULL THEN 1 END) as sin_fups,
+        COUNT(CASE WHEN Elegibilidad IS NULL AND Fecha_Ultima_FUPS IS NOT NULL THEN 1 END) as sin_pmt,
+        COALESCE(SUM(Menores_18), 0) as menores_18
+    FROM planilla
+    WHERE id_correg IS NOT NULL
+    GROUP BY id_correg, Programa
+    ORDER BY id_correg, Programa
+"""
+
+# Menores de 18 del censo por grupo de edad
+MENORES_CENSO_SQL = """
+    SELECT
+        id_correg,
+        CASE WHEN edad < 6 THEN '0-5' WHEN edad < 12 THEN '6-11' ELSE '12-17' END as grupo_edad,
+        COUNT(*) as menores
+    FROM (
+        SELECT
+            CONCAT(
+                LPAD(PROVINCIA, 2, '0'),
+                LPAD(DISTRITO, 2, '0'),
+                LPAD(CORREG, 2, '0')
+            )::BIGINT as id_correg,
+            CAST(P03_EDAD AS INTEGER) as edad
+        FROM personas
+        WHERE P03_EDAD IS NOT NULL
+    )
+    WHERE edad < 18
+    GROUP BY 1, 2
+    ORDER BY 1, 2
+"""
+
+GRUPOS_EDAD = ["0-5", "6-11", "12-17"]
+
+
+def construir_detalles(conn) -> dict:
+    """{id_corr: detalle} desde planilla y personas (dos consultas agregadas)"""
+    detalles = {}
+
+    def detalle(id_corr):
+        return detalles.setdefault(int(id_corr), {
+            "id_corr": int(id_corr),
+            "programas": {},
+            "menores_censo": dict.fromkeys(GRUPOS_EDAD, 0),
+        })
+
+    resultado = conn.execute(PROGRAMAS_SQL)
+    columnas = [d[0] for d in resultado.description]
+    for fila in resultado.fetchall():
+        registro = dict(zip(columnas, fila))
+        id_corr = registro.pop("id_correg")
+        programa = registro.pop("programa") or "SIN PROGRAMA"
+        detalle(id_corr)["programas"][programa] = {k: int(v) for k, v in registro.items()}
+
+    for id_corr, grupo, menores in conn.execute(MENORES_CENSO_SQL).fetchall():
+        detalle(id_corr)["menores_censo"][grupo] = int(menores)
+
+    return detalles
+
+
+def escribir_parquet(conn, directorio: str):
+    """Las dos tablas de detalle particionadas por id_correg (Hive); reemplaza lo anterior"""
+    os.makedirs(directorio, exist_ok=True)
+    for nombre, sql in (("programas", PROGRAMAS_SQL), ("menores_censo", MENORES_CENSO_SQL)):
+        destino = os.path.join(directorio, nombre)
+        ruta_sql = destino.replace("'", "''")
+        conn.execute(
+            f"COPY ({sql}) TO '{ruta_sql}' "
+            f"(FORMAT PARQUET, PARTITION_BY (id_correg), OVERWRITE true)"
+        )
+        print(f"   ✓ Parquet: {destino}/id_correg=<id>/")
+
+
+def escribir_detalles(output_dir: str = ".", db_path: str = DB_PATH, parquet_dir: str = None) -> int:
+    """Escribe <output_dir>/detalle/<id_corr>.json; retorna cuántos corregimientos
+
+    Borra los JSON de corregimientos que ya no aparecen en los datos.
+    """
+    inicio = time.perf_counter()
+    directorio = os.path.join(output_dir, DIRECTORIO)
+    os.makedirs(directorio, exist_ok=True)
+    print(f"📥 Detalle por corregimiento (planilla + censo) → {directorio}/")
+
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        detalles = construir_detalles(conn)
+        if parquet_dir:
+            escribir_parquet(conn, parquet_dir)
+    finally:
+        conn.close()
+
+    total_bytes = 0
+    for id_corr, detalle in detalles.items():
+        contenido = json.dumps(detalle, ensure_ascii=False, separators=(",", ":"))
+        with open(os.path.join(directorio, f"{id_corr}.json"), "w", encoding="utf-8") as f:
+            f.write(contenido)
+        total_bytes += len(contenido.encode("utf-8"))
+
+    vigentes = {f"{id_corr}.json" for id_corr in detalles}
+    viejos = [ruta for ruta in glob.glob(os.path.join(directorio, "*.json"))
+              if os.path.basename(ruta) not in vigentes]
+    for ruta in viejos:
+        os.remove(ruta)
+
+    promedio = total_bytes / len(detalles) if detalles else 0
+    print(f"   ✓ {len(detalles)} corregimientos ({promedio / 1024:.1f} KB promedio"
+          + (f", {len(viejos)} obsoletos borrados" if viejos else "")
+          + f", {time.perf_counter() - inicio:.1f} s)")
+    return len(detalles)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Detalle de beneficiarios por corregimiento para los popups del mapa"
+    )
+    parser.add_argument("--output-dir", default="mapas",
+                        help="Directorio de los mapas; los JSON van en <dir>/detalle/ (default: mapas)")
+    parser.add_argument("--duckdb", default=DB_PATH, help=f"Base DuckDB (default: {DB_PATH})")
+    parser.add_argument("--parquet", metavar="DIR",
+                        help="Además, Parquet particionado por corregimiento en DIR")
+    args = parser.parse_args()
+    escribir_detalles(args.output_dir, args.duckdb, args.parquet)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Escritura de Excel por lotes con memoria constante
+
+Escribe resultados que llegan como lotes de filas (listas de tuplas, p.ej.
+fetchmany de DuckDB) sin armar el libro completo en memoria:
+
+  - xlsxwriter en modo constant_memory (preferido, más rápido)
+  - openpyxl en modo write_only si xlsxwriter no está instalado
+
+Cuando un resultado supera el límite de filas de Excel (1,048,576 incluida
+la cabecera) continúa automáticamente en otra hoja: "Resultado",
+"Resultado (2)", ...
+
+Los formatos numéricos y anchos se fijan por columna a nivel de hoja (no
+celda por celda) y la cabecera lleva su propio estilo, de modo que el
+costo por fila es solo el valor.
+
+Uso:
+    from excel_streaming import StreamingExcelWriter
+
+    with StreamingExcelWriter("salida.xlsx") as libro:
+        filas = libro.write_sheet("Resultado", columnas, lotes)
+        libro.write_sheet("Resumen", columnas, lotes,
+                          formats={"poblacion": "#,##0", "tasa_pct": "0.0"})
+
+Requisitos:
+    pip install xlsxwriter     (o openpyxl)
+"""
+
+import datetime
+import decimal
+import itertools
+import uuid
+
+# Límite de filas por hoja de Excel (incluye la fila de cabecera)
+EXCEL_MAX_ROWS = 1048576
+
+# Caracteres no permitidos en nombres de hoja y largo máximo
+_SHEET_INVALID = '[]:*?/\\'
+_SHEET_MAX_LEN = 31
+
+# Estilo de la fila de cabecera
+HEADER_STYLE = {'bold': True, 'font_color': '#FFFFFF', 'bg_color': '#305496', 'border': 1}
+
+# Ancho mínimo y máximo de columna (caracteres)
+_MIN_WIDTH = 10
+_MAX_WIDTH = 50
+
+# Tipos que ambos motores escriben sin conversión
+_NATIVE_TYPES = (str, int, float, bool, decimal.Decimal,
+                 datetime.date, datetime.datetime, datetime.time)
+
+
+def _sheet_name(base: str, part: int) -> str:
+    """Nombre de hoja válido para Excel; part > 1 agrega el sufijo ' (n)'"""
+    name = ''.join('_' if c in _SHEET_INVALID else c for c in base).strip("'") or "Hoja"
+    suffix = f" ({part})" if part > 1 else ""
+    return name[:_SHEET_MAX_LEN - len(suffix)] + suffix
+
+
+def _as_text(value):
+    """Valores que Excel no representa (listas, structs, UUID, bytes) como texto"""
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+class StreamingExcelWriter:
+    """Libro Excel que se escribe hoja por hoja a partir de lotes de filas"""
+
+    def __init__(self, filename: str, max_rows: int = EXCEL_MAX_ROWS):
+        self.filename = filename
+        self.max_rows = max_rows
+        self.sheets = []
+        try:
+            import xlsxwriter
+            self.engine = "xlsxwriter"
+            self._workbook = xlsxwriter.Workbook(filename, {
+                'constant_memory': True,
+                'strings_to_formulas': False,
+                'strings_to_urls': False,
+                'nan_inf_to_errors': True,
+                'remove_timezone': True,
+                'default_date_format': 'yyyy-mm-dd',
+            })
+            self._header_format = self._workbook.add_format(HEADER_STYLE)
+            self._formats = {}
+        except ImportError:
+            from openpyxl import Workbook
+            self.engine = "openpyxl"
+            self._workbook = Workbook(write_only=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def write_sheet(self, name: str, columns, batches, formats: dict = None,
+                    widths: dict = None) -> int:
+        """
+        Escribe los lotes en una o más hojas y retorna el total de filas.
+
+        Cada hoja lleva la fila de cabecera; al llegar a max_rows se abre
+        la hoja siguiente con el mismo nombre base y un sufijo numerado.
+        formats y widths son diccionarios columna → formato numérico de
+        Excel / ancho; el ancho por defecto sale del largo de la cabecera.
+        """
+        columns = [str(c) for c in columns]
+        formats = formats or {}
+        widths = widths or {}
+        layout = [
+            (formats.get(c), widths.get(c, min(max(len(c) + 2, _MIN_WIDTH), _MAX_WIDTH)))
+            for c in columns
+        ]
+        per_sheet = self.max_rows - 1
+        rows = itertools.chain.from_iterable(batches)
+        total = 0
+        part = 0
+        sheet_rows = per_sheet
+        sheet = None
+        for row in rows:
+            if sheet_rows == per_sheet:
+                part += 1
+                sheet = self._add_sheet(_sheet_name(name, part), columns, layout)
+                sheet_rows = 0
+            sheet_rows += 1
+            self._append(sheet, sheet_rows, row, layout)
+            total += 1
+        if sheet is None:
+            # Resultado vacío: hoja solo con cabecera
+            self._add_sheet(_sheet_name(name, 1), columns, layout)
+        return total
+
+    def _number_format(self, num_format: str):
+        """Formato xlsxwriter compartido por todas las hojas con el mismo patrón"""
+        if num_format not in self._formats:
+            self._formats[num_format] = self._workbook.add_format({'num_format': num_format})
+        return self._formats[num_format]
+
+    def _add_sheet(self, name: str, columns, layout):
+        if self.engine == "xlsxwriter":
+            sheet = self._workbook.add_worksheet(name)
+            for value_type in (list, tuple, dict, bytes, bytearray, uuid.UUID):
+                sheet.add_write_handler(value_type, self._write_text)
+            # Formato y ancho por columna: aplican a toda celda escrita sin formato propio
+            for i, (num_format, width) in enumerate(layout):
+                sheet.set_column(i, i, width, self._number_format(num_format) if num_format else None)
+            sheet.write_row(0, 0, columns, self._header_format)
+            sheet.freeze_panes(1, 0)
+        else:
+            from openpyxl.cell import WriteOnlyCell
+            from openpyxl.styles import Font, PatternFill
+            from openpyxl.utils import get_column_letter
+            sheet = self._workbook.create_sheet(name)
+            for i, (_, width) in enumerate(layout, start=1):
+                sheet.column_dimensions[get_column_letter(i)].width = width
+            sheet.freeze_panes = 'A2'
+            color = HEADER_STYLE['bg_color'].lstrip('#')
+            header = []
+            for c in columns:
+                cell = WriteOnlyCell(sheet, value=c)
+                cell.font = Font(bold=True, color=HEADER_STYLE['font_color'].lstrip('#'))
+                cell.fill = PatternFill('solid', fgColor=color)
+                header.append(cell)
+            sheet.append(header)
+        self.sheets.append(name)
+        return sheet
+
+    def _append(self, sheet, row_num: int, row, layout):
+        if self.engine == "xlsxwriter":
+            sheet.write_row(row_num, 0, row)
+        else:
+            # openpyxl write_only no tiene formato por columna: se asigna por celda
+            from openpyxl.cell import WriteOnlyCell
+            values = []
+            for v, (num_format, _) in zip(row, layout):
+                if v is not None and not isinstance(v, _NATIVE_TYPES):
+                    v = _as_text(v)
+                if num_format and v is not None:
+                    cell = WriteOnlyCell(sheet, value=v)
+                    cell.number_format = num_format
+                    v = cell
+                values.append(v)
+            sheet.append(values)
+
+    @staticmethod
+    def _write_text(sheet, row, col, value, cell_format=None):
+        return sheet.write_string(row, col, _as_text(value), cell_format)
+
+    def close(self):
+        if self._workbook is not None:
+            if self.engine == "xlsxwriter":
+                self._workbook.close()
+            else:
+                self._workbook.save(self.filename)
+            self._workbook = None
@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+"""
+Exporta los corregimientos como teselas vectoriales (Mapbox Vector Tiles)
+
+En lugar de embeber toda la geometría en un HTML, el país se corta en
+teselas z/x/y: el visor descarga solo las que están en pantalla, al nivel
+de zoom actual. Cada zoom usa la geometría simplificada que le corresponde
+(preparar_geo.py) y las coordenadas se cuantizan a la grilla de la tesela
+(4096 × 4096), así que a zoom bajo cada tesela pesa muy poco.
+
+Salida (todo local, funciona sin internet):
+
+    teselas/{z}/{x}/{y}.pbf   teselas MVT sin comprimir (las vacías no se escriben)
+    teselas/metadata.json     TileJSON + métricas (nombre, formato, leyenda)
+    teselas/index.html        visor en canvas, sin dependencias externas
+    --mbtiles archivo         además, un MBTiles (SQLite, teselas con gzip)
+
+Cada feature lleva id_corr, nombres, y por métrica el valor (v_<métrica>)
+y el color ya clasificado (color_<métrica>), igual que los mapas de
+choropleth_cobertura.py.
+
+Uso:
+    python exportar_teselas.py                          # zoom 5 a 12 en teselas/
+    python exportar_teselas.py --zoom 6 10 --classification jenks
+    python exportar_teselas.py --mbtiles corregimientos.mbtiles
+    python exportar_teselas.py --servir                 # exportar y abrir http://localhost:8000
+    python exportar_teselas.py --solo-servir            # servir lo ya exportado
+
+El visor pide las teselas con fetch(), que los navegadores no permiten
+desde file://; --servir levanta un servidor HTTP local (http.server).
+"""
+
+import argparse
+import gzip
+import json
+import math
+import os
+import shutil
+import sqlite3
+import struct
+import sys
+import time
+
+import numpy as np
+
+SALIDA_DEFAULT = "teselas"
+CAPA = "corregimientos"
+
+# Resolución de cada tesela y margen de recorte (en unidades de tesela)
+EXTENSION = 4096
+MARGEN = 64
+
+# Nivel de detalle de preparar_geo.py según el zoom: (zoom máximo, nivel)
+DETALLE_POR_ZOOM = [(7, "bajo"), (9, "medio"), (11, "alto"), (99, "completo")]
+
+# Web Mercator (EPSG:3857)
+ORIGEN = math.pi * 6378137
+
+# Propiedades de texto de cada feature (además de v_/color_ por métrica)
+PROPIEDADES = ["corregimiento_nombre", "distrito_nombre", "provincia_nombre"]
+
+
+def nivel_para_zoom(zoom: int) -> str:
+    """Nivel de geometría simplificada que se usa en un zoom"""
+    return next(nivel for maximo, nivel in DETALLE_POR_ZOOM if zoom <= maximo)
+
+
+def limites_tesela(z: int, x: int, y: int):
+    """(xmin, ymin, xmax, ymax) en metros Web Mercator de la tesela z/x/y"""
+    tamano = 2 * ORIGEN / 2 ** z
+    xmin = -ORIGEN + x * tamano
+    ymax = ORIGEN - y * tamano
+    return xmin, ymax - tamano, xmin + tamano, ymax
+
+
+def rango_teselas(z: int, limites):
+    """Rango (x0, x1, y0, y1) de teselas que cubren unos límites en metros"""
+    tamano = 2 * ORIGEN / 2 ** z
+    xmin, ymin, xmax, ymax = limites
+    maximo = 2 ** z - 1
+    x0 = max(0, int((xmin + ORIGEN) // tamano))
+    x1 = min(maximo, int((xmax + ORIGEN) // tamano))
+    y0 = max(0, int((ORIGEN - ymax) // tamano))
+    y1 = min(maximo, int((ORIGEN - ymin) // tamano))
+    return x0, x1, y0, y1
+
+
+# ---------------------------------------------------------------------------
+# Codificación protobuf (solo lo que usa vector_tile.proto, versión 2)
+# ---------------------------------------------------------------------------
+
+def _varint(n: int) -> bytes:
+    salida = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            salida.append(byte | 0x80)
+        else:
+            salida.append(byte)
+            return bytes(salida)
+
+
+def _zigzag(n: int) -> int:
+    return (n << 1) ^ (n >> 63)
+
+
+def _clave(campo: int, tipo: int) -> bytes:
+    return _varint((campo << 3) | tipo)
+
+
+def _entero(campo: int, n: int) -> bytes:
+    return _clave(campo, 0) + _varint(n)
+
+
+def _bytes(campo: int, contenido: bytes) -> bytes:
+    return _clave(campo, 2) + _varint(len(contenido)) + contenido
+
+
+def _empaquetado(campo: int, enteros) -> bytes:
+    return _bytes(campo, b"".join(_varint(n) for n in enteros))
+
+
+def _valor(v) -> bytes:
+    """Mensaje Value: texto, entero (sint) o double"""
+    if isinstance(v, str):
+        return _bytes(1, v.encode("utf-8"))
+    if isinstance(v, (bool, np.bool_)):
+        return _entero(7, int(v))
+    if isinstance(v, (int, np.integer)):
+        return _entero(6, _zigzag(int(v)))
+    return _clave(3, 1) + struct.pack("<d", float(v))
+
+
+def _comando(id_comando: int, cuenta: int) -> int:
+    return (id_comando & 0x7) | (cuenta << 3)
+
+
+def geometria_mvt(anillos) -> list:
+    """Comandos MVT de un polígono ya en coordenadas enteras de la tesela.
+
+    anillos es una lista de (exterior, [interiores]) con arrays Nx2 cerrados.
+    Los exteriores quedan con área positiva y los huecos con área negativa
+    (fórmula del agrimensor con y hacia abajo), como pide la especificación.
+    """
+    comandos = []
+    cx = cy = 0
+    for exterior, interiores in anillos:
+        for k, anillo in enumerate([exterior] + interiores):
+            puntos = anillo[:-1]
+            if len(puntos) > 1:
+                puntos = puntos[np.r_[True, np.any(puntos[1:] != puntos[:-1], axis=1)]]
+            if len(puntos) > 1 and (puntos[0] == puntos[-1]).all():
+                puntos = puntos[:-1]
+            if len(puntos) < 3:
+                if k == 0:
+                    break  # exterior degenerado: se descarta el polígono entero
+                continue
+            x, y = puntos[:, 0], puntos[:, 1]
+            area = np.sum(x * np.roll(y, -1) - np.roll(x, -1) * y)
+            if area == 0:
+                if k == 0:
+                    break
+                continue
+            if (area < 0) == (k == 0):
+                puntos = puntos[::-1]
+            deltas = np.diff(np.vstack([[cx, cy], puntos]), axis=0)
+            cx, cy = (int(v) for v in puntos[-1])
+            comandos.append(_comando(1, 1))
+            comandos += [_zigzag(int(v)) for v in deltas[0]]
+            comandos.append(_comando(2, len(deltas) - 1))
+            comandos += [_zigzag(int(v)) for v in deltas[1:].ravel()]
+            comandos.append(_comando(7, 1))
+    return comandos
+
+
+def codificar_tesela(features, nombre: str = CAPA) -> bytes:
+    """Tesela MVT de una capa: features es una lista de (id, propiedades, comandos)"""
+    claves, indice_claves = [], {}
+    valores, indice_valores = [], {}
+    cuerpo = []
+    for fid, propiedades, comandos in features:
+        etiquetas = []
+        for clave, valor in propiedades.items():
+            if valor is None:
+                continue
+            if clave not in indice_claves:
+                indice_claves[clave] = len(claves)
+                claves.append(clave)
+            marca = (type(valor).__name__, valor)
+            if marca not in indice_valores:
+                indice_valores[marca] = len(valores)
+                valores.append(valor)
+            etiquetas += [indice_claves[clave], indice_valores[marca]]
+        feature = (_entero(1, int(fid)) + _empaquetado(2, etiquetas)
+                   + _entero(3, 3) + _empaquetado(4, comandos))
+        cuerpo.append(_bytes(2, feature))
+    capa = (_entero(15, 2) + _bytes(1, nombre.encode("utf-8")) + b"".join(cuerpo)
+            + b"".join(_bytes(3, c.encode("utf-8")) for c in claves)
+            + b"".join(_bytes(4, _valor(v)) for v in valores)
+            + _entero(5, EXTENSION))
+    return _bytes(3, capa)
+
+
+# ---------------------------------------------------------------------------
+# Corte en teselas
+# ---------------------------------------------------------------------------
+
+def _poligonos(geom):
+    """(exterior, [interiores]) de cada polígono de la geometría recortada"""
+    import shapely
+
+    partes = shapely.get_parts(geom)
+    return [
+        (np.asarray(p.exterior.coords)[:, :2], [np.asarray(r.coords)[:, :2] for r in p.interiors])
+        for p in partes if shapely.get_type_id(p) == 3 and not p.is_empty
+    ]
+
+
+def teselas_zoom(z: int, geoms, ids, propiedades):
+    """Genera (x, y, bytes) de cada tesela no vacía del zoom z
+
+    geoms en metros Web Mercator; un STRtree selecciona los corregimientos
+    que tocan cada tesela y shapely.clip_by_rect los recorta de una vez.
+    """
+    import shapely
+
+    arbol = shapely.STRtree(geoms)
+    limites_totales = shapely.total_bounds(geoms)
+    x0, x1, y0, y1 = rango_teselas(z, limites_totales)
+    for x in range(x0, x1 + 1):
+        for y in range(y0, y1 + 1):
+            xmin, ymin, xmax, ymax = limites_tesela(z, x, y)
+            tamano = xmax - xmin
+            margen = MARGEN * tamano / EXTENSION
+            candidatos = arbol.query(shapely.box(xmin - margen, ymin - margen,
+                                                 xmax + margen, ymax + margen))
+            if len(candidatos) == 0:
+                continue
+            candidatos.sort()
+            recortes = shapely.clip_by_rect(geoms[candidatos], xmin - margen, ymin - margen,
+                                            xmax + margen, ymax + margen)
+            escala = EXTENSION / tamano
+            features = []
+            for i, recorte in zip(candidatos, recortes):
+                if recorte is None or recorte.is_empty:
+                    continue
+                anillos = [
+                    (np.round((ext - (xmin, ymax)) * (escala, -escala)).astype(np.int64),
+                     [np.round((r - (xmin, ymax)) * (escala, -escala)).astype(np.int64) for r in ints])
+                    for ext, ints in _poligonos(recorte)
+                ]
+                comandos = geometria_mvt(anillos)
+                if comandos:
+                    features.append((ids[i], propiedades[i], comandos))
+            if features:
+                yield x, y, codificar_tesela(features)
+
+
+def preparar_capas(gdf, classification="lineal", n_classes=5):
+    """Propiedades de cada feature y descripción de las métricas para el visor"""
+    import choropleth_cobertura as choropleth
+
+    if "hotspot_clase" not in gdf.columns:
+        gdf = choropleth.add_hotspots(gdf)
+    columnas = {}
+    metricas = {}
+    for key in choropleth.METRICS:
+        config = choropleth.get_color_scale(key)
+        valores = choropleth.metric_values(gdf, config)
+        clases, formato = choropleth.classify_metric(valores, config, classification, n_classes)
+        columnas[f"v_{key}"] = choropleth.compact_values(valores, formato[0])
+        columnas[f"color_{key}"] = clases.colores.tolist()
+        metricas[key] = {
+            "name": config["name"],
+            "format": formato,
+            "legend": clases.leyenda_html(config["name"], config["tooltip_format"]),
+        }
+    for columna in PROPIEDADES:
+        alternativa = columna.replace("_nombre", "")
+        serie = gdf[columna] if columna in gdf.columns else gdf.get(alternativa)
+        columnas[columna] = serie.fillna("N/A").astype(str).tolist() if serie is not None else ["N/A"] * len(gdf)
+
+    propiedades = [dict(zip(columnas, fila)) for fila in zip(*columnas.values())]
+    return propiedades, metricas
+
+
+def exportar(salida: str, zoom_min: int, zoom_max: int, mbtiles: str = None,
+             classification: str = "lineal", n_classes: int = 5) -> dict:
+    """Corta y escribe las teselas de zoom_min a zoom_max; retorna un resumen"""
+    import choropleth_cobertura as choropleth
+
+    inicio = time.perf_counter()
+    gdf = choropleth.load_data()
+    ids = (gdf["id_corr_int"].astype("int64").to_numpy()
+           if "id_corr_int" in gdf.columns else np.arange(len(gdf)))
+    propiedades, metricas = preparar_capas(gdf, classification, n_classes)
+    for fila, fid in zip(propiedades, ids):
+        fila["id_corr"] = int(fid)
+
+    # Geometría de cada nivel en Web Mercator, una sola vez
+    niveles = {}
+    for z in range(zoom_min, zoom_max + 1):
+        nivel = nivel_para_zoom(z)
+        if nivel not in niveles:
+            niveles[nivel] = choropleth.select_detail(gdf, nivel).geometry.to_crs(3857).values
+    print(f"⏱️ Datos listos en {time.perf_counter() - inicio:.1f} s")
+
+    # Las teselas de una exportación anterior (otro rango de zoom) se borran
+    if os.path.isdir(salida):
+        for nombre in os.listdir(salida):
+            if nombre.isdigit():
+                shutil.rmtree(os.path.join(salida, nombre))
+
+    conexion = None
+    if mbtiles:
+        if os.path.exists(mbtiles):
+            os.remove(mbtiles)
+        conexion = sqlite3.connect(mbtiles)
+        conexion.executescript("""
+            CREATE TABLE metadata (name TEXT, value TEXT);
+            CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER,
+                                tile_data BLOB);
+            CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row);
+        """)
+
+    resumen = {"teselas": 0, "bytes": 0}
+    for z in range(zoom_min, zoom_max + 1):
+        inicio_zoom = time.perf_counter()
+        cuenta = total = 0
+        for x, y, datos in teselas_zoom(z, niveles[nivel_para_zoom(z)], ids, propiedades):
+            ruta = os.path.join(salida, str(z), str(x))
+            os.makedirs(ruta, exist_ok=True)
+            with open(os.path.join(ruta, f"{y}.pbf"), "wb") as f:
+                f.write(datos)
+            if conexion is not None:
+                # MBTiles usa filas TMS (y desde el sur) y teselas con gzip
+                conexion.execute("INSERT INTO tiles VALUES (?, ?, ?, ?)",
+                                 (z, x, 2 ** z - 1 - y, gzip.compress(datos)))
+            cuenta += 1
+            total += len(datos)
+        segundos = time.perf_counter() - inicio_zoom
+        print(f"   z{z:<2} {nivel_para_zoom(z):8} {cuenta:>6,} teselas, {total / 1024:>8,.0f} KB, "
+              f"{segundos:.2f} s")
+        resumen["teselas"] += cuenta
+        resumen["bytes"] += total
+
+    oeste, sur, este, norte = choropleth.select_detail(gdf, "bajo").to_crs(4326).total_bounds
+    metadata = {
+        "tilejson": "3.0.0",
+        "name": CAPA,
+        "tiles": ["{z}/{x}/{y}.pbf"],
+        "minzoom": zoom_min,
+        "maxzoom": zoom_max,
+        "bounds": [round(v, 5) for v in (oeste, sur, este, norte)],
+        "center": [round((oeste + este) / 2, 5), round((sur + norte) / 2, 5), zoom_min],
+        "vector_layers": [{
+            "id": CAPA,
+            "minzoom": zoom_min,
+            "maxzoom": zoom_max,
+            "fields": {c: ("Number" if c.startswith("v_") or c == "id_corr" else "String")
+                       for c in propiedades[0]},
+        }],
+        "metricas": metricas,
+    }
+    os.makedirs(salida, exist_ok=True)
+    with open(os.path.join(salida, "metadata.json"), "w", encoding="utf-8") as f:
+        json.dump(metadata, f, ensure_ascii=False)
+    with open(os.path.join(salida, "index.html"), "w", encoding="utf-8") as f:
+        f.write(VISOR_HTML)
+
+    if conexion is not None:
+        conexion.executemany("INSERT INTO metadata VALUES (?, ?)", [
+            ("name", CAPA),
+            ("format", "pbf"),
+            ("minzoom", str(zoom_min)),
+            ("maxzoom", str(zoom_max)),
+            ("bounds", ",".join(str(v) for v in metadata["bounds"])),
+            ("center", ",".join(str(v) for v in metadata["center"])),
+            ("json", json.dumps({"vector_layers": metadata["vector_layers"]})),
+        ])
+        conexion.commit()
+        conexion.close()
+        print(f"💾 MBTiles: {mbtiles} ({os.path.getsize(mbtiles) / 1024 / 1024:.1f} MB)")
+
+    segundos = time.perf_counter() - inicio
+    print(f"✓ {resumen['teselas']:,} teselas ({resumen['bytes'] / 1024 / 1024:.1f} MB) en {salida}/ "
+          f"— {segundos:.1f} s")
+    return resumen
+
+
+def servir(directorio: str, puerto: int):
+    """Servidor HTTP local para el visor (los .pbf como application/x-protobuf)"""
+    import functools
+    import http.server
+
+    class Manejador(http.server.SimpleHTTPRequestHandler):
+        extensions_map = {**http.server.SimpleHTTPRequestHandler.extensions_map,
+                          ".pbf": "application/x-protobuf"}
+
+        def log_message(self, *args):
+            pass
+
+    manejador = functools.partial(Manejador, directory=directorio)
+    with http.server.ThreadingHTTPServer(("127.0.0.1", puerto), manejador) as servidor:
+        print(f"🌐 Visor en http://localhost:{puerto}/  (Ctrl+C para terminar)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Servidor detenido")
+
+
+# Visor: decodifica MVT y dibuja en canvas; solo pide las teselas en pantalla
+VISOR_HTML = """<!DOCTYPE html>
+<html lang="es">
+<head>
+<meta charset="utf-8">
+<title>Corregimientos — teselas vectoriales</title>
+<style>
+    html, body { margin: 0; height: 100%; overflow: hidden; font-family: Arial, sans-serif; }
+    canvas { display: block; cursor: grab; background: #dfe8ee; }
+    canvas.arrastrando { cursor: grabbing; }
+    .panel { position: fixed; background: white; border: 2px solid #333; border-radius: 5px;
+             padding: 10px; font-size: 12px; box-shadow: 0 2px 6px rgba(0,0,0,0.3); }
+    #controles { top: 10px; left: 10px; width: 260px; }
+    #leyenda { bottom: 30px; right: 20px; width: 250px; }
+    #detalle { top: 10px; right: 20px; width: 260px; display: none; }
+    #info { position: fixed; pointer-events: none; background: rgba(255,255,255,0.95);
+            border: 1px solid #999; padding: 3px 6px; font-size: 11px; display: none; }
+    button { padding: 4px 10px; margin-right: 4px; }
+</style>
+</head>
+<body>
+<canvas id="mapa"></canvas>
+<div id="controles" class="panel">
+    <b>🗺️ Métrica</b><br>
+    <select id="metrica" style="width: 100%; margin: 6px 0;"></select>
+    <button id="acercar">+</button><button id="alejar">−</button>
+    <span id="estado" style="color: #666; font-size: 10px;"></span>
+</div>
+<div id="leyenda" class="panel"></div>
+<div id="detalle" class="panel"></div>
+<div id="info"></div>
+<script>
+var EXTENSION = 4096, TAM = 256;
+var canvas = document.getElementById('mapa'), ctx = canvas.getContext('2d');
+var meta = null, metrica = null, cache = {}, pendientes = 0;
+var vista = {x: 0, y: 0, zoom: 7};  // centro en píxeles del mundo al zoom de la vista
+
+// --- protobuf / MVT ---
+function Lector(buf) { this.b = buf; this.p = 0; }
+Lector.prototype.varint = function() {
+    var r = 0, s = 1, b;
+    do { b = this.b[this.p++]; r += (b & 0x7f) * s; s *= 128; } while (b & 0x80);
+    return r;
+};
+Lector.prototype.zigzag = function() { var n = this.varint(); return n % 2 ? -(n + 1) / 2 : n / 2; };
+Lector.prototype.fin = function() { return this.varint() + this.p; };
+Lector.prototype.saltar = function(tipo) {
+    if (tipo === 0) this.varint();
+    else if (tipo === 1) this.p += 8;
+    else if (tipo === 2) this.p = this.fin();
+    else if (tipo === 5) this.p += 4;
+};
+Lector.prototype.texto = function() {
+    var fin = this.fin(), s = new TextDecoder().decode(this.b.subarray(this.p, fin));
+    this.p = fin; return s;
+};
+Lector.prototype.empaquetado = function(zig) {
+    var fin = this.fin(), r = [];
+    while (this.p < fin) r.push(zig ? this.zigzag() : this.varint());
+    return r;
+};
+
+function leerValor(l, fin) {
+    var v = null;
+    while (l.p < fin) {
+        var clave = l.varint(), campo = clave >> 3;
+        if (campo === 1) v = l.texto();
+        else if (campo === 2) { v = new DataView(l.b.buffer, l.b.byteOffset + l.p, 4).getFloat32(0, true); l.p += 4; }
+        else if (campo === 3) { v = new DataView(l.b.buffer, l.b.byteOffset + l.p, 8).getFloat64(0, true); l.p += 8; }
+        else if (campo === 4 || campo === 5) v = l.varint();
+        else if (campo === 6) v = l.zigzag();
+        else if (campo === 7) v = l.varint() === 1;
+        else l.saltar(clave & 7);
+    }
+    return v;
+}
+
+function geometriaPath(comandos) {
+    var path = new Path2D(), x = 0, y = 0, i = 0;
+    while (i < comandos.length) {
+        var id = comandos[i] & 7, n = comandos[i] >> 3; i++;
+        if (id === 7) { path.closePath(); continue; }
+        for (var k = 0; k < n; k++) {
+            var a = comandos[i++], b = comandos[i++];
+            x += a % 2 ? -(a + 1) / 2 : a / 2;
+            y += b % 2 ? -(b + 1) / 2 : b / 2;
+            if (id === 1) path.moveTo(x, y); else path.lineTo(x, y);
+        }
+    }
+    return path;
+}
+
+function leerTesela(buf) {
+    var l = new Lector(new Uint8Array(buf)), features = [];
+    while (l.p < l.b.length) {
+        var clave = l.varint();
+        if (clave >> 3 !== 3) { l.saltar(clave & 7); continue; }
+        var finCapa = l.fin(), claves = [], valores = [], crudas = [];
+        while (l.p < finCapa) {
+            var c = l.varint(), campo = c >> 3;
+            if (campo === 3) claves.push(l.texto());
+            else if (campo === 4) { var fv = l.fin(); valores.push(leerValor(l, fv)); }
+            else if (campo === 2) {
+                var ff = l.fin(), f = {};
+                while (l.p < ff) {
+                    var cf = l.varint(), cc = cf >> 3;
+                    if (cc === 1) f.id = l.varint();
+                    else if (cc === 2) f.tags = l.empaquetado(false);
+                    else if (cc === 4) f.geom = l.empaquetado(false);
+                    else l.saltar(cf & 7);
+                }
+                crudas.push(f);
+            }
+            else l.saltar(c & 7);
+        }
+        crudas.forEach(function(f) {
+            var p = {};
+            for (var i = 0; i < (f.tags || []).length; i += 2) p[claves[f.tags[i]]] = valores[f.tags[i + 1]];
+            features.push({id: f.id, propiedades: p, path: geometriaPath(f.geom || [])});
+        });
+    }
+    return features;
+}
+
+// --- proyección ---
+function aMundo(lon, lat, zoom) {
+    var escala = TAM * Math.pow(2, zoom), s = Math.sin(lat * Math.PI / 180);
+    return [(lon + 180) / 360 * escala, (0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI)) * escala];
+}
+
+function zoomTeselas() {
+    return Math.max(meta.minzoom, Math.min(meta.maxzoom, Math.round(vista.zoom)));
+}
+
+function formatear(v, f) {
+    if (v === null || v === undefined) return 'N/A';
+    if (f[3]) return f[3][v] || String(v);
+    return v.toLocaleString('en-US', {minimumFractionDigits: f[0], maximumFractionDigits: f[0],
+                                      useGrouping: f[2]}) + f[1];
+}
+
+// --- carga y dibujo ---
+function pedir(z, x, y) {
+    var clave = z + '/' + x + '/' + y;
+    if (clave in cache) return cache[clave];
+    cache[clave] = null;
+    pendientes++;
+    fetch(clave + '.pbf')
+        .then(function(r) { return r.ok ? r.arrayBuffer() : null; })
+        .then(function(buf) { cache[clave] = buf ? leerTesela(buf) : []; })
+        .catch(function() { cache[clave] = []; })
+        .then(function() { pendientes--; dibujar(); });
+    return null;
+}
+
+function teselasVisibles(dibujar) {
+    var zt = zoomTeselas(), escala = Math.pow(2, vista.zoom - zt), tam = TAM * escala;
+    var x0 = vista.x - canvas.width / 2, y0 = vista.y - canvas.height / 2;
+    var b = meta.bounds, so = aMundo(b[0], b[1], vista.zoom), ne = aMundo(b[2], b[3], vista.zoom);
+    var n = Math.pow(2, zt);
+    var tx0 = Math.max(0, Math.floor(Math.max(x0, so[0]) / tam));
+    var tx1 = Math.min(n - 1, Math.floor(Math.min(x0 + canvas.width, ne[0]) / tam));
+    var ty0 = Math.max(0, Math.floor(Math.max(y0, ne[1]) / tam));
+    var ty1 = Math.min(n - 1, Math.floor(Math.min(y0 + canvas.height, so[1]) / tam));
+    for (var tx = tx0; tx <= tx1; tx++)
+        for (var ty = ty0; ty <= ty1; ty++)
+            dibujar(pedir(zt, tx, ty), tx * tam - x0, ty * tam - y0, tam / EXTENSION);
+}
+
+function dibujar() {
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    ctx.clearRect(0, 0, canvas.width, canvas.height);
+    teselasVisibles(function(features, ox, oy, k) {
+        if (!features) return;
+        ctx.setTransform(k, 0, 0, k, ox, oy);
+        ctx.lineWidth = 0.6 / k;
+        ctx.strokeStyle = '#333333';
+        features.forEach(function(f) {
+            ctx.fillStyle = f.propiedades['color_' + metrica] || '#888888';
+            ctx.globalAlpha = 0.8;
+            ctx.fill(f.path, 'evenodd');
+            ctx.globalAlpha = 0.7;
+            ctx.stroke(f.path);
+        });
+    });
+    ctx.globalAlpha = 1;
+    document.getElementById('estado').textContent =
+        'z' + zoomTeselas() + (pendientes ? ' · cargando ' + pendientes : '');
+}
+
+function featureEn(px, py) {
+    var encontrada = null;
+    teselasVisibles(function(features, ox, oy, k) {
+        if (!features || encontrada) return;
+        ctx.setTransform(k, 0, 0, k, ox, oy);
+        for (var i = 0; i < features.length && !encontrada; i++)
+            if (ctx.isPointInPath(features[i].path, px, py, 'evenodd')) encontrada = features[i];
+    });
+    ctx.setTransform(1, 0, 0, 1, 0, 0);
+    return encontrada;
+}
+
+function zoomEn(nuevo, px, py) {
+    nuevo = Math.max(meta.minzoom - 1, Math.min(meta.maxzoom + 4, nuevo));
+    var f = Math.pow(2, nuevo - vista.zoom);
+    var mx = vista.x + px - canvas.width / 2, my = vista.y + py - canvas.height / 2;
+    vista.x = mx * f - (px - canvas.width / 2);
+    vista.y = my * f - (py - canvas.height / 2);
+    vista.zoom = nuevo;
+    dibujar();
+}
+
+function ajustar() {
+    canvas.width = window.innerWidth;
+    canvas.height = window.innerHeight;
+    if (meta) dibujar();
+}
+
+function elegirMetrica(m) {
+    metrica = m;
+    document.getElementById('leyenda').innerHTML = meta.metricas[m].legend;
+    dibujar();
+}
+
+// --- interacción ---
+var arrastre = null;
+canvas.addEventListener('mousedown', function(e) {
+    arrastre = {x: e.clientX, y: e.clientY, movio: false};
+    canvas.classList.add('arrastrando');
+});
+window.addEventListener('mouseup', function(e) {
+    canvas.classList.remove('arrastrando');
+    if (arrastre && !arrastre.movio) {
+        var f = featureEn(e.clientX, e.clientY), panel = document.getElementById('detalle');
+        if (!f) { panel.style.display = 'none'; }
+        else {
+            var p = f.propiedades, filas = Object.keys(meta.metricas).map(function(k) {
+                return '<tr><td>' + meta.metricas[k].name + '</td><td style="text-align: right;"><b>'
+                    + formatear(p['v_' + k], meta.metricas[k].format) + '</b></td></tr>';
+            }).join('');
+            panel.innerHTML = '<b style="font-size: 13px;">' + p.corregimiento_nombre + '</b> (' + p.id_corr + ')<br>'
+                + '<span style="color: #666;">' + p.distrito_nombre + ', ' + p.provincia_nombre + '</span>'
+                + '<table style="width: 100%; margin-top: 6px; font-size: 11px;">' + filas + '</table>';
+            panel.style.display = 'block';
+        }
+    }
+    arrastre = null;
+});
+window.addEventListener('mousemove', function(e) {
+    var info = document.getElementById('info');
+    if (arrastre) {
+        var dx = e.clientX - arrastre.x, dy = e.clientY - arrastre.y;
+        if (Math.abs(dx) + Math.abs(dy) > 2) arrastre.movio = true;
+        vista.x -= dx; vista.y -= dy;
+        arrastre.x = e.clientX; arrastre.y = e.clientY;
+        info.style.display = 'none';
+        dibujar();
+        return;
+    }
+    var f = e.target === canvas ? featureEn(e.clientX, e.clientY) : null;
+    if (!f) { info.style.display = 'none'; return; }
+    info.textContent = f.propiedades.corregimiento_nombre + ': '
+        + formatear(f.propiedades['v_' + metrica], meta.metricas[metrica].format);
+    info.style.left = (e.clientX + 12) + 'px';
+    info.style.top = (e.clientY + 12) + 'px';
+    info.style.display = 'block';
+});
+canvas.addEventListener('wheel', function(e) {
+    e.preventDefault();
+    zoomEn(vista.zoom - Math.sign(e.deltaY) * 0.5, e.clientX, e.clientY);
+}, {passive: false});
+document.getElementById('acercar').onclick = function() { zoomEn(vista.zoom + 1, canvas.width / 2, canvas.height / 2); };
+document.getElementById('alejar').onclick = function() { zoomEn(vista.zoom - 1, canvas.width / 2, canvas.height / 2); };
+window.addEventListener('resize', ajustar);
+
+fetch('metadata.json').then(function(r) { return r.json(); }).then(function(m) {
+    meta = m;
+    ajustar();
+    // Encuadrar la extensión de los datos
+    var b = meta.bounds, so = aMundo(b[0], b[1], 0), ne = aMundo(b[2], b[3], 0);
+    var zoom = Math.log2(Math.min(canvas.width / (ne[0] - so[0]), canvas.height / (so[1] - ne[1]))) - 0.2;
+    vista.zoom = Math.max(meta.minzoom, Math.min(meta.maxzoom, zoom));
+    var f = Math.pow(2, vista.zoom);
+    vista.x = (so[0] + ne[0]) / 2 * f;
+    vista.y = (so[1] + ne[1]) / 2 * f;
+    var select = document.getElementById('metrica');
+    Object.keys(meta.metricas).forEach(function(k) {
+        var o = document.createElement('option');
+        o.value = k; o.text = meta.metricas[k].name;
+        select.appendChild(o);
+    });
+    select.onchange = function() { elegirMetrica(this.value); };
+    elegirMetrica(select.value);
+});
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    import choropleth_cobertura as choropleth
+
+    parser = argparse.ArgumentParser(
+        description="Exporta los corregimientos como teselas vectoriales (MVT) con visor local"
+    )
+    parser.add_argument("--output-dir", default=SALIDA_DEFAULT,
+                        help=f"Directorio de salida (default: {SALIDA_DEFAULT})")
+    parser.add_argument("--zoom", nargs=2, type=int, default=[5, 12], metavar=("MIN", "MAX"),
+                        help="Rango de zoom (default: 5 12)")
+    parser.add_argument("--mbtiles", default=None,
+                        help="Además, escribir un archivo MBTiles (SQLite)")
+    parser.add_argument("--classification", default="lineal", choices=choropleth.METODOS,
+                        help="Clasificación de colores (default: lineal)")
+    parser.add_argument("--classes", type=int, default=5, help="Número de clases (default: 5)")
+    parser.add_argument("--servir", action="store_true",
+                        help="Después de exportar, servir el visor en http://localhost:PUERTO")
+    parser.add_argument("--solo-servir", action="store_true",
+                        help="Servir lo ya exportado, sin volver a cortar las teselas")
+    parser.add_argument("--puerto", type=int, default=8000, help="Puerto del visor (default: 8000)")
+    args = parser.parse_args()
+
+    zoom_min, zoom_max = args.zoom
+    if not 0 <= zoom_min <= zoom_max <= 22:
+        print("❌ Rango de zoom inválido (0 <= MIN <= MAX <= 22)")
+        sys.exit(1)
+
+    if not args.solo_servir:
+        exportar(args.output_dir, zoom_min, zoom_max, mbtiles=args.mbtiles,
+                 classification=args.classification, n_classes=args.classes)
+    elif not os.path.exists(os.path.join(args.output_dir, "metadata.json")):
+        print(f"❌ No hay teselas en {args.output_dir}/ (ejecutar sin --solo-servir)")
+        sys.exit(1)
+
+    if args.servir or args.solo_servir:
+        servir(args.output_dir, args.puerto)
+
+
+if __name__ == "__main__":
+    main()
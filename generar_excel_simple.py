@@ -1,322 +1,519 @@
 #!/usr/bin/env python3
 """
 Generador de Excel simplificado para análisis de brecha pobreza
+
+Uso:
+    python generar_excel_simple.py                          # Reporte nacional
+    python generar_excel_simple.py --por provincia          # Un libro por provincia
+    python generar_excel_simple.py --por distrito --output-dir ./reportes --workers 8
+
+En modo --por el análisis se calcula una sola vez y se reparte en un libro
+por provincia (o distrito) escrito en procesos paralelos, con un
+manifest_YYYYMMDD_HHMM.json que lista los archivos generados.
+
+Requisitos:
+    pip install duckdb pyarrow xlsxwriter
 """
+import argparse
+import json
+import os
+import re
 import sys
+import time
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 from pathlib import Path
-import pandas as pd
 import duckdb
 from datetime import datetime
+from compat_duckdb import tabla_arrow
+from excel_streaming import StreamingExcelWriter
+
+# Brechas por corregimiento (base de Top 50, Casos Críticos y Análisis Completo)
+QUERY_PRINCIPAL = """
+WITH cobertura_por_correg AS (
+    SELECT
+        p.id_correg,
+        COUNT(*) as total_beneficiarios,
+        COUNT(CASE WHEN p.Programa = 'B/. 120 A LOS 65' THEN 1 END) as ben_120_65,
+        COUNT(CASE WHEN p.Programa = 'RED DE OPORTUNIDADES' THEN 1 END) as ben_red_oport,
+        COUNT(CASE WHEN p.Programa = 'ANGEL GUARDIAN' THEN 1 END) as ben_angel_guardian,
+        COUNT(CASE WHEN p.Programa = 'SENAPAN' THEN 1 END) as ben_senapan,
+        COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
+        COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
+        SUM(COALESCE(p.Menores_18, 0)) as total_menores_18,
+        -- Elegibilidad interpretada: NULL + sin FUPS = SIN FUPS, NULL + con FUPS = SIN PMT
+        COUNT(CASE WHEN p.Elegibilidad = 'ELEGIBLE' THEN 1 END) as elegibles,
+        COUNT(CASE WHEN p.Elegibilidad = 'NO ELEGIBLE' THEN 1 END) as no_elegibles,
+        COUNT(CASE WHEN p.Elegibilidad IS NULL AND p.Fecha_Ultima_FUPS IS NULL THEN 1 END) as sin_fups,
+        COUNT(CASE WHEN p.Elegibilidad IS NULL AND p.Fecha_Ultima_FUPS IS NOT NULL THEN 1 END) as sin_pmt
+    FROM planilla p
+    GROUP BY p.id_correg
+),
+id_correg_mapa AS (
+    SELECT 
+        *,
+        (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as Id_Correg_Calc
+    FROM mapa_pobreza
+    WHERE total_personas > 0
+)
+SELECT 
+    m.provincia,
+    m.distrito,
+    m.corregimiento,
+    m.total_personas as poblacion_total,
+    ROUND(m.pct_pobreza_general_personas * 100, 1) as pobreza_general_pct,
+    ROUND(m.pct_pobreza_extrema_personas * 100, 1) as pobreza_extrema_pct,
+    ROUND(m.total_personas * m.pct_pobreza_general_personas) as personas_pobreza_general,
+    ROUND(m.total_personas * m.pct_pobreza_extrema_personas) as personas_pobreza_extrema,
+    COALESCE(c.total_beneficiarios, 0) as total_beneficiarios,
+    COALESCE(c.ben_120_65, 0) as ben_120_65,
+    COALESCE(c.ben_red_oport, 0) as ben_red_oportunidades,
+    COALESCE(c.ben_angel_guardian, 0) as ben_angel_guardian,
+    COALESCE(c.ben_senapan, 0) as ben_senapan,
+    ROUND(COALESCE(c.total_beneficiarios, 0) * 100.0 / 
+          NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0), 1) as cobertura_pobreza_pct,
+    ROUND(m.total_personas * m.pct_pobreza_general_personas - 
+          COALESCE(c.total_beneficiarios, 0)) as gap_atencion_absoluto,
+    CASE 
+        WHEN m.pct_pobreza_general_personas >= 0.7 THEN 'EXTREMO'
+        WHEN m.pct_pobreza_general_personas >= 0.5 THEN 'ALTO'
+        WHEN m.pct_pobreza_general_personas >= 0.3 THEN 'MODERADO'
+        ELSE 'BAJO'
+    END as nivel_pobreza,
+    CASE 
+        WHEN COALESCE(c.total_beneficiarios, 0) = 0 THEN 'SIN COBERTURA'
+        WHEN COALESCE(c.total_beneficiarios, 0) * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0) < 10 THEN 'BAJA'
+        WHEN COALESCE(c.total_beneficiarios, 0) * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0) < 25 THEN 'MEDIA'
+        ELSE 'ALTA'
+    END as nivel_cobertura
+FROM id_correg_mapa m
+LEFT JOIN cobertura_por_correg c ON m.Id_Correg_Calc = c.id_correg
+ORDER BY gap_atencion_absoluto DESC
+"""
+
+# Resumen por provincia
+QUERY_PROVINCIAS = """
+WITH stats_provincia AS (
+    SELECT 
+        m.codigo_provincia,
+        m.provincia,
+        SUM(m.total_personas) as poblacion_total,
+        SUM(m.total_personas * m.pct_pobreza_general_personas) as personas_pobreza,
+        COUNT(*) as total_corregimientos
+    FROM mapa_pobreza m
+    WHERE m.total_personas > 0
+    GROUP BY m.codigo_provincia, m.provincia
+),
+beneficiarios_provincia AS (
+    SELECT
+        CAST(p.id_correg / 10000 AS INTEGER) as codigo_provincia,
+        COUNT(*) as total_beneficiarios,
+        COUNT(DISTINCT p.id_correg) as corregimientos_atendidos,
+        COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
+        COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
+        SUM(COALESCE(p.Menores_18, 0)) as total_menores_18
+    FROM planilla p
+    GROUP BY CAST(p.id_correg / 10000 AS INTEGER)
+)
+SELECT 
+    sp.provincia,
+    sp.poblacion_total,
+    ROUND(sp.personas_pobreza) as personas_pobreza,
+    ROUND(sp.personas_pobreza * 100.0 / sp.poblacion_total, 1) as tasa_pobreza_pct,
+    COALESCE(bp.total_beneficiarios, 0) as total_beneficiarios,
+    ROUND(COALESCE(bp.total_beneficiarios, 0) * 100.0 / sp.personas_pobreza, 1) as cobertura_pct,
+    COALESCE(bp.corregimientos_atendidos, 0) as corregimientos_atendidos,
+    sp.total_corregimientos,
+    ROUND(COALESCE(bp.corregimientos_atendidos, 0) * 100.0 / sp.total_corregimientos, 1) as cobertura_geografica_pct,
+    ROUND(sp.personas_pobreza - COALESCE(bp.total_beneficiarios, 0)) as gap_provincial
+FROM stats_provincia sp
+LEFT JOIN beneficiarios_provincia bp ON sp.codigo_provincia = bp.codigo_provincia
+ORDER BY sp.personas_pobreza DESC
+"""
+
+# Corregimientos con más beneficiarios que pobres (o sin datos de pobreza)
+QUERY_SOBREATENCION = """
+WITH cobertura_por_correg AS (
+    SELECT
+        p.id_correg,
+        COUNT(*) as total_beneficiarios,
+        COUNT(CASE WHEN p.Programa = 'B/. 120 A LOS 65' THEN 1 END) as ben_120_65,
+        COUNT(CASE WHEN p.Programa = 'RED DE OPORTUNIDADES' THEN 1 END) as ben_red_oport,
+        COUNT(CASE WHEN p.Programa = 'ANGEL GUARDIAN' THEN 1 END) as ben_angel_guardian,
+        COUNT(CASE WHEN p.Programa = 'SENAPAN' THEN 1 END) as ben_senapan,
+        COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
+        COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
+        SUM(COALESCE(p.Menores_18, 0)) as total_menores_18
+    FROM planilla p
+    GROUP BY p.id_correg
+),
+id_correg_mapa AS (
+    SELECT
+        *,
+        (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as Id_Correg_Calc
+    FROM mapa_pobreza
+    WHERE total_personas > 0
+)
+SELECT
+    COALESCE(m.provincia, 'SIN DATOS POBREZA') as provincia,
+    COALESCE(m.distrito, 'SIN DATOS') as distrito,
+    COALESCE(m.corregimiento, 'SIN DATOS') as corregimiento,
+    COALESCE(m.total_personas, 0) as poblacion_total,
+    ROUND(COALESCE(m.pct_pobreza_general_personas * 100, 0), 1) as pobreza_general_pct,
+    ROUND(COALESCE(m.pct_pobreza_extrema_personas * 100, 0), 1) as pobreza_extrema_pct,
+    ROUND(COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)) as personas_pobreza_general,
+    ROUND(COALESCE(m.total_personas * m.pct_pobreza_extrema_personas, 0)) as personas_pobreza_extrema,
+    c.total_beneficiarios,
+    c.ben_120_65,
+    c.ben_red_oport,
+    c.ben_angel_guardian,
+    c.ben_senapan,
+    c.ben_femenino,
+    c.ben_masculino,
+    c.total_menores_18,
+    ROUND(c.total_beneficiarios * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0), 1) as cobertura_vs_pobreza_general,
+    ROUND(c.total_beneficiarios * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_extrema_personas, 0), 1) as cobertura_vs_pobreza_extrema,
+    ROUND(c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)) as exceso_vs_pobreza_general,
+    ROUND(c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_extrema_personas, 0)) as exceso_vs_pobreza_extrema,
+    CASE
+        WHEN m.Id_Correg_Calc IS NULL THEN 'SIN DATOS POBREZA'
+        WHEN c.total_beneficiarios > m.total_personas * m.pct_pobreza_general_personas THEN 'SOBREATENCION GENERAL'
+        WHEN c.total_beneficiarios > m.total_personas * m.pct_pobreza_extrema_personas THEN 'SOBREATENCION EXTREMA'
+        ELSE 'NORMAL'
+    END as tipo_atencion,
+    c.id_correg as id_correg_planilla
+FROM cobertura_por_correg c
+LEFT JOIN id_correg_mapa m ON c.id_correg = m.Id_Correg_Calc
+WHERE c.total_beneficiarios > COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)
+   OR m.Id_Correg_Calc IS NULL
+ORDER BY c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0) DESC
+"""
+
+# Menores de 18 del censo vs menores en la planilla
+QUERY_GAP_MENORES = """
+WITH menores_censo AS (
+    SELECT
+        CONCAT(
+            LPAD(PROVINCIA, 2, '0'),
+            LPAD(DISTRITO, 2, '0'),
+            LPAD(CORREG, 2, '0')
+        )::BIGINT as id_correg,
+        COUNT(*) as menores_18_censo
+    FROM personas
+    WHERE P03_EDAD IS NOT NULL AND CAST(P03_EDAD AS INTEGER) < 18
+    GROUP BY PROVINCIA, DISTRITO, CORREG
+),
+menores_planilla AS (
+    SELECT
+        id_correg,
+        SUM(COALESCE(Menores_18, 0)) as menores_18_beneficiarios,
+        COUNT(*) as beneficiarios_total
+    FROM planilla
+    GROUP BY id_correg
+),
+id_correg_mapa AS (
+    SELECT
+        *,
+        (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as id_correg_calc
+    FROM mapa_pobreza
+    WHERE total_personas > 0
+)
+SELECT
+    m.provincia,
+    m.distrito,
+    m.corregimiento,
+    COALESCE(c.menores_18_censo, 0) as menores_18_censo,
+    COALESCE(p.menores_18_beneficiarios, 0) as menores_18_beneficiarios,
+    ROUND(COALESCE(p.menores_18_beneficiarios, 0) * 100.0 /
+          NULLIF(c.menores_18_censo, 0), 1) as cobertura_menores_pct,
+    ROUND(COALESCE(c.menores_18_censo, 0) - COALESCE(p.menores_18_beneficiarios, 0)) as gap_menores
+FROM id_correg_mapa m
+LEFT JOIN menores_censo c ON m.id_correg_calc = c.id_correg
+LEFT JOIN menores_planilla p ON m.id_correg_calc = p.id_correg
+WHERE COALESCE(c.menores_18_censo, 0) > 0
+ORDER BY gap_menores DESC
+"""
+
+# Filas por lote al pasar resultados de DuckDB al Excel
+LOTE_FILAS = 5000
+
+# Consultas independientes del reporte: nombre registrado → (etiqueta, SQL)
+CONSULTAS = {
+    "principal": ("📈 Brechas por corregimiento", QUERY_PRINCIPAL),
+    "provincias": ("🗺️ Estadísticas provinciales", QUERY_PROVINCIAS),
+    "sobreatencion": ("🔄 Casos de sobreatención", QUERY_SOBREATENCION),
+    "gap_menores": ("🧒 Brecha de menores", QUERY_GAP_MENORES),
+}
+
+# Hojas del libro, en orden: (nombre, consulta sobre los resultados registrados, dependencias)
+HOJAS = [
+    ("Top 50 Brechas", "SELECT * FROM principal LIMIT 50", ("principal",)),
+    ("Casos Críticos", """
+        SELECT * FROM principal
+        WHERE pobreza_general_pct >= 50 AND cobertura_pobreza_pct < 20
+        LIMIT 30
+    """, ("principal",)),
+    ("Por Provincia", "SELECT * FROM provincias", ("provincias",)),
+    ("Sobreatención", "SELECT * FROM sobreatencion", ("sobreatencion",)),
+    ("Gap Menores", "SELECT * FROM gap_menores LIMIT 50", ("gap_menores",)),
+    ("Análisis Completo", "SELECT * FROM principal", ("principal",)),
+]
+
+# Totales para la hoja Resumen Ejecutivo
+QUERY_RESUMEN = """
+SELECT
+    (SELECT COUNT(*) FROM principal) as corregimientos,
+    (SELECT COALESCE(SUM(poblacion_total), 0) FROM principal) as poblacion,
+    (SELECT COALESCE(SUM(personas_pobreza_general), 0) FROM principal) as pobres,
+    (SELECT COALESCE(SUM(total_beneficiarios), 0) FROM principal) as beneficiarios,
+    (SELECT COUNT(*) FROM principal WHERE pobreza_general_pct >= 50) as pobreza_mayor_50,
+    (SELECT COUNT(*) FROM principal WHERE total_beneficiarios = 0) as sin_cobertura,
+    (SELECT COALESCE(SUM(gap_atencion_absoluto), 0) FROM principal) as gap,
+    (SELECT COUNT(*) FROM sobreatencion) as sobreatencion,
+    (SELECT COALESCE(SUM(total_beneficiarios), 0) FROM sobreatencion) as beneficiarios_sobreatencion,
+    (SELECT COALESCE(SUM(exceso_vs_pobreza_general), 0) FROM sobreatencion
+     WHERE exceso_vs_pobreza_general > 0) as exceso
+"""
 
 def conectar_duckdb(db_path):
-    """Conecta a DuckDB"""
-    return duckdb.connect(db_path)
+    """Conecta a DuckDB (solo lectura)"""
+    return duckdb.connect(db_path, read_only=True)
+
+def formatos_columnas(description):
+    """Formato numérico de Excel por columna según tipo y nombre"""
+    formatos = {}
+    for nombre, tipo, *_ in description:
+        tipo = str(tipo)
+        if tipo in ('TINYINT', 'SMALLINT', 'INTEGER', 'BIGINT', 'HUGEINT', 'UBIGINT'):
+            formatos[nombre] = '#,##0'
+        elif tipo in ('DOUBLE', 'FLOAT') or tipo.startswith('DECIMAL'):
+            es_pct = 'pct' in nombre or nombre.startswith('cobertura_')
+            formatos[nombre] = '0.0' if es_pct else '#,##0'
+    return formatos
+
+def escribir_hoja(libro, con, nombre, sql):
+    """Escribe el resultado de una consulta en una hoja, por lotes"""
+    resultado = con.execute(sql)
+    columnas = [d[0] for d in resultado.description]
+    lotes = iter(lambda: resultado.fetchmany(LOTE_FILAS), [])
+    return libro.write_sheet(nombre, columnas, lotes, formats=formatos_columnas(resultado.description))
+
+def filas_resumen(con, ambito="Nacional"):
+    """Indicadores de la hoja Resumen Ejecutivo; ambito nombra la región de los totales"""
+    (corregimientos, poblacion, pobres, beneficiarios, pobreza_mayor_50, sin_cobertura,
+     gap, sobreatencion, beneficiarios_sobreatencion, exceso) = con.execute(QUERY_RESUMEN).fetchone()
+    return [
+        ('Total Corregimientos Analizados', corregimientos),
+        ('Población Total', f"{poblacion:,.0f}"),
+        ('Personas en Pobreza General', f"{pobres:,.0f}"),
+        (f'Tasa de Pobreza {ambito} (%)', f"{pobres * 100 / poblacion if poblacion else 0:.1f}%"),
+        ('Total Beneficiarios', f"{beneficiarios:,.0f}"),
+        (f'Cobertura {ambito} (%)', f"{beneficiarios * 100 / pobres if pobres else 0:.1f}%"),
+        ('Corregimientos con Pobreza >50%', pobreza_mayor_50),
+        ('Corregimientos Sin Cobertura', sin_cobertura),
+        (f'Gap {ambito} (personas sin atender)', f"{gap:,.0f}"),
+        ('Corregimientos con Sobreatención', sobreatencion),
+        ('Beneficiarios en Sobreatención', f"{beneficiarios_sobreatencion:,.0f}"),
+        ('Exceso Total de Beneficiarios', f"{exceso:,.0f}"),
+    ]
+
+def ejecutar_consulta(con, sql):
+    """Ejecuta una consulta en un cursor propio; retorna (tabla Arrow, segundos)"""
+    inicio = time.perf_counter()
+    cursor = con.cursor()
+    try:
+        return tabla_arrow(cursor.execute(sql)), time.perf_counter() - inicio
+    finally:
+        cursor.close()
+
+def escribir_libro(con, output_file, esperar=None, ambito="Nacional"):
+    """
+    Escribe las 7 hojas del reporte a partir de los resultados registrados
+    en la conexión (principal, provincias, sobreatencion, gap_menores).
+
+    esperar(dependencias) se llama antes de cada hoja para que el llamador
+    registre los resultados que aún estén en curso. ambito es el nombre
+    de la región que cubre el libro (rótulos del Resumen Ejecutivo).
+    """
+    esperar = esperar or (lambda dependencias: None)
+    with StreamingExcelWriter(output_file) as libro:
+        for nombre, sql, dependencias in HOJAS:
+            esperar(dependencias)
+            escribir_hoja(libro, con, nombre, sql)
+
+        esperar(("principal", "sobreatencion"))
+        libro.write_sheet('Resumen Ejecutivo', ['Indicador', 'Valor'], [filas_resumen(con, ambito)],
+                          widths={'Indicador': 40, 'Valor': 18})
 
 def generar_excel_simple(db_path, output_file):
     """Genera Excel con análisis de brecha"""
     con = conectar_duckdb(db_path)
+    inicio = time.perf_counter()
     
     print("📊 Generando Excel de análisis de brecha...")
     
-    # Query principal: Top brechas
-    print("  📈 Procesando brechas por corregimiento...")
-    query_principal = """
-    WITH cobertura_por_correg AS (
-        SELECT
-            p.id_correg,
-            COUNT(*) as total_beneficiarios,
-            COUNT(CASE WHEN p.Programa = 'B/. 120 A LOS 65' THEN 1 END) as ben_120_65,
-            COUNT(CASE WHEN p.Programa = 'RED DE OPORTUNIDADES' THEN 1 END) as ben_red_oport,
-            COUNT(CASE WHEN p.Programa = 'ANGEL GUARDIAN' THEN 1 END) as ben_angel_guardian,
-            COUNT(CASE WHEN p.Programa = 'SENAPAN' THEN 1 END) as ben_senapan,
-            COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
-            COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
-            SUM(COALESCE(p.Menores_18, 0)) as total_menores_18,
-            -- Elegibilidad interpretada: NULL + sin FUPS = SIN FUPS, NULL + con FUPS = SIN PMT
-            COUNT(CASE WHEN p.Elegibilidad = 'ELEGIBLE' THEN 1 END) as elegibles,
-            COUNT(CASE WHEN p.Elegibilidad = 'NO ELEGIBLE' THEN 1 END) as no_elegibles,
-            COUNT(CASE WHEN p.Elegibilidad IS NULL AND p.Fecha_Ultima_FUPS IS NULL THEN 1 END) as sin_fups,
-            COUNT(CASE WHEN p.Elegibilidad IS NULL AND p.Fecha_Ultima_FUPS IS NOT NULL THEN 1 END) as sin_pmt
-        FROM planilla p
-        GROUP BY p.id_correg
-    ),
-    id_correg_mapa AS (
-        SELECT 
-            *,
-            (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as Id_Correg_Calc
-        FROM mapa_pobreza
-        WHERE total_personas > 0
-    )
-    SELECT 
-        m.provincia,
-        m.distrito,
-        m.corregimiento,
-        m.total_personas as poblacion_total,
-        ROUND(m.pct_pobreza_general_personas * 100, 1) as pobreza_general_pct,
-        ROUND(m.pct_pobreza_extrema_personas * 100, 1) as pobreza_extrema_pct,
-        ROUND(m.total_personas * m.pct_pobreza_general_personas) as personas_pobreza_general,
-        ROUND(m.total_personas * m.pct_pobreza_extrema_personas) as personas_pobreza_extrema,
-        COALESCE(c.total_beneficiarios, 0) as total_beneficiarios,
-        COALESCE(c.ben_120_65, 0) as ben_120_65,
-        COALESCE(c.ben_red_oport, 0) as ben_red_oportunidades,
-        COALESCE(c.ben_angel_guardian, 0) as ben_angel_guardian,
-        COALESCE(c.ben_senapan, 0) as ben_senapan,
-        ROUND(COALESCE(c.total_beneficiarios, 0) * 100.0 / 
-              NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0), 1) as cobertura_pobreza_pct,
-        ROUND(m.total_personas * m.pct_pobreza_general_personas - 
-              COALESCE(c.total_beneficiarios, 0)) as gap_atencion_absoluto,
-        CASE 
-            WHEN m.pct_pobreza_general_personas >= 0.7 THEN 'EXTREMO'
-            WHEN m.pct_pobreza_general_personas >= 0.5 THEN 'ALTO'
-            WHEN m.pct_pobreza_general_personas >= 0.3 THEN 'MODERADO'
-            ELSE 'BAJO'
-        END as nivel_pobreza,
-        CASE 
-            WHEN COALESCE(c.total_beneficiarios, 0) = 0 THEN 'SIN COBERTURA'
-            WHEN COALESCE(c.total_beneficiarios, 0) * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0) < 10 THEN 'BAJA'
-            WHEN COALESCE(c.total_beneficiarios, 0) * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0) < 25 THEN 'MEDIA'
-            ELSE 'ALTA'
-        END as nivel_cobertura
-    FROM id_correg_mapa m
-    LEFT JOIN cobertura_por_correg c ON m.Id_Correg_Calc = c.id_correg
-    ORDER BY gap_atencion_absoluto DESC
-    """
-    
-    # Ejecutar query
-    df_principal = con.execute(query_principal).fetchdf()
-    
-    # Query resumen por provincia
-    print("  🗺️ Procesando estadísticas provinciales...")
-    query_provincias = """
-    WITH stats_provincia AS (
-        SELECT 
-            m.codigo_provincia,
-            m.provincia,
-            SUM(m.total_personas) as poblacion_total,
-            SUM(m.total_personas * m.pct_pobreza_general_personas) as personas_pobreza,
-            COUNT(*) as total_corregimientos
-        FROM mapa_pobreza m
-        WHERE m.total_personas > 0
-        GROUP BY m.codigo_provincia, m.provincia
-    ),
-    beneficiarios_provincia AS (
-        SELECT
-            CAST(p.id_correg / 10000 AS INTEGER) as codigo_provincia,
-            COUNT(*) as total_beneficiarios,
-            COUNT(DISTINCT p.id_correg) as corregimientos_atendidos,
-            COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
-            COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
-            SUM(COALESCE(p.Menores_18, 0)) as total_menores_18
-        FROM planilla p
-        GROUP BY CAST(p.id_correg / 10000 AS INTEGER)
-    )
-    SELECT 
-        sp.provincia,
-        sp.poblacion_total,
-        ROUND(sp.personas_pobreza) as personas_pobreza,
-        ROUND(sp.personas_pobreza * 100.0 / sp.poblacion_total, 1) as tasa_pobreza_pct,
-        COALESCE(bp.total_beneficiarios, 0) as total_beneficiarios,
-        ROUND(COALESCE(bp.total_beneficiarios, 0) * 100.0 / sp.personas_pobreza, 1) as cobertura_pct,
-        COALESCE(bp.corregimientos_atendidos, 0) as corregimientos_atendidos,
-        sp.total_corregimientos,
-        ROUND(COALESCE(bp.corregimientos_atendidos, 0) * 100.0 / sp.total_corregimientos, 1) as cobertura_geografica_pct,
-        ROUND(sp.personas_pobreza - COALESCE(bp.total_beneficiarios, 0)) as gap_provincial
-    FROM stats_provincia sp
-    LEFT JOIN beneficiarios_provincia bp ON sp.codigo_provincia = bp.codigo_provincia
-    ORDER BY sp.personas_pobreza DESC
-    """
-    
-    df_provincias = con.execute(query_provincias).fetchdf()
-    
-    # Query casos críticos
-    print("  🚨 Identificando casos críticos...")
-    df_criticos = df_principal[
-        (df_principal['pobreza_general_pct'] >= 50) & 
-        (df_principal['cobertura_pobreza_pct'] < 20)
-    ].head(30).copy()
-    
-    # Top gaps absolutos
-    df_top_gaps = df_principal.head(50).copy()
+    # Las consultas son independientes: corren en paralelo, cada una en su
+    # cursor, mientras se escriben las hojas cuyos datos ya están listos.
+    # Los resultados se registran como tablas Arrow; las hojas derivadas
+    # (Top 50, Casos Críticos, Resumen) son consultas sobre ellos.
+    with ThreadPoolExecutor(max_workers=len(CONSULTAS)) as pool:
+        futuros = {
+            nombre: pool.submit(ejecutar_consulta, con, sql)
+            for nombre, (_, sql) in CONSULTAS.items()
+        }
+
+        def esperar(dependencias):
+            for nombre in dependencias:
+                if futuros[nombre] is None:
+                    continue
+                tabla, segundos = futuros[nombre].result()
+                con.register(nombre, tabla)
+                futuros[nombre] = None
+                print(f"  {CONSULTAS[nombre][0]}: {tabla.num_rows:,} filas en {segundos:.2f} s")
+
+        # Crear Excel: cada hoja se escribe por lotes en modo de memoria constante
+        print(f"💾 Creando archivo: {output_file}")
+        escribir_libro(con, output_file, esperar)
     
-    # Query casos de sobreatención
-    print("  🔄 Identificando casos de sobreatención...")
-    query_sobreatencion = """
-    WITH cobertura_por_correg AS (
-        SELECT
-            p.id_correg,
-            COUNT(*) as total_beneficiarios,
-            COUNT(CASE WHEN p.Programa = 'B/. 120 A LOS 65' THEN 1 END) as ben_120_65,
-            COUNT(CASE WHEN p.Programa = 'RED DE OPORTUNIDADES' THEN 1 END) as ben_red_oport,
-            COUNT(CASE WHEN p.Programa = 'ANGEL GUARDIAN' THEN 1 END) as ben_angel_guardian,
-            COUNT(CASE WHEN p.Programa = 'SENAPAN' THEN 1 END) as ben_senapan,
-            COUNT(CASE WHEN p.Sexo = 'Mujer' THEN 1 END) as ben_femenino,
-            COUNT(CASE WHEN p.Sexo = 'Hombre' THEN 1 END) as ben_masculino,
-            SUM(COALESCE(p.Menores_18, 0)) as total_menores_18
-        FROM planilla p
-        GROUP BY p.id_correg
-    ),
-    id_correg_mapa AS (
-        SELECT
-            *,
-            (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as Id_Correg_Calc
-        FROM mapa_pobreza
-        WHERE total_personas > 0
-    )
-    SELECT
-        COALESCE(m.provincia, 'SIN DATOS POBREZA') as provincia,
-        COALESCE(m.distrito, 'SIN DATOS') as distrito,
-        COALESCE(m.corregimiento, 'SIN DATOS') as corregimiento,
-        COALESCE(m.total_personas, 0) as poblacion_total,
-        ROUND(COALESCE(m.pct_pobreza_general_personas * 100, 0), 1) as pobreza_general_pct,
-        ROUND(COALESCE(m.pct_pobreza_extrema_personas * 100, 0), 1) as pobreza_extrema_pct,
-        ROUND(COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)) as personas_pobreza_general,
-        ROUND(COALESCE(m.total_personas * m.pct_pobreza_extrema_personas, 0)) as personas_pobreza_extrema,
-        c.total_beneficiarios,
-        c.ben_120_65,
-        c.ben_red_oport,
-        c.ben_angel_guardian,
-        c.ben_senapan,
-        c.ben_femenino,
-        c.ben_masculino,
-        c.total_menores_18,
-        ROUND(c.total_beneficiarios * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_general_personas, 0), 1) as cobertura_vs_pobreza_general,
-        ROUND(c.total_beneficiarios * 100.0 / NULLIF(m.total_personas * m.pct_pobreza_extrema_personas, 0), 1) as cobertura_vs_pobreza_extrema,
-        ROUND(c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)) as exceso_vs_pobreza_general,
-        ROUND(c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_extrema_personas, 0)) as exceso_vs_pobreza_extrema,
-        CASE
-            WHEN m.Id_Correg_Calc IS NULL THEN 'SIN DATOS POBREZA'
-            WHEN c.total_beneficiarios > m.total_personas * m.pct_pobreza_general_personas THEN 'SOBREATENCION GENERAL'
-            WHEN c.total_beneficiarios > m.total_personas * m.pct_pobreza_extrema_personas THEN 'SOBREATENCION EXTREMA'
-            ELSE 'NORMAL'
-        END as tipo_atencion,
-        c.id_correg as id_correg_planilla
-    FROM cobertura_por_correg c
-    LEFT JOIN id_correg_mapa m ON c.id_correg = m.Id_Correg_Calc
-    WHERE c.total_beneficiarios > COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0)
-       OR m.Id_Correg_Calc IS NULL
-    ORDER BY c.total_beneficiarios - COALESCE(m.total_personas * m.pct_pobreza_general_personas, 0) DESC
+    con.close()
+    print(f"⏱️ Tiempo total: {time.perf_counter() - inicio:.2f} s")
+    return True
+
+def calcular_resultados(db_path):
+    """Ejecuta las consultas del reporte en paralelo y retorna {nombre: tabla Arrow}"""
+    con = conectar_duckdb(db_path)
+    with ThreadPoolExecutor(max_workers=len(CONSULTAS)) as pool:
+        futuros = {
+            pool.submit(ejecutar_consulta, con, sql): nombre
+            for nombre, (_, sql) in CONSULTAS.items()
+        }
+        resultados = {}
+        for futuro in as_completed(futuros):
+            nombre = futuros[futuro]
+            tabla, segundos = futuro.result()
+            resultados[nombre] = tabla
+            print(f"  {CONSULTAS[nombre][0]}: {tabla.num_rows:,} filas en {segundos:.2f} s")
+    con.close()
+    return resultados
+
+def slug(texto):
+    """Texto apto para nombre de archivo: sin tildes, minúsculas y guiones bajos"""
+    texto = unicodedata.normalize('NFKD', str(texto)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', texto.lower()).strip('_')
+
+# Resultados nacionales de cada proceso de trabajo (se cargan una vez por proceso)
+_resultados_worker = None
+
+def _iniciar_worker(resultados):
+    global _resultados_worker
+    _resultados_worker = resultados
+
+def generar_libro_region(provincia, distrito, output_file):
+    """Escribe el libro de una provincia (o distrito) filtrando los resultados nacionales"""
+    import pyarrow.compute as pc
+
+    inicio = time.perf_counter()
+    con = duckdb.connect()
+    for nombre, tabla in _resultados_worker.items():
+        filtro = pc.equal(tabla['provincia'], provincia)
+        if distrito is not None and 'distrito' in tabla.column_names:
+            filtro = pc.and_(filtro, pc.equal(tabla['distrito'], distrito))
+        con.register(nombre, tabla.filter(filtro))
+    filas = con.execute("SELECT COUNT(*) FROM principal").fetchone()[0]
+    escribir_libro(con, output_file, ambito=provincia if distrito is None else f"{distrito}, {provincia}")
+    con.close()
+    return {
+        "provincia": provincia,
+        "distrito": distrito,
+        "archivo": output_file,
+        "corregimientos": filas,
+        "bytes": os.path.getsize(output_file),
+        "segundos": round(time.perf_counter() - inicio, 2),
+    }
+
+def generar_por_region(db_path, nivel, output_dir, workers=None):
     """
-    
-    df_sobreatencion = con.execute(query_sobreatencion).fetchdf()
-
-    # Query gap de menores
-    print("  🧒 Procesando brecha de menores...")
-    query_gap_menores = """
-    WITH menores_censo AS (
-        SELECT
-            CONCAT(
-                LPAD(PROVINCIA, 2, '0'),
-                LPAD(DISTRITO, 2, '0'),
-                LPAD(CORREG, 2, '0')
-            )::BIGINT as id_correg,
-            COUNT(*) as menores_18_censo
-        FROM personas
-        WHERE P03_EDAD IS NOT NULL AND CAST(P03_EDAD AS INTEGER) < 18
-        GROUP BY PROVINCIA, DISTRITO, CORREG
-    ),
-    menores_planilla AS (
-        SELECT
-            id_correg,
-            SUM(COALESCE(Menores_18, 0)) as menores_18_beneficiarios,
-            COUNT(*) as beneficiarios_total
-        FROM planilla
-        GROUP BY id_correg
-    ),
-    id_correg_mapa AS (
-        SELECT
-            *,
-            (codigo_provincia * 10000 + codigo_distrito * 100 + codigo_corregimiento) as id_correg_calc
-        FROM mapa_pobreza
-        WHERE total_personas > 0
-    )
-    SELECT
-        m.provincia,
-        m.distrito,
-        m.corregimiento,
-        COALESCE(c.menores_18_censo, 0) as menores_18_censo,
-        COALESCE(p.menores_18_beneficiarios, 0) as menores_18_beneficiarios,
-        ROUND(COALESCE(p.menores_18_beneficiarios, 0) * 100.0 /
-              NULLIF(c.menores_18_censo, 0), 1) as cobertura_menores_pct,
-        ROUND(COALESCE(c.menores_18_censo, 0) - COALESCE(p.menores_18_beneficiarios, 0)) as gap_menores
-    FROM id_correg_mapa m
-    LEFT JOIN menores_censo c ON m.id_correg_calc = c.id_correg
-    LEFT JOIN menores_planilla p ON m.id_correg_calc = p.id_correg
-    WHERE COALESCE(c.menores_18_censo, 0) > 0
-    ORDER BY gap_menores DESC
+    Calcula el análisis una vez y genera un libro por provincia o distrito
+    en procesos paralelos. Retorna la ruta del manifest.
     """
+    inicio = time.perf_counter()
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M')
+    os.makedirs(output_dir, exist_ok=True)
 
-    df_gap_menores = con.execute(query_gap_menores).fetchdf()
-    df_gap_menores = df_gap_menores.head(50).copy()
-    
+    print(f"📊 Calculando análisis nacional para reportes por {nivel}...")
+    resultados = calcular_resultados(db_path)
+
+    columnas = ["provincia"] + (["distrito"] if nivel == "distrito" else [])
+    con = duckdb.connect()
+    con.register("principal", resultados["principal"])
+    regiones = con.execute(
+        f"SELECT DISTINCT {', '.join(columnas)} FROM principal ORDER BY ALL"
+    ).fetchall()
     con.close()
-    
-    # Crear Excel
-    print(f"💾 Creando archivo: {output_file}")
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        
-        # Hoja 1: Top Gaps Absolutos
-        df_top_gaps.to_excel(writer, sheet_name='Top 50 Brechas', index=False)
-        
-        # Hoja 2: Casos Críticos
-        df_criticos.to_excel(writer, sheet_name='Casos Críticos', index=False)
-        
-        # Hoja 3: Por Provincia
-        df_provincias.to_excel(writer, sheet_name='Por Provincia', index=False)
-        
-        # Hoja 4: Casos de Sobreatención
-        df_sobreatencion.to_excel(writer, sheet_name='Sobreatención', index=False)
-
-        # Hoja 5: Gap de menores
-        df_gap_menores.to_excel(writer, sheet_name='Gap Menores', index=False)
-
-        # Hoja 6: Análisis completo (todos los corregimientos)
-        df_principal.to_excel(writer, sheet_name='Análisis Completo', index=False)
-
-        # Hoja 7: Resumen actualizado
-        resumen_data = {
-            'Indicador': [
-                'Total Corregimientos Analizados',
-                'Población Total',
-                'Personas en Pobreza General',
-                'Tasa Nacional de Pobreza (%)',
-                'Total Beneficiarios',
-                'Cobertura Nacional (%)',
-                'Corregimientos con Pobreza >50%',
-                'Corregimientos Sin Cobertura',
-                'Gap Nacional (personas sin atender)',
-                'Corregimientos con Sobreatención',
-                'Beneficiarios en Sobreatención',
-                'Exceso Total de Beneficiarios'
-            ],
-            'Valor': [
-                len(df_principal),
-                f"{df_principal['poblacion_total'].sum():,.0f}",
-                f"{df_principal['personas_pobreza_general'].sum():,.0f}",
-                f"{df_principal['personas_pobreza_general'].sum() * 100 / df_principal['poblacion_total'].sum():.1f}%",
-                f"{df_principal['total_beneficiarios'].sum():,.0f}",
-                f"{df_principal['total_beneficiarios'].sum() * 100 / df_principal['personas_pobreza_general'].sum():.1f}%",
-                len(df_principal[df_principal['pobreza_general_pct'] >= 50]),
-                len(df_principal[df_principal['total_beneficiarios'] == 0]),
-                f"{df_principal['gap_atencion_absoluto'].sum():,.0f}",
-                len(df_sobreatencion),
-                f"{df_sobreatencion['total_beneficiarios'].sum():,.0f}",
-                f"{df_sobreatencion[df_sobreatencion['exceso_vs_pobreza_general'] > 0]['exceso_vs_pobreza_general'].sum():,.0f}"
-            ]
-        }
-        pd.DataFrame(resumen_data).to_excel(writer, sheet_name='Resumen Ejecutivo', index=False)
-    
-    return True
+
+    tareas = []
+    for region in regiones:
+        provincia = region[0]
+        distrito = region[1] if nivel == "distrito" else None
+        nombre = "_".join(slug(v) for v in region)
+        tareas.append((provincia, distrito,
+                       os.path.join(output_dir, f"analisis_brecha_{nombre}_{timestamp}.xlsx")))
+
+    print(f"💾 Generando {len(tareas)} libros en paralelo...")
+    libros = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_iniciar_worker,
+                             initargs=(resultados,)) as pool:
+        futuros = [pool.submit(generar_libro_region, *tarea) for tarea in tareas]
+        for futuro in as_completed(futuros):
+            libro = futuro.result()
+            libros.append(libro)
+            region = libro["provincia"] + (f" / {libro['distrito']}" if libro["distrito"] else "")
+            print(f"  ✓ {region}: {libro['corregimientos']} corregimientos, {libro['segundos']:.2f} s")
+
+    libros.sort(key=lambda l: l["archivo"])
+    manifest_path = os.path.join(output_dir, f"manifest_{timestamp}.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            "generado": datetime.now().isoformat(timespec='seconds'),
+            "base_datos": db_path,
+            "nivel": nivel,
+            "segundos": round(time.perf_counter() - inicio, 2),
+            "libros": libros,
+        }, f, ensure_ascii=False, indent=2)
+
+    print(f"⏱️ Tiempo total: {time.perf_counter() - inicio:.2f} s")
+    return manifest_path
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Genera el Excel de análisis de brecha")
+    parser.add_argument('--por', choices=['provincia', 'distrito'],
+                        help='Generar un libro por provincia o por distrito')
+    parser.add_argument('--output-dir', default='.',
+                        help='Directorio de salida para --por (default: .)')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='Procesos paralelos para --por (default: núcleos disponibles)')
+    parser.add_argument('--output', '-o', default=None,
+                        help='Archivo de salida (default: analisis_brecha_pobreza_YYYYMMDD_HHMM.xlsx)')
+    args = parser.parse_args()
+
     base_dir = Path(__file__).parent
     db_path = str(base_dir / "censo_2023.duckdb")
     timestamp = datetime.now().strftime('%Y%m%d_%H%M')
-    output_file = f"analisis_brecha_pobreza_{timestamp}.xlsx"
+    output_file = args.output or f"analisis_brecha_pobreza_{timestamp}.xlsx"
     
     if not Path(db_path).exists():
         print(f"❌ No se encontró: {db_path}")
         sys.exit(1)
     
+    if args.por:
+        try:
+            manifest = generar_por_region(db_path, args.por, args.output_dir, args.workers)
+            print(f"✅ Manifest: {manifest}")
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        sys.exit(0)
+
     try:
         if generar_excel_simple(db_path, output_file):
             print(f"✅ Excel generado: {output_file}")
@@ -5,20 +5,85 @@ Genera todos los mapas interactivos de análisis de cobertura.
 Uso:
     python generar_mapas.py              # Genera todos los mapas
     python generar_mapas.py --output-dir ./mapas  # En directorio específico
+    python generar_mapas.py --detail bajo         # Geometría más liviana
+    python generar_mapas.py --format topojson     # Bordes compartidos una sola vez
+    python generar_mapas.py --combined            # Un solo mapa con selector de métrica
+    python generar_mapas.py --include-combined    # Uno por métrica y además el combinado
+    python generar_mapas.py --no-timestamp        # mapa_<métrica>.html (pipeline.py)
+    python generar_mapas.py --drilldown           # Provincias → distritos → corregimientos
+    python generar_mapas.py --bundle              # Geometría y métricas en assets/ compartidos
+    python generar_mapas.py --details             # Popup con desglose (detalle/<id_corr>.json)
+
+Los datos se cargan y reproyectan una sola vez; cada mapa se dibuja en un
+proceso del pool, que hereda el GeoDataFrame ya preparado (fork).
 """
 
 import os
-import subprocess
 import argparse
+import contextlib
+import io
+import multiprocessing
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime
 
-def generate_all_maps(output_dir="."):
-    """Genera todos los mapas disponibles"""
+import choropleth_cobertura as choropleth
+import detalle_corregimientos
+
+# GeoDataFrame preparado (y niveles de drill-down), compartidos con el pool
+_gdf = None
+_levels = None
+
+
+def _init_worker(gdf, levels=None):
+    global _gdf, _levels
+    _gdf = gdf
+    _levels = levels
+
+
+def render_map(metric, output_path, decimals, output_format, classification="lineal", n_classes=5,
+               bundle=False, details=False):
+    """Dibuja un mapa en el proceso actual; retorna (segundos, salida capturada)"""
+    inicio = time.perf_counter()
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida):
+        choropleth.create_choropleth(
+            _gdf,
+            metric=choropleth.METRICS if metric == "todas" else metric,
+            output_file=output_path,
+            decimals=decimals,
+            output_format=output_format,
+            classification=classification,
+            n_classes=n_classes,
+            levels=_levels,
+            bundle=bundle,
+            details=details,
+        )
+    return time.perf_counter() - inicio, salida.getvalue()
+
+
+def generate_all_maps(output_dir=".", detail="medio", output_format="geojson", combined=False,
+                      workers=None, classification="lineal", n_classes=5, drilldown=False,
+                      bundle=False, details=False, include_combined=False, timestamp=True):
+    """Genera todos los mapas disponibles; retorna True si se generaron todos
+
+    Con combined=True genera un solo mapa con todas las métricas: la
+    geometría va una vez y el color se cambia en el navegador;
+    include_combined=True lo agrega a los de cada métrica, con la misma
+    carga de datos. Con timestamp=False los archivos se llaman
+    mapa_<métrica>.html (nombres fijos, los que espera pipeline.py). Con
+    drilldown=True cada mapa abre con provincias y carga distritos y
+    corregimientos al acercarse. Con bundle=True los mapas comparten la
+    geometría en <output_dir>/assets/ y cada métrica se escribe una sola vez.
+    Con details=True se escribe una vez <output_dir>/detalle/<id_corr>.json
+    y los popups lo piden al abrirse.
+    """
 
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M")
+    sufijo = datetime.now().strftime("_%Y%m%d_%H%M") if timestamp else ""
     
     metrics = [
         {
@@ -46,46 +111,74 @@ def generate_all_maps(output_dir="."):
             "description": "Cobertura de menores de 18 años",
             "color": "🟣"
         },
+        {
+            "name": "hotspots",
+            "description": "Puntos calientes y fríos de la brecha (Gi*)",
+            "color": "🔥"
+        },
     ]
 
+    combinado = {
+        "name": "todas",
+        "file": "combinado",
+        "description": "Todas las métricas (selector en el mapa)",
+        "color": "🗺️",
+    }
+    if combined:
+        metrics = [combinado]
+    elif include_combined:
+        metrics.append(combinado)
+
     print("╔════════════════════════════════════════════════════════════╗")
     print("║        Generando Mapas Interactivos de Análisis            ║")
     print("╚════════════════════════════════════════════════════════════╝\n")
 
     generated_files = []
+    inicio = time.perf_counter()
+
+    # Carga, enriquecimiento y reproyección una sola vez para todos los mapas
+    decimals = choropleth.DETALLES[detail]
+    gdf = choropleth.load_data(detail)
+    levels = choropleth.load_levels(gdf) if drilldown else None
+    if details:
+        detalle_corregimientos.escribir_detalles(output_dir, choropleth.DB_PATH)
+    gdf = choropleth.prepare_wgs84(gdf, decimals)
+    print(f"⏱️ Datos listos en {time.perf_counter() - inicio:.1f} s\n")
 
+    tareas = {}
     for metric_config in metrics:
         metric = metric_config["name"]
-        output_file = f"mapa_{metric}_{timestamp}.html"
-        output_path = os.path.join(output_dir, output_file)
-
-        print(f"{metric_config['color']} Generando: {metric_config['description']}")
-        print(f"   → {output_file}")
-
-        try:
-            result = subprocess.run(
-                [
-                    "python",
-                    "choropleth_cobertura.py",
-                    "--metric",
-                    metric,
-                    "--output",
-                    output_path,
-                ],
-                capture_output=True,
-                text=True,
-                timeout=120,
-            )
-
-            if result.returncode == 0:
+        output_file = f"mapa_{metric_config.get('file', metric)}{sufijo}.html"
+        tareas[metric] = (metric_config, os.path.join(output_dir, output_file))
+
+    # fork: los procesos heredan el GeoDataFrame sin serializarlo
+    metodos = multiprocessing.get_all_start_methods()
+    contexto = multiprocessing.get_context("fork" if "fork" in metodos else None)
+    with ProcessPoolExecutor(
+        max_workers=workers or min(len(tareas), os.cpu_count() or 1),
+        mp_context=contexto,
+        initializer=_init_worker,
+        initargs=(gdf, levels),
+    ) as pool:
+        futuros = {
+            pool.submit(render_map, metric, output_path, decimals, output_format,
+                        classification, n_classes, bundle, details): metric
+            for metric, (_, output_path) in tareas.items()
+        }
+        for futuro in as_completed(futuros):
+            metric = futuros[futuro]
+            metric_config, output_path = tareas[metric]
+            print(f"{metric_config['color']} {metric_config['description']}")
+            print(f"   → {os.path.basename(output_path)}")
+            try:
+                segundos, _ = futuro.result()
                 file_size = os.path.getsize(output_path) / 1024 / 1024
-                print(f"   ✓ Guardado ({file_size:.2f} MB)\n")
+                print(f"   ✓ Guardado ({file_size:.2f} MB, {segundos:.1f} s)\n")
                 generated_files.append((metric, output_path))
-            else:
-                print(f"   ❌ Error: {result.stderr}\n")
+            except Exception as e:
+                print(f"   ❌ Error: {e}\n")
 
-        except Exception as e:
-            print(f"   ❌ Error: {e}\n")
+    print(f"⏱️ Tiempo total: {time.perf_counter() - inicio:.1f} s\n")
 
     print("╔════════════════════════════════════════════════════════════╗")
     print("║                    Resumen de Mapas                        ║")
@@ -99,11 +192,18 @@ def generate_all_maps(output_dir="."):
 
         print(f"\n📂 Directorio: {os.path.abspath(output_dir)}")
         print(f"\nPara abrir en navegador:")
-        print(f"  open {os.path.abspath(generated_files[0][1])}")
+        if bundle or details:
+            # Los recursos se piden con fetch: hace falta un servidor HTTP
+            print(f"  python recursos_web.py {output_dir}  →  "
+                  f"http://localhost:8000/{os.path.basename(generated_files[0][1])}")
+        else:
+            print(f"  open {os.path.abspath(generated_files[0][1])}")
 
     else:
         print("❌ No se generaron mapas")
 
+    return len(generated_files) == len(tareas)
+
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Genera todos los mapas interactivos")
@@ -112,6 +212,73 @@ if __name__ == "__main__":
         default="./mapas",
         help="Directorio de salida (default: ./mapas)",
     )
+    parser.add_argument(
+        "--detail",
+        default="medio",
+        choices=["completo", "alto", "medio", "bajo"],
+        help="Nivel de detalle de la geometría (default: medio)",
+    )
+    parser.add_argument(
+        "--format",
+        default="geojson",
+        choices=["geojson", "topojson"],
+        help="Codificación de la geometría (default: geojson)",
+    )
+    parser.add_argument(
+        "--combined",
+        action="store_true",
+        help="Un solo mapa con todas las métricas y selector en el navegador",
+    )
+    parser.add_argument(
+        "--include-combined",
+        action="store_true",
+        help="Además de un mapa por métrica, el combinado (una sola carga de datos)",
+    )
+    parser.add_argument(
+        "--no-timestamp",
+        action="store_true",
+        help="Nombres fijos mapa_<métrica>.html, sin fecha (los reemplaza en cada corrida)",
+    )
+    parser.add_argument(
+        "--drilldown",
+        action="store_true",
+        help="Provincias al alejar; distritos y corregimientos se cargan al acercar",
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Geometría y métricas en <output-dir>/assets/ (con hash, .gz y .br) compartidos "
+             "por todos los mapas",
+    )
+    parser.add_argument(
+        "--details",
+        action="store_true",
+        help="Popup con desglose por programa, sexo, elegibilidad y menores "
+             "(<output-dir>/detalle/<id_corr>.json, se pide al abrirlo)",
+    )
+    parser.add_argument(
+        "--classification",
+        default="lineal",
+        choices=choropleth.METODOS,
+        help="Clasificación de colores (default: lineal)",
+    )
+    parser.add_argument(
+        "--classes", type=int, default=5, help="Número de clases (default: 5)"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Procesos para dibujar mapas en paralelo (default: uno por mapa, hasta los núcleos)",
+    )
 
     args = parser.parse_args()
-    generate_all_maps(output_dir=args.output_dir)
+    completos = generate_all_maps(output_dir=args.output_dir, detail=args.detail,
+                                  output_format=args.format, combined=args.combined,
+                                  workers=args.workers, classification=args.classification,
+                                  n_classes=args.classes, drilldown=args.drilldown,
+                                  bundle=args.bundle, details=args.details,
+                                  include_combined=args.include_combined,
+                                  timestamp=not args.no_timestamp)
+    if not completos:
+        sys.exit(1)
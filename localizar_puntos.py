@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Asigna id_corr a puntos (lugares poblados, instalaciones, GPS de campo)
+
+Ubica en lote cada punto en su corregimiento con data/geo/corregimientos.parquet:
+un índice espacial STRtree sobre los polígonos (preparados) y consultas
+vectoriales de shapely por lote de puntos, sin recorrer punto por punto. Los puntos se
+reproyectan con pyproj al CRS de los polígonos.
+
+La fuente puede ser una tabla de la base (p. ej. cat_lugares) o un CSV /
+Parquet; el resultado se escribe en DuckDB como una tabla nueva con todas
+las columnas de la fuente más:
+
+    id_corr       corregimiento asignado (NULL si no cae en ninguno)
+    metodo        'dentro' (el punto está en el polígono) o 'cercano'
+                  (fuera de todos, a menos de --max-distancia metros)
+    distancia_m   distancia al corregimiento asignado (0 si está dentro)
+
+Los atributos no pasan por Python: solo se leen las coordenadas, y el
+resultado se une a la fuente dentro de DuckDB por número de fila.
+
+Uso:
+    python localizar_puntos.py cat_lugares                          # → tabla cat_lugares_corr
+    python localizar_puntos.py encuesta.csv --lon longitud --lat latitud --salida encuesta_corr
+    python localizar_puntos.py puntos.parquet --crs EPSG:32617 --max-distancia 500
+    python localizar_puntos.py --aleatorios 5000000                 # solo medir puntos/s
+
+Con servidor_consultas.py activo, liberar el archivo antes (POST /liberar y
+luego /recargar), porque escribe en la base.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import duckdb
+import numpy as np
+import shapely
+
+import preparar_geo
+
+GEOPARQUET_PATH = "data/geo/corregimientos.parquet"
+DB_PATH = "censo_2023.duckdb"
+
+# Puntos por consulta al índice (acota la memoria de las geometrías de punto)
+LOTE = 1_000_000
+
+# Nombres habituales de las columnas de coordenadas (sin distinguir mayúsculas)
+COLUMNAS_LON = ["lon", "lng", "longitud", "longitude", "x", "coord_x"]
+COLUMNAS_LAT = ["lat", "latitud", "latitude", "y", "coord_y"]
+
+
+class Localizador:
+    """Índice STRtree de los corregimientos; localizar() asigna id_corr en lote"""
+
+    def __init__(self, path: str = GEOPARQUET_PATH, crs_puntos="EPSG:4326"):
+        import geopandas as gpd
+        from pyproj import Transformer
+
+        inicio = time.perf_counter()
+        gdf = gpd.read_parquet(path, columns=["id_corr_int", "geometry"])
+        # Distancias en metros: los polígonos en un CRS proyectado
+        if gdf.crs is None or gdf.crs.is_geographic:
+            gdf = gdf.to_crs(preparar_geo.CRS_METRICO)
+        self.ids = gdf["id_corr_int"].to_numpy(dtype="int64")
+        self.poligonos = np.asarray(gdf.geometry.values)
+        # Preparados una vez: cada prueba punto-en-polígono reutiliza su índice interno
+        shapely.prepare(self.poligonos)
+        self.arbol = shapely.STRtree(self.poligonos)
+        self.crs = gdf.crs
+        self.transformador = Transformer.from_crs(crs_puntos, gdf.crs, always_xy=True)
+        self.segundos_indice = time.perf_counter() - inicio
+
+    def localizar(self, x, y, max_distancia: float = None):
+        """id_corr (-1 si ninguno), distancia en metros (NaN si ninguno) y si cayó dentro
+
+        x, y en el CRS de los puntos (lon/lat con el default). Un punto en el
+        borde entre dos corregimientos queda en el primero del GeoParquet.
+        """
+        x, y = self.transformador.transform(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+        puntos = shapely.points(x, y)
+        n = len(puntos)
+        ids = np.full(n, -1, dtype="int64")
+        distancia = np.full(n, np.nan)
+
+        # Candidatos por extensión en el índice y luego la prueba exacta, vectorial
+        # sobre todos los pares (query(predicate=...) prepararía los puntos, no
+        # los polígonos, y es un orden de magnitud más lento)
+        entrada, poligono = self.arbol.query(puntos)
+        adentro = shapely.intersects_xy(self.poligonos[poligono], x[entrada], y[entrada])
+        entrada, poligono = entrada[adentro], poligono[adentro]
+        if len(entrada):
+            orden = np.lexsort((poligono, entrada))
+            entrada, poligono = entrada[orden], poligono[orden]
+            primero = np.unique(entrada, return_index=True)[1]
+            ids[entrada[primero]] = self.ids[poligono[primero]]
+            distancia[entrada[primero]] = 0.0
+        dentro = ids >= 0
+
+        if max_distancia:
+            faltan = np.flatnonzero(~dentro & np.isfinite(x) & np.isfinite(y))
+            if len(faltan):
+                (entrada, poligono), metros = self.arbol.query_nearest(
+                    puntos[faltan], max_distance=max_distancia, return_distance=True,
+                    all_matches=False,
+                )
+                ids[faltan[entrada]] = self.ids[poligono]
+                distancia[faltan[entrada]] = metros
+        return ids, distancia, dentro
+
+
+def localizar_lotes(localizador: Localizador, x, y, max_distancia: float = None, lote: int = LOTE):
+    """localizar() por lotes; retorna (ids, distancia, dentro, segundos)"""
+    inicio = time.perf_counter()
+    partes = [
+        localizador.localizar(x[i:i + lote], y[i:i + lote], max_distancia)
+        for i in range(0, len(x), lote)
+    ]
+    segundos = time.perf_counter() - inicio
+    if not partes:
+        return np.empty(0, "int64"), np.empty(0), np.empty(0, bool), segundos
+    ids, distancia, dentro = (np.concatenate(p) for p in zip(*partes))
+    return ids, distancia, dentro, segundos
+
+
+def _columna(columnas, pedida, candidatas, eje):
+    """Columna de coordenadas: la pedida o la primera candidata presente"""
+    if pedida:
+        if pedida not in columnas:
+            raise ValueError(f"No existe la columna {pedida!r} (columnas: {', '.join(columnas)})")
+        return pedida
+    por_nombre = {c.lower(): c for c in columnas}
+    for candidata in candidatas:
+        if candidata in por_nombre:
+            return por_nombre[candidata]
+    raise ValueError(f"No se encontró la columna de {eje}; indicarla con --{eje} "
+                     f"(columnas: {', '.join(columnas)})")
+
+
+def _fuente_sql(entrada: str) -> tuple:
+    """(expresión FROM, parámetros) para una tabla de la base o un archivo"""
+    if os.path.exists(entrada):
+        lector = "read_parquet" if entrada.lower().endswith(".parquet") else "read_csv_auto"
+        return f"{lector}($ruta)", {"ruta": entrada}
+    return '"' + entrada.replace('"', '""') + '"', {}
+
+
+def _reporte(n, ids, dentro, segundos, segundos_indice):
+    cercanos = int(((ids >= 0) & ~dentro).sum())
+    print(f"   ✓ {n:,} puntos en {segundos:.2f} s → {n / segundos if segundos else 0:,.0f} puntos/s "
+          f"(índice: {segundos_indice:.2f} s)")
+    print(f"     dentro: {int(dentro.sum()):,} | cercanos: {cercanos:,} | "
+          f"sin corregimiento: {int((ids < 0).sum()):,}")
+
+
+def localizar_tabla(entrada: str, salida: str = None, db_path: str = DB_PATH,
+                    geo_path: str = GEOPARQUET_PATH, lon: str = None, lat: str = None,
+                    crs: str = "EPSG:4326", max_distancia: float = None, lote: int = LOTE) -> str:
+    """Localiza los puntos de una tabla o archivo y escribe la tabla salida; retorna su nombre"""
+    import pyarrow as pa
+
+    if salida is None:
+        base = os.path.splitext(os.path.basename(entrada))[0] if os.path.exists(entrada) else entrada
+        salida = f"{base}_corr"
+
+    localizador = Localizador(geo_path, crs)
+    conn = duckdb.connect(db_path)
+    try:
+        fuente, parametros = _fuente_sql(entrada)
+        print(f"📥 Puntos desde {entrada}...")
+        # Copia numerada: las coordenadas se leen y el resultado se une por _fila
+        conn.execute(
+            f"CREATE OR REPLACE TEMP TABLE _puntos AS "
+            f"SELECT row_number() OVER () - 1 AS _fila, * FROM {fuente}",
+            parametros,
+        )
+        columnas = [d[0] for d in conn.execute("SELECT * FROM _puntos LIMIT 0").description
+                    if d[0] != "_fila"]
+        col_lon = _columna(columnas, lon, COLUMNAS_LON, "lon")
+        col_lat = _columna(columnas, lat, COLUMNAS_LAT, "lat")
+        coordenadas = conn.execute(
+            f'SELECT TRY_CAST("{col_lon}" AS DOUBLE) AS x, TRY_CAST("{col_lat}" AS DOUBLE) AS y '
+            f"FROM _puntos ORDER BY _fila"
+        ).fetchnumpy()
+        x = np.asarray(coordenadas["x"], dtype=float)
+        y = np.asarray(coordenadas["y"], dtype=float)
+        print(f"📍 Localizando {len(x):,} puntos ({col_lon}, {col_lat} en {crs}) "
+              f"en lotes de {lote:,}...")
+
+        ids, distancia, dentro, segundos = localizar_lotes(localizador, x, y, max_distancia, lote)
+        _reporte(len(x), ids, dentro, segundos, localizador.segundos_indice)
+
+        asignado = ids >= 0
+        resultado = pa.table({
+            "_fila": pa.array(np.arange(len(x), dtype="int64")),
+            "id_corr": pa.array(ids, mask=~asignado),
+            "metodo": pa.array(np.where(dentro, "dentro", "cercano"), mask=~asignado),
+            "distancia_m": pa.array(np.round(distancia, 1), mask=~asignado),
+        })
+        conn.register("_resultado", resultado)
+        reemplazadas = [c for c in ("id_corr", "metodo", "distancia_m") if c in columnas]
+        excluir = ", ".join(["_fila"] + [f'"{c}"' for c in reemplazadas])
+        conn.execute(
+            f'CREATE OR REPLACE TABLE "{salida}" AS '
+            f"SELECT p.* EXCLUDE ({excluir}), r.id_corr, r.metodo, r.distancia_m "
+            f"FROM _puntos p JOIN _resultado r USING (_fila) ORDER BY _fila"
+        )
+        conn.unregister("_resultado")
+        print(f"💾 Tabla {salida} en {db_path} ({len(x):,} filas)")
+    finally:
+        conn.close()
+    return salida
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Asigna id_corr a puntos en lote (STRtree + consultas vectoriales)"
+    )
+    parser.add_argument("entrada", nargs="?",
+                        help="Tabla de la base (p. ej. cat_lugares) o archivo CSV/Parquet")
+    parser.add_argument("--salida", help="Tabla de resultado (default: <entrada>_corr)")
+    parser.add_argument("--lon", help="Columna de longitud / X (default: se detecta)")
+    parser.add_argument("--lat", help="Columna de latitud / Y (default: se detecta)")
+    parser.add_argument("--crs", default="EPSG:4326",
+                        help="CRS de las coordenadas (default: EPSG:4326)")
+    parser.add_argument("--max-distancia", type=float, default=None, metavar="METROS",
+                        help="Asignar los puntos fuera de todo corregimiento al más cercano "
+                             "a menos de esta distancia (costa, islas)")
+    parser.add_argument("--lote", type=int, default=LOTE,
+                        help=f"Puntos por consulta al índice (default: {LOTE:,})")
+    parser.add_argument("--duckdb", default=DB_PATH, help=f"Base DuckDB (default: {DB_PATH})")
+    parser.add_argument("--geo", default=GEOPARQUET_PATH,
+                        help=f"GeoParquet de corregimientos (default: {GEOPARQUET_PATH})")
+    parser.add_argument("--aleatorios", type=int, metavar="N",
+                        help="Medir con N puntos al azar en la extensión del país (no escribe)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.geo):
+        print(f"❌ No se encontró: {args.geo}")
+        sys.exit(1)
+
+    if args.aleatorios:
+        localizador = Localizador(args.geo, "EPSG:4326")
+        from pyproj import Transformer
+
+        oeste, sur, este, norte = shapely.total_bounds(localizador.arbol.geometries)
+        a_wgs84 = Transformer.from_crs(localizador.crs, "EPSG:4326", always_xy=True)
+        generador = np.random.default_rng(0)
+        x, y = a_wgs84.transform(generador.uniform(oeste, este, args.aleatorios),
+                                 generador.uniform(sur, norte, args.aleatorios))
+        print(f"📍 Localizando {args.aleatorios:,} puntos al azar en lotes de {args.lote:,}...")
+        ids, _, dentro, segundos = localizar_lotes(localizador, x, y, args.max_distancia, args.lote)
+        _reporte(args.aleatorios, ids, dentro, segundos, localizador.segundos_indice)
+        return
+
+    if not args.entrada:
+        parser.error("indicar la entrada (tabla o archivo) o --aleatorios N")
+    try:
+        localizar_tabla(args.entrada, args.salida, args.duckdb, args.geo, args.lon, args.lat,
+                        args.crs, args.max_distancia, args.lote)
+    except (ValueError, duckdb.Error) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+Pipeline incremental de todas las salidas del proyecto
+
+Modela fuentes (zip del censo con los .sav, planilla.csv, Excel del mapa de
+pobreza, shapefile de corregimientos), tablas derivadas, la geometría
+preparada, el Excel de análisis y los mapas como un grafo de dependencias. Cada nodo tiene una clave que combina el
+hash de contenido de sus fuentes (incluido su propio script) y las claves
+de los nodos de los que depende; solo se reconstruyen los nodos cuya clave
+cambió o cuyas salidas no existen. Los nodos independientes corren en
+paralelo.
+
+Uso:
+    python pipeline.py                         # Reconstruir lo que esté desactualizado
+    python pipeline.py --dry-run               # Solo mostrar qué se reconstruiría
+    python pipeline.py excel                   # Un nodo (y lo que necesite)
+    python pipeline.py --force cargar_planilla # Forzar un nodo (y sus dependientes)
+    python pipeline.py --mapa-pobreza mapa_pobreza_mef.xlsx --jobs 4
+
+Estado y logs:
+    .pipeline/estado.json            claves de la última construcción exitosa
+    .pipeline/logs/<nodo>.log        salida de cada comando
+    logs/PIPELINE_YYYYMMDD_HHMM.md   registro de la corrida con tiempos
+
+La base DuckDB no se hashea (la modifican varios nodos): su vigencia se
+sigue por las claves de crear_db y cargar_planilla. Lo mismo con lo que
+escribe preparar_geo (GeoParquet, distritos/provincias y vecinos): los mapas
+lo siguen por la clave de ese nodo. Sin el shapefile, preparar_geo trabaja
+sobre el GeoParquet existente; si se reemplaza a mano, forzarlo con
+--force preparar_geo.
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+
+BASE_DIR = Path(__file__).parent
+ESTADO_DIR = BASE_DIR / ".pipeline"
+ESTADO_PATH = ESTADO_DIR / "estado.json"
+LOGS_DIR = BASE_DIR / "logs"
+
+DB_PATH = "censo_2023.duckdb"
+GEOPARQUET_PATH = "data/geo/corregimientos.parquet"
+
+METRICAS_MAPAS = ["cobertura", "gap", "pobreza_general", "pobreza_extrema", "cobertura_menores", "hotspots"]
+
+# Shapefile de división política del que preparar_geo.py arma el GeoParquet
+SHAPEFILE_PATH = "data/geo/Corregimientos_2023_FIXED.shp"
+SHAPEFILE_PATTERN = "data/geo/Corregimientos_2023_FIXED.*"
+
+# Lo que escribe preparar_geo.py: GeoParquet con niveles de detalle, niveles
+# agregados del drill-down y grafos de vecinos (métrica hotspots)
+GEO_SALIDAS = [GEOPARQUET_PATH, "data/geo/distritos.parquet", "data/geo/provincias.parquet",
+               "data/geo/vecinos_queen.npz", "data/geo/vecinos_rook.npz"]
+
+# Tamaño de bloque para hashear archivos grandes
+_BLOQUE = 1024 * 1024
+
+
+@dataclass
+class Nodo:
+    """Paso del pipeline: un comando con sus fuentes, dependencias y salidas"""
+    nombre: str
+    comando: list
+    fuentes: list = field(default_factory=list)   # rutas o patrones glob
+    depende: list = field(default_factory=list)   # nombres de otros nodos
+    salidas: list = field(default_factory=list)
+    requiere: list = field(default_factory=list)  # al menos uno debe existir
+    timeout: float = None
+
+    def tiene_fuentes(self) -> bool:
+        return not self.requiere or any(glob.glob(p) for p in self.requiere)
+
+
+def definir_nodos(mapa_pobreza: str = None, mapas_dir: str = "mapas") -> dict:
+    """Grafo de nodos del proyecto"""
+    py = sys.executable
+    crear_db = [py, "crear_db.py"]
+    if mapa_pobreza:
+        crear_db += ["--mapa-pobreza", mapa_pobreza]
+
+    # Con el shapefile, preparar_geo.py rearma el GeoParquet desde él y la
+    # base; sin él, prepara en su lugar el GeoParquet existente
+    desde_shapefile = os.path.exists(SHAPEFILE_PATH)
+    preparar_geo = [py, "preparar_geo.py"]
+    if desde_shapefile:
+        preparar_geo += ["--shapefile", SHAPEFILE_PATH]
+
+    nodos = [
+        Nodo("crear_db", crear_db,
+             fuentes=["crear_db.py", "censo_2023.zip", "censo_2023_split.z*"]
+                     + ([mapa_pobreza] if mapa_pobreza else []),
+             salidas=[DB_PATH],
+             requiere=["censo_2023.zip", "censo_2023_split.z*"]),
+        Nodo("cargar_planilla", [py, "cargar_planilla.py"],
+             fuentes=["cargar_planilla.py", "planilla.csv"],
+             depende=["crear_db"],
+             salidas=[DB_PATH],
+             requiere=["planilla.csv"]),
+        Nodo("excel", [py, "generar_excel_simple.py", "--output", "analisis_brecha_pobreza.xlsx"],
+             fuentes=["generar_excel_simple.py", "excel_streaming.py", "compat_duckdb.py"],
+             depende=["cargar_planilla"],
+             salidas=["analisis_brecha_pobreza.xlsx"]),
+        Nodo("preparar_geo", preparar_geo,
+             fuentes=["preparar_geo.py", SHAPEFILE_PATTERN],
+             depende=["cargar_planilla"] if desde_shapefile else [],
+             salidas=GEO_SALIDAS,
+             requiere=[SHAPEFILE_PATH, GEOPARQUET_PATH]),
+        # Una sola carga de datos para todos los mapas (generar_mapas.py)
+        Nodo("mapas",
+             [py, "generar_mapas.py", "--output-dir", mapas_dir, "--no-timestamp", "--include-combined"],
+             fuentes=["generar_mapas.py", "choropleth_cobertura.py", "topologia.py", "clasificacion.py",
+                      "preparar_geo.py", "recursos_web.py", "detalle_corregimientos.py",
+                      "autocorrelacion.py", "compat_duckdb.py"],
+             depende=["cargar_planilla", "preparar_geo"],
+             salidas=[os.path.join(mapas_dir, f"mapa_{metrica}.html")
+                      for metrica in METRICAS_MAPAS + ["combinado"]],
+             timeout=1800),
+    ]
+    return {n.nombre: n for n in nodos}
+
+
+def orden_topologico(nodos: dict) -> list:
+    """Nombres de nodos con cada dependencia antes que sus dependientes"""
+    orden, visitados, en_curso = [], set(), set()
+
+    def visitar(nombre):
+        if nombre in visitados:
+            return
+        if nombre in en_curso:
+            raise ValueError(f"Ciclo de dependencias en {nombre}")
+        en_curso.add(nombre)
+        for dep in nodos[nombre].depende:
+            visitar(dep)
+        en_curso.discard(nombre)
+        visitados.add(nombre)
+        orden.append(nombre)
+
+    for nombre in nodos:
+        visitar(nombre)
+    return orden
+
+
+class HashArchivos:
+    """SHA-256 de archivos, cacheado por (tamaño, mtime) entre corridas"""
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def archivo(self, ruta: str) -> str:
+        st = os.stat(ruta)
+        firma = [st.st_size, st.st_mtime_ns]
+        previo = self.cache.get(ruta)
+        if previo and previo["firma"] == firma:
+            return previo["sha256"]
+        h = hashlib.sha256()
+        with open(ruta, "rb") as f:
+            while bloque := f.read(_BLOQUE):
+                h.update(bloque)
+        self.cache[ruta] = {"firma": firma, "sha256": h.hexdigest()}
+        return h.hexdigest()
+
+    def fuentes(self, patrones) -> dict:
+        """{ruta: hash} de las fuentes que existen (los patrones se expanden)"""
+        hashes = {}
+        for patron in patrones:
+            for ruta in sorted(glob.glob(patron)) if glob.has_magic(patron) else [patron]:
+                if os.path.isfile(ruta):
+                    hashes[ruta] = self.archivo(ruta)
+        return hashes
+
+
+def calcular_claves(nodos: dict, orden: list, hasher: HashArchivos) -> dict:
+    """Clave de cada nodo: comando + hashes de fuentes + claves de dependencias"""
+    claves = {}
+    for nombre in orden:
+        nodo = nodos[nombre]
+        contenido = {
+            "comando": [os.path.basename(c) if c == sys.executable else c for c in nodo.comando],
+            "fuentes": hasher.fuentes(nodo.fuentes),
+            "depende": {dep: claves[dep] for dep in nodo.depende},
+        }
+        texto = json.dumps(contenido, sort_keys=True)
+        claves[nombre] = hashlib.sha256(texto.encode()).hexdigest()
+    return claves
+
+
+def motivo_reconstruir(nodo: Nodo, clave: str, estado: dict, forzados: set, sucios: set):
+    """Motivo por el que el nodo está desactualizado, o None si está al día"""
+    if nodo.nombre in forzados:
+        return "forzado"
+    if any(dep in sucios for dep in nodo.depende):
+        return "dependencia reconstruida"
+    faltantes = [s for s in nodo.salidas if not os.path.exists(s)]
+    if not nodo.tiene_fuentes():
+        # Sin los archivos de origen (p.ej. el zip del censo ya no está) se
+        # conserva la salida existente en lugar de fallar
+        return f"faltan fuentes ({', '.join(nodo.requiere)})" if faltantes else None
+    if faltantes:
+        return f"falta {faltantes[0]}"
+    previa = estado.get(nodo.nombre)
+    if previa is None:
+        return "sin construcción previa"
+    if previa["clave"] != clave:
+        return "cambiaron las fuentes"
+    return None
+
+
+def ejecutar_nodo(nodo: Nodo) -> tuple:
+    """Corre el comando del nodo; retorna (ok, segundos)"""
+    ESTADO_DIR.joinpath("logs").mkdir(parents=True, exist_ok=True)
+    for salida in nodo.salidas:
+        directorio = os.path.dirname(salida)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+    inicio = time.perf_counter()
+    with open(ESTADO_DIR / "logs" / f"{nodo.nombre}.log", "w", encoding="utf-8") as log:
+        log.write(f"$ {' '.join(nodo.comando)}\n\n")
+        log.flush()
+        try:
+            result = subprocess.run(nodo.comando, stdout=log, stderr=subprocess.STDOUT,
+                                    timeout=nodo.timeout)
+            ok = result.returncode == 0
+        except subprocess.TimeoutExpired:
+            log.write(f"\n❌ Tiempo agotado ({nodo.timeout:.0f} s)\n")
+            ok = False
+    return ok, time.perf_counter() - inicio
+
+
+def requeridos(nodos: dict, objetivos: list) -> set:
+    """Objetivos y todas sus dependencias"""
+    pendientes, vistos = list(objetivos), set()
+    while pendientes:
+        nombre = pendientes.pop()
+        if nombre not in vistos:
+            vistos.add(nombre)
+            pendientes.extend(nodos[nombre].depende)
+    return vistos
+
+
+def cargar_estado() -> dict:
+    if ESTADO_PATH.exists():
+        with open(ESTADO_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    return {"nodos": {}, "hashes": {}}
+
+
+def guardar_estado(estado: dict):
+    ESTADO_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = ESTADO_PATH.with_suffix(".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(estado, f, indent=2, sort_keys=True)
+    os.replace(tmp, ESTADO_PATH)
+
+
+def escribir_registro(resultados: list, inicio: datetime, segundos: float) -> Path:
+    """Registro markdown de la corrida (reemplaza los UPDATE_LOG manuales)"""
+    LOGS_DIR.mkdir(exist_ok=True)
+    path = LOGS_DIR / f"PIPELINE_{inicio.strftime('%Y%m%d_%H%M')}.md"
+    lineas = [
+        f"# Corrida del pipeline - {inicio.strftime('%Y-%m-%d %H:%M')}",
+        "",
+        f"- **Duración total**: {segundos:.1f} s",
+        f"- **Reconstruidos**: {sum(r['estado'] == 'reconstruido' for r in resultados)}",
+        f"- **Al día**: {sum(r['estado'] == 'al día' for r in resultados)}",
+        f"- **Fallidos**: {sum(r['estado'] == 'falló' for r in resultados)}",
+        "",
+        "| Nodo | Estado | Motivo | Tiempo | Salidas |",
+        "|------|--------|--------|--------|---------|",
+    ]
+    for r in resultados:
+        tiempo = f"{r['segundos']:.1f} s" if r["segundos"] is not None else "-"
+        salidas = ", ".join(
+            f"`{s}` ({os.path.getsize(s) / 1024 / 1024:.1f} MB)" if os.path.exists(s) else f"`{s}`"
+            for s in r["salidas"]
+        )
+        lineas.append(f"| {r['nodo']} | {r['estado']} | {r['motivo'] or '-'} | {tiempo} | {salidas} |")
+    path.write_text("\n".join(lineas) + "\n", encoding="utf-8")
+    return path
+
+
+def correr(nodos: dict, objetivos: list, forzados: set, jobs: int, dry_run: bool) -> bool:
+    """Reconstruye los nodos desactualizados; retorna True si no hubo fallos"""
+    inicio_fecha = datetime.now()
+    inicio = time.perf_counter()
+    estado = cargar_estado()
+    orden = orden_topologico(nodos)
+    incluidos = requeridos(nodos, objetivos or list(nodos))
+    orden = [n for n in orden if n in incluidos]
+
+    hasher = HashArchivos(estado["hashes"])
+    claves = calcular_claves(nodos, orden, hasher)
+
+    sucios, motivos = set(), {}
+    for nombre in orden:
+        motivo = motivo_reconstruir(nodos[nombre], claves[nombre], estado["nodos"], forzados, sucios)
+        if motivo:
+            sucios.add(nombre)
+            motivos[nombre] = motivo
+
+    print(f"🔎 {len(sucios)} de {len(orden)} nodos por reconstruir")
+    for nombre in orden:
+        marca = "🔨" if nombre in sucios else "✓ "
+        detalle = motivos.get(nombre, "al día")
+        if nombre not in sucios and not nodos[nombre].tiene_fuentes():
+            detalle = "al día (sin fuentes: se conserva la salida)"
+        print(f"  {marca} {nombre:24} {detalle}")
+    if dry_run or not sucios:
+        guardar_estado(estado)
+        return True
+
+    resultados = {n: {"nodo": n, "estado": "al día", "motivo": None, "segundos": None,
+                      "salidas": nodos[n].salidas} for n in orden}
+    pendientes = [n for n in orden if n in sucios]
+    hechos = {n for n in orden if n not in sucios}
+    fallidos = set()
+    en_curso = {}
+
+    print(f"\n🚀 Ejecutando con {jobs} trabajos en paralelo...")
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        while pendientes or en_curso:
+            for nombre in list(pendientes):
+                deps = nodos[nombre].depende
+                if any(d in fallidos for d in deps):
+                    pendientes.remove(nombre)
+                    fallidos.add(nombre)
+                    resultados[nombre].update(estado="omitido", motivo="falló una dependencia")
+                    print(f"  ⏭️  {nombre}: omitido (falló una dependencia)")
+                elif all(d in hechos for d in deps):
+                    pendientes.remove(nombre)
+                    en_curso[pool.submit(ejecutar_nodo, nodos[nombre])] = nombre
+                    print(f"  ▶️  {nombre}")
+            if not en_curso:
+                continue
+            listos, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in listos:
+                nombre = en_curso.pop(futuro)
+                ok, segundos = futuro.result()
+                resultados[nombre].update(segundos=segundos, motivo=motivos[nombre])
+                if ok:
+                    hechos.add(nombre)
+                    resultados[nombre]["estado"] = "reconstruido"
+                    estado["nodos"][nombre] = {
+                        "clave": claves[nombre],
+                        "fecha": datetime.now().isoformat(timespec="seconds"),
+                        "segundos": round(segundos, 2),
+                    }
+                    guardar_estado(estado)
+                    print(f"  ✅ {nombre} ({segundos:.1f} s)")
+                else:
+                    fallidos.add(nombre)
+                    resultados[nombre]["estado"] = "falló"
+                    print(f"  ❌ {nombre} ({segundos:.1f} s) → ver .pipeline/logs/{nombre}.log")
+
+    guardar_estado(estado)
+    total = time.perf_counter() - inicio
+    registro = escribir_registro([resultados[n] for n in orden], inicio_fecha, total)
+    print(f"\n⏱️ Tiempo total: {total:.1f} s")
+    print(f"📝 Registro: {registro}")
+    return not fallidos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline incremental de reportes y mapas")
+    parser.add_argument("objetivos", nargs="*",
+                        help="Nodos a construir (default: todos)")
+    parser.add_argument("--force", nargs="*", metavar="NODO",
+                        help="Reconstruir aunque estén al día (sin nombres: todos)")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Mostrar qué se reconstruiría sin ejecutar")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+                        help="Nodos en paralelo (default: núcleos disponibles)")
+    parser.add_argument("--mapa-pobreza", "-m", metavar="FILE",
+                        help="Excel del mapa de pobreza del MEF (para crear_db)")
+    parser.add_argument("--mapas-dir", default="mapas",
+                        help="Directorio de los mapas (default: mapas)")
+    parser.add_argument("--listar", action="store_true", help="Listar los nodos y salir")
+    args = parser.parse_args()
+
+    os.chdir(BASE_DIR)
+    nodos = definir_nodos(args.mapa_pobreza, args.mapas_dir)
+
+    if args.listar:
+        for nombre in orden_topologico(nodos):
+            nodo = nodos[nombre]
+            deps = f" ← {', '.join(nodo.depende)}" if nodo.depende else ""
+            print(f"  {nombre:24} {', '.join(nodo.salidas)}{deps}")
+        return
+
+    desconocidos = [n for n in args.objetivos + (args.force or []) if n not in nodos]
+    if desconocidos:
+        print(f"❌ Nodos desconocidos: {', '.join(desconocidos)} (ver --listar)")
+        sys.exit(1)
+
+    if args.force is None:
+        forzados = set()
+    else:
+        forzados = set(args.force or nodos)
+
+    if not correr(nodos, args.objetivos, forzados, max(1, args.jobs), args.dry_run):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
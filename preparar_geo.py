@@ -0,0 +1,482 @@
+#!/usr/bin/env python3
+"""
+Prepara la geometría de corregimientos para los mapas
+
+Precalcula versiones simplificadas de los polígonos a varias tolerancias y
+las guarda en el mismo GeoParquet, junto a la geometría completa:
+
+    geometry     geometría original (sin cambios)
+    geom_alto    tolerancia  10 m, coordenadas en grilla de  1 m
+    geom_medio   tolerancia  50 m, coordenadas en grilla de  5 m
+    geom_bajo    tolerancia 250 m, coordenadas en grilla de 10 m
+
+Y lo que los mapas necesitan en WGS84, para no reproyectar en cada corrida:
+
+    wgs84_<nivel>            cada geometría (completo, alto, medio, bajo) en EPSG:4326
+    punto_lon, punto_lat     punto representativo: centroide calculado en metros
+                             (o un punto interior si el centroide cae afuera)
+    bbox_oeste ... bbox_norte  extensión de cada corregimiento en WGS84
+
+Además escribe, en el mismo directorio, los niveles agregados para los mapas
+con drill-down (choropleth_cobertura.py --drilldown):
+
+    distritos.parquet    corregimientos unidos por distrito (desde geom_medio)
+    provincias.parquet   corregimientos unidos por provincia (desde geom_bajo)
+
+con id (id_corr // 100 o // 10000), nombres y geometría en WGS84.
+
+Y el grafo de contigüidad entre corregimientos (para autocorrelacion.py),
+como matriz dispersa CSR en el formato de scipy.sparse.save_npz:
+
+    vecinos_queen.npz    vecinos que comparten al menos un punto del borde
+    vecinos_rook.npz     vecinos que comparten un tramo de borde
+
+con ids (id_corr en el orden de las filas) y la huella de la geometría.
+
+La huella (sha256) de la geometría original se guarda en los metadatos de
+los tres Parquet; si la geometría cambia, los mapas ignoran todo lo
+derivado hasta volver a ejecutar este script.
+
+La simplificación es de cobertura (shapely.coverage_simplify): cada borde
+compartido entre dos corregimientos se simplifica una sola vez, así que los
+vecinos siguen encajando sin huecos ni solapes. Luego las coordenadas se
+llevan a una grilla (shapely.set_precision), lo que deja números cortos en
+el GeoJSON de los mapas.
+
+Con --shapefile el GeoParquet se arma primero desde el shapefile de división
+política (data/geo/Corregimientos_2023_FIXED.shp): geometría, códigos y
+nombres, más población y pobreza (mapa_pobreza) y beneficiarios (planilla)
+de la base DuckDB, con gap y cobertura_pct. Es lo que corre pipeline.py
+cuando el shapefile está disponible.
+
+Uso:
+    python preparar_geo.py                         # data/geo/corregimientos.parquet
+    python preparar_geo.py --input otro.parquet
+    python preparar_geo.py --shapefile             # rearmarlo desde el shapefile
+    python preparar_geo.py --dry-run               # solo reportar vértices y vecinos
+
+Después:
+    python choropleth_cobertura.py --detail medio
+
+Requisitos:
+    pip install geopandas "shapely>=2.1"
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+GEOPARQUET_PATH = "data/geo/corregimientos.parquet"
+SHAPEFILE_PATH = "data/geo/Corregimientos_2023_FIXED.shp"
+DB_PATH = "censo_2023.duckdb"
+
+# Columnas del shapefile → columnas del GeoParquet (id_corr_in es id_corr_int
+# truncado a los 10 caracteres de DBF)
+COLUMNAS_SHAPEFILE = {
+    "id_corr_in": "id_corr_int",
+    "CODE": "id_corr_str",
+    "PROVINCIA": "provincia_nombre",
+    "DISTRITO": "distrito_nombre",
+    "CORR_NOMB": "corregimiento_nombre",
+}
+
+# Población y pobreza del mapa de pobreza y beneficiarios de la planilla,
+# por corregimiento
+ATRIBUTOS_SQL = """
+    WITH beneficiarios AS (
+        SELECT id_correg, COUNT(DISTINCT cedula) AS beneficiarios_total
+        FROM planilla
+        GROUP BY id_correg
+    )
+    SELECT
+        (m.codigo_provincia * 10000 + m.codigo_distrito * 100
+         + m.codigo_corregimiento)::BIGINT AS id_corr_int,
+        m.provincia,
+        m.distrito,
+        m.corregimiento,
+        m.codigo_provincia,
+        m.codigo_distrito,
+        m.codigo_corregimiento,
+        m.total_personas,
+        m.pct_pobreza_general_personas,
+        m.pct_pobreza_extrema_personas,
+        b.beneficiarios_total
+    FROM mapa_pobreza m
+    LEFT JOIN beneficiarios b
+        ON b.id_correg = m.codigo_provincia * 10000 + m.codigo_distrito * 100 + m.codigo_corregimiento
+"""
+
+# CRS proyectado (metros) en el que se expresan tolerancias y grillas
+CRS_METRICO = 32617
+
+# nivel: (tolerancia en metros, tamaño de grilla en metros)
+NIVELES = {
+    "alto": (10, 1),
+    "medio": (50, 5),
+    "bajo": (250, 10),
+}
+
+# Clave de los metadatos del Parquet con la huella de la geometría original
+CLAVE_METADATOS = b"preparar_geo"
+
+# Niveles agregados: nombre → (divisor de id_corr, nivel de simplificación de
+# origen). id_corr = provincia * 10000 + distrito * 100 + corregimiento
+AGREGADOS = {
+    "distritos": (100, "medio"),
+    "provincias": (10000, "bajo"),
+}
+
+# Contigüidad: tipos de grafo, nivel del que se calcula (la simplificación de
+# cobertura mantiene los bordes comunes), distancia en metros hasta la que
+# dos corregimientos se consideran vecinos (absorbe diferencias mínimas
+# entre bordes) y largo mínimo del borde común para rook
+CONTIGUIDADES = ["queen", "rook"]
+NIVEL_VECINOS = "alto"
+TOLERANCIA_VECINOS = 1.0
+BORDE_MINIMO_ROOK = 5.0
+
+# Columnas de punto representativo y extensión (WGS84)
+COLUMNAS_PUNTO = ["punto_lon", "punto_lat"]
+COLUMNAS_BBOX = ["bbox_oeste", "bbox_sur", "bbox_este", "bbox_norte"]
+
+
+def columna_nivel(nivel: str) -> str:
+    """Nombre de la columna de geometría de un nivel de detalle"""
+    return f"geom_{nivel}"
+
+
+def columna_wgs84(nivel: str) -> str:
+    """Nombre de la columna de geometría WGS84 de un nivel ("completo" incluido)"""
+    return f"wgs84_{nivel}"
+
+
+def columnas_derivadas() -> list:
+    """Todas las columnas que escribe preparar()"""
+    return ([columna_nivel(n) for n in NIVELES]
+            + [columna_wgs84(n) for n in ["completo", *NIVELES]]
+            + COLUMNAS_PUNTO + COLUMNAS_BBOX)
+
+
+def huella(tabla) -> str:
+    """sha256 de la columna geometry (WKB) tal como está guardada en el Parquet"""
+    h = hashlib.sha256()
+    for valor in tabla.column("geometry").to_pylist():
+        h.update(valor if isinstance(valor, bytes) else repr(valor).encode())
+    return h.hexdigest()
+
+
+def huella_archivo(path: str) -> str:
+    """Huella de la geometría original de un GeoParquet (sin decodificarla)"""
+    import pyarrow.parquet as pq
+
+    return huella(pq.read_table(path, columns=["geometry"]))
+
+
+def metadatos_vigentes(path: str, huella_actual: str) -> bool:
+    """True si lo que preparar() escribió en path corresponde a la geometría actual"""
+    import pyarrow.parquet as pq
+
+    if not os.path.exists(path):
+        return False
+    metadatos = (pq.read_schema(path).metadata or {}).get(CLAVE_METADATOS)
+    if metadatos is None:
+        return False
+    guardado = json.loads(metadatos)
+    return guardado.get("huella") == huella_actual and guardado.get("niveles") == {
+        n: list(v) for n, v in NIVELES.items()
+    }
+
+
+def ruta_agregado(path: str, nombre: str) -> str:
+    """GeoParquet de un nivel agregado, junto al de corregimientos"""
+    return os.path.join(os.path.dirname(path), f"{nombre}.parquet")
+
+
+def ruta_vecinos(path: str, contiguidad: str) -> str:
+    """Grafo de contigüidad (queen o rook), junto al GeoParquet de corregimientos"""
+    return os.path.join(os.path.dirname(path), f"vecinos_{contiguidad}.npz")
+
+
+def matriz_csr(n: int, filas, columnas):
+    """(indptr, indices) de una matriz n × n con unos en (filas, columnas)"""
+    filas = np.asarray(filas, dtype="int64")
+    columnas = np.asarray(columnas, dtype="int64")
+    orden = np.lexsort((columnas, filas))
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(filas, minlength=n))])
+    return indptr.astype("int64"), columnas[orden]
+
+
+def contiguidad(geoms) -> dict:
+    """{"queen": (i, j), "rook": (i, j)}: pares de vecinos con i < j
+
+    geoms en un CRS métrico. Queen: a menos de TOLERANCIA_VECINOS metros;
+    rook: además comparten más de BORDE_MINIMO_ROOK metros de borde. Todo
+    vectorial sobre los pares candidatos del STRtree.
+    """
+    import shapely
+
+    arbol = shapely.STRtree(geoms)
+    i, j = arbol.query(geoms, predicate="dwithin", distance=TOLERANCIA_VECINOS)
+    i, j = i[i < j], j[i < j]
+    franjas = shapely.buffer(shapely.boundary(geoms), TOLERANCIA_VECINOS, quad_segs=2)
+    compartido = shapely.length(shapely.intersection(shapely.boundary(geoms[i]), franjas[j]))
+    rook = compartido > BORDE_MINIMO_ROOK
+    return {"queen": (i, j), "rook": (i[rook], j[rook])}
+
+
+def escribir_vecinos(path: str, ids, pares: dict, huella_fuente: str):
+    """Guarda cada grafo (simétrico) como CSR, legible con scipy.sparse.load_npz"""
+    n = len(ids)
+    for nombre, (i, j) in pares.items():
+        indptr, indices = matriz_csr(n, np.concatenate([i, j]), np.concatenate([j, i]))
+        destino = ruta_vecinos(path, nombre)
+        tmp = f"{destino}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez_compressed(
+                f, indptr=indptr, indices=indices, data=np.ones(len(indices), dtype="int8"),
+                format=np.array(b"csr"), shape=np.array([n, n]),
+                ids=np.asarray(ids, dtype="int64"), huella=np.array(huella_fuente),
+            )
+        os.replace(tmp, destino)
+        print(f"💾 Guardado: {destino} ({len(i):,} pares de vecinos)")
+
+
+def disolver(gdf, geoms, divisor: int, cobertura_valida: bool):
+    """Une los corregimientos de cada distrito/provincia (id_corr // divisor).
+
+    Con una cobertura válida basta coverage_union_all (solo descarta los
+    bordes internos); si no, se usa la unión general.
+    """
+    import shapely
+
+    union = shapely.coverage_union_all if cobertura_valida else shapely.union_all
+    claves = (gdf["id_corr_int"].to_numpy() // divisor).astype("int64")
+    orden = np.argsort(claves, kind="stable")
+    unicas, inicios = np.unique(claves[orden], return_index=True)
+    grupos = np.split(orden, inicios[1:])
+    return unicas, [union(geoms[g]) for g in grupos], grupos
+
+def puntos_representativos(geoms):
+    """Centroide de cada polígono, o un punto interior si el centroide cae fuera.
+
+    geoms debe estar en un CRS métrico: el centroide en grados no es el
+    centro geométrico real.
+    """
+    import shapely
+
+    centroides = shapely.centroid(geoms)
+    afuera = ~shapely.contains(geoms, centroides)
+    centroides[afuera] = shapely.point_on_surface(geoms[afuera])
+    return centroides
+
+
+def simplificar(geoms, tolerancia: float, grilla: float):
+    """Simplificación de cobertura + cuantización de coordenadas.
+
+    Los vértices compartidos son idénticos en ambos polígonos antes y después
+    de la grilla, así que los bordes comunes siguen coincidiendo.
+    """
+    import shapely
+
+    simplificadas = shapely.coverage_simplify(geoms, tolerancia, simplify_boundary=True)
+    return shapely.set_precision(simplificadas, grilla)
+
+
+def desde_shapefile(shapefile: str, db_path: str = DB_PATH):
+    """Corregimientos del shapefile con los atributos de la base (columnas del GeoParquet)"""
+    import duckdb
+    import geopandas as gpd
+
+    print(f"📥 Cargando {shapefile}...")
+    gdf = gpd.read_file(shapefile)
+    if "id_corr_in" not in gdf.columns:
+        gdf["id_corr_in"] = gdf["CODE"].astype("int64")
+    gdf = gdf[[*COLUMNAS_SHAPEFILE, "geometry"]].rename(columns=COLUMNAS_SHAPEFILE)
+    gdf["id_corr_int"] = gdf["id_corr_int"].astype("int64")
+    metrico = gdf.geometry if gdf.crs and not gdf.crs.is_geographic else gdf.geometry.to_crs(CRS_METRICO)
+    gdf.insert(5, "area_hectareas", (metrico.area / 10_000).round(2))
+
+    print(f"📥 Atributos de {db_path} (mapa_pobreza y planilla)...")
+    conn = duckdb.connect(db_path, read_only=True)
+    try:
+        atributos = conn.execute(ATRIBUTOS_SQL).df()
+    finally:
+        conn.close()
+    gdf = gdf.merge(atributos, on="id_corr_int", how="left")
+    sin_datos = int(gdf["total_personas"].isna().sum())
+    if sin_datos:
+        print(f"   ⚠️ {sin_datos} corregimientos sin fila en mapa_pobreza")
+
+    # Orden del GeoParquet: atributos, geometría y luego las métricas
+    beneficiarios = gdf.pop("beneficiarios_total").fillna(0).astype("int64")
+    gdf = gdf[[c for c in gdf.columns if c != "geometry"] + ["geometry"]]
+    gdf["pobres_general"] = (gdf["total_personas"] * gdf["pct_pobreza_general_personas"]).round(0)
+    gdf["pobres_extremos"] = (gdf["total_personas"] * gdf["pct_pobreza_extrema_personas"]).round(0)
+    gdf["pobres_total"] = gdf["pobres_general"]
+    gdf["beneficiarios_total"] = beneficiarios
+    gdf["gap"] = gdf["pobres_total"] - gdf["beneficiarios_total"]
+    gdf["cobertura_pct"] = (gdf["beneficiarios_total"] / gdf["pobres_total"] * 100).fillna(0).round(2)
+    return gdf
+
+
+def preparar(path: str, dry_run: bool = False, shapefile: str = None, db_path: str = DB_PATH) -> dict:
+    """Agrega (o recalcula) las columnas geom_<nivel> del GeoParquet
+
+    Con shapefile el GeoParquet se reemplaza por el que sale de desde_shapefile().
+    """
+    import geopandas as gpd
+    import shapely
+
+    if shapefile:
+        gdf = desde_shapefile(shapefile, db_path)
+    else:
+        print(f"📥 Cargando {path}...")
+        gdf = gpd.read_parquet(path)
+    gdf = gdf.drop(columns=[c for c in columnas_derivadas() if c in gdf.columns])
+    if gdf.crs is None or gdf.crs.is_geographic:
+        print(f"   ⚠️ CRS {gdf.crs}: se simplifica en EPSG:{CRS_METRICO}")
+    base = gdf.geometry if gdf.crs and not gdf.crs.is_geographic else gdf.geometry.to_crs(CRS_METRICO)
+    geoms = base.values
+
+    invalidas = ~shapely.is_valid(geoms)
+    if invalidas.any():
+        print(f"   🔧 Corrigiendo {invalidas.sum()} geometrías inválidas")
+        geoms = geoms.copy()
+        geoms[invalidas] = shapely.make_valid(geoms[invalidas])
+
+    if not shapely.coverage_is_valid(geoms):
+        print("   ⚠️ La cobertura original tiene solapes o huecos entre vecinos;")
+        print("      los bordes afectados pueden no quedar perfectamente alineados")
+
+    vertices_base = int(shapely.get_num_coordinates(geoms).sum())
+    print(f"   ✓ {len(gdf)} corregimientos, {vertices_base:,} vértices")
+
+    resumen = {"completo": vertices_base}
+    for nivel, (tolerancia, grilla) in NIVELES.items():
+        inicio = time.perf_counter()
+        nivel_geoms = simplificar(geoms, tolerancia, grilla)
+        vertices = int(shapely.get_num_coordinates(nivel_geoms).sum())
+        vacias = int(shapely.is_empty(nivel_geoms).sum())
+        cobertura = "sin huecos ✓" if shapely.coverage_is_valid(nivel_geoms) else "⚠️ con huecos/solapes"
+        print(f"   {nivel:6} tol {tolerancia:>4} m, grilla {grilla:>2} m: {vertices:>10,} vértices "
+              f"({vertices * 100 / vertices_base:5.1f}%), {cobertura}, "
+              f"{time.perf_counter() - inicio:.2f} s")
+        if vacias:
+            print(f"          ⚠️ {vacias} corregimientos colapsaron (se usa la geometría completa)")
+            nivel_geoms[shapely.is_empty(nivel_geoms)] = geoms[shapely.is_empty(nivel_geoms)]
+        nivel_serie = gpd.GeoSeries(nivel_geoms, index=gdf.index, crs=base.crs)
+        gdf[columna_nivel(nivel)] = nivel_serie.to_crs(gdf.crs)
+        gdf[columna_wgs84(nivel)] = nivel_serie.to_crs(4326)
+        resumen[nivel] = vertices
+
+    # Geometría completa, punto representativo y extensión en WGS84
+    inicio = time.perf_counter()
+    completo = gpd.GeoSeries(geoms, index=gdf.index, crs=base.crs).to_crs(4326)
+    gdf[columna_wgs84("completo")] = completo
+    puntos = gpd.GeoSeries(puntos_representativos(geoms), index=gdf.index, crs=base.crs).to_crs(4326)
+    gdf["punto_lon"], gdf["punto_lat"] = puntos.x, puntos.y
+    gdf[COLUMNAS_BBOX] = shapely.bounds(completo.values)
+    print(f"   🌐 WGS84, puntos representativos y extensiones: {time.perf_counter() - inicio:.2f} s")
+
+    # Provincias y distritos disueltos desde los niveles simplificados
+    agregados = {}
+    if "id_corr_int" not in gdf.columns:
+        print("   ⚠️ Sin id_corr_int: no se generan distritos ni provincias")
+    else:
+        for nombre, (divisor, nivel) in AGREGADOS.items():
+            inicio = time.perf_counter()
+            nivel_geoms = gdf[columna_nivel(nivel)].to_crs(base.crs).values
+            claves, uniones, grupos = disolver(gdf, nivel_geoms, divisor,
+                                               shapely.coverage_is_valid(nivel_geoms))
+            primero = [g[0] for g in grupos]
+            columnas = {"id": claves, "n_corregimientos": [len(g) for g in grupos]}
+            for columna, alternativa in [("provincia_nombre", "provincia"), ("distrito_nombre", "distrito")]:
+                if nombre == "provincias" and columna == "distrito_nombre":
+                    continue
+                serie = gdf[columna] if columna in gdf.columns else gdf.get(alternativa)
+                if serie is not None:
+                    columnas[columna] = serie.iloc[primero].to_numpy()
+            agregados[nombre] = gpd.GeoDataFrame(
+                columnas, geometry=gpd.GeoSeries(uniones, crs=base.crs).to_crs(4326).values, crs=4326
+            )
+            vertices = int(shapely.get_num_coordinates(agregados[nombre].geometry.values).sum())
+            print(f"   {nombre:10} {len(claves):>4} desde '{nivel}': {vertices:>8,} vértices, "
+                  f"{time.perf_counter() - inicio:.2f} s")
+
+    # Contigüidad entre corregimientos (desde el nivel simplificado: mismos
+    # bordes comunes, muchos menos vértices)
+    vecinos = None
+    if "id_corr_int" in gdf.columns:
+        inicio = time.perf_counter()
+        vecinos = contiguidad(gdf[columna_nivel(NIVEL_VECINOS)].to_crs(base.crs).values)
+        cardinalidad = np.bincount(np.concatenate(vecinos["queen"]), minlength=len(gdf))
+        print(f"   vecinos   queen {len(vecinos['queen'][0]):>6,} pares, rook "
+              f"{len(vecinos['rook'][0]):>6,} pares (promedio {cardinalidad.mean():.1f}, "
+              f"{int((cardinalidad == 0).sum())} sin vecinos), "
+              f"{time.perf_counter() - inicio:.2f} s")
+
+    if dry_run:
+        return resumen
+
+    # Escritura atómica; los agregados guardan la huella de la geometría de
+    # corregimientos, que es de donde salen
+    escribir(gdf, path, None)
+    huella_fuente = huella_archivo(path)
+    for nombre, agregado in agregados.items():
+        escribir(agregado, ruta_agregado(path, nombre), huella_fuente)
+    if vecinos is not None:
+        escribir_vecinos(path, gdf["id_corr_int"].to_numpy(), vecinos, huella_fuente)
+    return resumen
+
+
+def escribir(gdf, path: str, huella_fuente: str):
+    """Escritura atómica del GeoParquet con la huella de la geometría de origen
+
+    La huella va en los metadatos del esquema, junto a los de GeoParquet.
+    """
+    import pyarrow.parquet as pq
+
+    tmp = f"{path}.tmp"
+    gdf.to_parquet(tmp)
+    tabla = pq.read_table(tmp)
+    metadatos = dict(tabla.schema.metadata or {})
+    metadatos[CLAVE_METADATOS] = json.dumps({
+        "huella": huella_fuente or huella(tabla),
+        "niveles": {n: list(v) for n, v in NIVELES.items()},
+    }).encode()
+    pq.write_table(tabla.replace_schema_metadata(metadatos), tmp)
+    os.replace(tmp, path)
+    print(f"💾 Guardado: {path} ({os.path.getsize(path) / 1024 / 1024:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Precalcula geometrías simplificadas (topología preservada), WGS84, "
+                    "puntos representativos, extensiones y grafo de vecinos"
+    )
+    parser.add_argument("--input", default=GEOPARQUET_PATH,
+                        help=f"GeoParquet de corregimientos (default: {GEOPARQUET_PATH})")
+    parser.add_argument("--shapefile", nargs="?", const=SHAPEFILE_PATH, metavar="SHP",
+                        help="Rearmar el GeoParquet desde el shapefile y la base "
+                             f"(default: {SHAPEFILE_PATH})")
+    parser.add_argument("--db", default=DB_PATH,
+                        help=f"Base DuckDB para --shapefile (default: {DB_PATH})")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Calcular y reportar sin escribir el archivo")
+    args = parser.parse_args()
+
+    for requerido in [args.shapefile, args.db] if args.shapefile else [args.input]:
+        if not os.path.exists(requerido):
+            print(f"❌ No se encontró: {requerido}")
+            sys.exit(1)
+
+    preparar(args.input, dry_run=args.dry_run, shapefile=args.shapefile, db_path=args.db)
+
+
+if __name__ == "__main__":
+    main()
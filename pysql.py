@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-# pip install duckdb sqlalchemy pymssql pyodbc pandas tabulate openpyxl
+# pip install duckdb sqlalchemy pymssql pyodbc tabulate xlsxwriter pyarrow
 """
 PySql - Cliente SQL multi-base de datos
 Soporta: DuckDB, SQL Server (MSSQL)
@@ -7,26 +7,235 @@ Soporta: DuckDB, SQL Server (MSSQL)
 Requisitos:
   - DuckDB: pip install duckdb
   - MSSQL:  pip install sqlalchemy pymssql pyodbc
-  - Común:  pip install pandas tabulate
+  - Común:  pip install tabulate
+  - Excel:  pip install xlsxwriter (o openpyxl)
+  - Transferencia MSSQL → DuckDB: pip install pyarrow
+
+SQLAlchemy, tabulate y el escritor Excel se importan solo cuando el formato
+de salida o el backend los necesita; una consulta DuckDB con salida csv/json/table
+no los carga (ver benchmark_arranque.py).
 """
 
 import argparse
 import sys
 import os
-import pandas as pd
 from typing import Optional
 from urllib.parse import quote_plus
 
+# Filas por lote al transferir resultados entre bases de datos
+BATCH_SIZE = 50000
+
+# Filas por lote al leer resultados para mostrarlos
+FETCH_SIZE = 10000
+
+# Códigos de tipo DB-API de pymssql (pymssql.STRING, BINARY, NUMBER, DATETIME, DECIMAL)
+_PYMSSQL_STRING, _PYMSSQL_BINARY, _PYMSSQL_NUMBER, _PYMSSQL_DATETIME, _PYMSSQL_DECIMAL = 1, 2, 3, 4, 5
+
+
+def _arrow_type(type_code, precision, scale):
+    """Traduce el tipo de una columna del cursor a un tipo Arrow (None si el driver no lo da)"""
+    import datetime
+    import decimal
+    import pyarrow as pa
+
+    if type_code is decimal.Decimal or type_code == _PYMSSQL_DECIMAL:
+        if isinstance(precision, int) and isinstance(scale, int) and 0 < precision <= 38:
+            return pa.decimal128(precision, scale)
+    elif type_code is str or type_code == _PYMSSQL_STRING:
+        return pa.string()
+    elif type_code in (bytes, bytearray) or type_code == _PYMSSQL_BINARY:
+        return pa.binary()
+    elif type_code is bool:
+        return pa.bool_()
+    elif type_code is int:
+        return pa.int64()
+    elif type_code is float:
+        return pa.float64()
+    elif type_code is datetime.datetime or type_code == _PYMSSQL_DATETIME:
+        return pa.timestamp('us')
+    elif type_code is datetime.date:
+        return pa.date32()
+    elif type_code is datetime.time:
+        return pa.time64('us')
+    return None
+
+
+def _arrow_schema(columns, description, rows):
+    """
+    Esquema Arrow de un lote: el tipo del cursor o, si el driver no lo da
+    (p.ej. sqlite, NUMBER de pymssql), el inferido de los valores del lote.
+
+    Una columna sin valores en el lote queda como pa.null(); el esquema del
+    resultado se obtiene unificando los de todos los lotes (_unify_schema).
+    """
+    import pyarrow as pa
+
+    fields = []
+    for i, name in enumerate(columns):
+        desc = description[i] if description and i < len(description) else (None,) * 7
+        tipo = _arrow_type(desc[1], desc[4], desc[5])
+        if tipo is None:
+            tipo = pa.array([r[i] for r in rows]).type
+        fields.append(pa.field(name, tipo))
+    return pa.schema(fields)
+
+
+def _unify_schema(schema, batch_schema):
+    """Esquema que admite ambos lotes (null → tipo real, int → float, decimal más ancho)"""
+    import pyarrow as pa
+
+    if schema is None:
+        return batch_schema
+    return pa.unify_schemas([schema, batch_schema], promote_options="permissive")
+
+
+def _select_batch(schema, name: str) -> str:
+    """SELECT de un lote registrado; las columnas aún sin tipo (solo NULL) como VARCHAR"""
+    import pyarrow as pa
+
+    nulls = [f.name for f in schema if pa.types.is_null(f.type)]
+    if not nulls:
+        return f"SELECT * FROM {name}"
+    replace = ", ".join(f'CAST("{c}" AS VARCHAR) AS "{c}"' for c in nulls)
+    return f"SELECT * REPLACE ({replace}) FROM {name}"
+
+
+def _widen_columns(duck, table: str, previous, schema, select: str):
+    """ALTER de las columnas de la tabla DuckDB cuyo tipo cambió al unificar con el lote"""
+    import pyarrow as pa
+
+    types = {name: tipo for name, tipo, *_ in duck.execute(f"DESCRIBE {select}").fetchall()}
+    for field in schema:
+        if pa.types.is_null(field.type) or previous.field(field.name).type == field.type:
+            continue
+        duck.execute(f'ALTER TABLE {table} ALTER COLUMN "{field.name}" SET DATA TYPE {types[field.name]}')
+        print(f"  · {field.name}: {types[field.name]}", file=sys.stderr)
+
+
+def _json_default(value):
+    """Serializa tipos que json no conoce (Decimal, fechas, bytes)"""
+    import decimal
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return value.hex()
+    return str(value)
+
+
+def _plain_table(columns, rows) -> str:
+    """Tabla de texto simple cuando tabulate no está instalado"""
+    cells = [[str(c) for c in columns]] + [['' if v is None else str(v) for v in r] for r in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns))]
+    return '\n'.join('  '.join(v.rjust(w) for v, w in zip(row, widths)) for row in cells)
+
+
+def write_output(columns, batches, fmt: str):
+    """
+    Muestra un resultado leído por lotes de filas (listas de tuplas).
+
+    csv, json y excel se escriben a medida que llegan los lotes (excel con
+    memoria constante, ver excel_streaming.py); table necesita todas las
+    filas para calcular anchos.
+    """
+    total = 0
+    if fmt == "csv":
+        import csv
+        writer = csv.writer(sys.stdout, lineterminator='\n')
+        for rows in batches:
+            if total == 0:
+                writer.writerow(columns)
+            writer.writerows(rows)
+            total += len(rows)
+    elif fmt == "json":
+        import json
+        for rows in batches:
+            for row in rows:
+                record = json.dumps(dict(zip(columns, row)), indent=2,
+                                    ensure_ascii=False, default=_json_default)
+                sys.stdout.write(('[\n  ' if total == 0 else ',\n  ') + record.replace('\n', '\n  '))
+                total += 1
+        if total:
+            sys.stdout.write('\n]\n')
+    elif fmt == "excel":
+        import itertools
+        import time
+        batches = iter(batches)
+        first = next((b for b in batches if b), None)
+        if first is not None:
+            from excel_streaming import StreamingExcelWriter
+            filename = f"resultado_{time.strftime('%Y%m%d_%H%M%S')}.xlsx"
+            inicio = time.perf_counter()
+            with StreamingExcelWriter(filename) as book:
+                total = book.write_sheet("Resultado", columns, itertools.chain([first], batches))
+            elapsed = time.perf_counter() - inicio
+            print(f"Guardado en: {filename}")
+            print(f"  {total:,} filas en {len(book.sheets)} hoja(s), {elapsed:.1f} s "
+                  f"({total / max(elapsed, 1e-9):,.0f} filas/s, {book.engine})", file=sys.stderr)
+    else:
+        rows = [r for batch in batches for r in batch]
+        total = len(rows)
+        if total:
+            try:
+                from tabulate import tabulate
+                print(tabulate(rows, headers=columns, tablefmt='grid'))
+            except ImportError:
+                print(_plain_table(columns, rows))
+
+    if total == 0:
+        print("(0 filas)")
+        return
+    print(f"\n({total} filas)", file=sys.stderr)
+
+
+# Límite de parámetros por sentencia en SQL Server (2100) y de filas por VALUES (1000)
+_MSSQL_MAX_PARAMS = 2000
+_MSSQL_MAX_VALUES_ROWS = 1000
+
+
+def _sqlalchemy_type(arrow_type, max_length=None):
+    """Traduce un tipo Arrow (resultado DuckDB) a un tipo de columna SQLAlchemy"""
+    import pyarrow as pa
+    from sqlalchemy import types
+
+    if pa.types.is_boolean(arrow_type):
+        return types.Boolean()
+    if pa.types.is_int8(arrow_type) or pa.types.is_int16(arrow_type) or pa.types.is_uint8(arrow_type):
+        return types.SmallInteger()
+    if pa.types.is_int32(arrow_type) or pa.types.is_uint16(arrow_type):
+        return types.Integer()
+    if pa.types.is_integer(arrow_type):
+        return types.BigInteger()
+    if pa.types.is_floating(arrow_type):
+        return types.Float(precision=53)
+    if pa.types.is_decimal(arrow_type):
+        return types.Numeric(arrow_type.precision, arrow_type.scale)
+    if pa.types.is_timestamp(arrow_type):
+        return types.DateTime()
+    if pa.types.is_date(arrow_type):
+        return types.Date()
+    if pa.types.is_time(arrow_type):
+        return types.Time()
+    if pa.types.is_binary(arrow_type) or pa.types.is_large_binary(arrow_type):
+        return types.LargeBinary()
+    # Texto: NVARCHAR(n) cuando se conoce el largo; NVARCHAR(max) degrada fast_executemany
+    if max_length and max_length <= 4000:
+        return types.Unicode(max(int(max_length), 1))
+    return types.UnicodeText()
+
+
 class DuckDBClient:
     """Cliente para DuckDB"""
-    def __init__(self, database: str):
+    def __init__(self, database: str, read_only: bool = False):
         self.database = database
+        self.read_only = read_only
         self.connection = None
 
     def connect(self) -> bool:
         try:
             import duckdb
-            self.connection = duckdb.connect(self.database, read_only=False)
+            self.connection = duckdb.connect(self.database, read_only=self.read_only)
             print(f"✓ Conectado a DuckDB: {self.database}", file=sys.stderr)
             return True
         except Exception as e:
@@ -50,8 +259,9 @@ class DuckDBClient:
                 result = self.connection.execute(q)
 
                 if self._is_select(q):
-                    df = result.fetchdf()
-                    self._output(df, output_format)
+                    columns = [d[0] for d in result.description]
+                    batches = iter(lambda: result.fetchmany(FETCH_SIZE), [])
+                    write_output(columns, batches, output_format)
                 else:
                     print(f"Comando ejecutado", file=sys.stderr)
                 print()
@@ -65,28 +275,6 @@ class DuckDBClient:
         q = query.strip().upper()
         return q.startswith(('SELECT', 'WITH', 'SHOW', 'DESCRIBE', 'PRAGMA'))
 
-    def _output(self, df: pd.DataFrame, fmt: str):
-        if df.empty:
-            print("(0 filas)")
-            return
-
-        if fmt == "csv":
-            df.to_csv(sys.stdout, index=False)
-        elif fmt == "json":
-            print(df.to_json(orient='records', indent=2))
-        elif fmt == "excel":
-            filename = f"resultado_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            df.to_excel(filename, index=False)
-            print(f"Guardado en: {filename}")
-        else:
-            try:
-                from tabulate import tabulate
-                print(tabulate(df, headers='keys', tablefmt='grid', showindex=False))
-            except ImportError:
-                print(df.to_string(index=False))
-
-        print(f"\n({len(df)} filas)", file=sys.stderr)
-
     def _truncate(self, s: str, max_len: int) -> str:
         s = ' '.join(s.split())
         return s[:max_len] + '...' if len(s) > max_len else s
@@ -100,13 +288,14 @@ class DuckDBClient:
 class MSSQLClient:
     """Cliente para SQL Server"""
     def __init__(self, server: str, port: int, user: str = None, password: str = None,
-                 database: str = "master", trusted: bool = False):
+                 database: str = "master", trusted: bool = False, url: str = None):
         self.server = server
         self.port = port
         self.user = user
         self.password = password
         self.database = database
         self.trusted = trusted
+        self.url = url
         self.engine = None
         self.connection = None
 
@@ -114,7 +303,11 @@ class MSSQLClient:
         try:
             from sqlalchemy import create_engine
 
-            if self.trusted:
+            if self.url:
+                # URL SQLAlchemy explícita (p.ej. sqlite:///prueba.db para pruebas locales)
+                conn_str = self.url
+                auth_type = None
+            elif self.trusted:
                 # Conexión trusted usando pyodbc
                 conn_str = (
                     f"mssql+pyodbc://@{self.server}:{self.port}/{self.database}"
@@ -128,9 +321,14 @@ class MSSQLClient:
                 conn_str = f"mssql+pymssql://{self.user}:{password_encoded}@{self.server}:{self.port}/{self.database}"
                 auth_type = f"SQL Auth ({self.user})"
 
-            self.engine = create_engine(conn_str, echo=False)
+            # fast_executemany: pyodbc envía executemany como arreglo de parámetros
+            engine_kwargs = {'fast_executemany': True} if conn_str.startswith('mssql+pyodbc') else {}
+            self.engine = create_engine(conn_str, echo=False, **engine_kwargs)
             self.connection = self.engine.connect()
-            print(f"✓ Conectado a MSSQL: {self.server}:{self.port}/{self.database} [{auth_type}]", file=sys.stderr)
+            if self.url:
+                print(f"✓ Conectado a {self.engine.dialect.name}: {self.engine.url!r}", file=sys.stderr)
+            else:
+                print(f"✓ Conectado a MSSQL: {self.server}:{self.port}/{self.database} [{auth_type}]", file=sys.stderr)
             return True
         except Exception as e:
             print(f"✗ Error conectando a MSSQL: {str(e)}", file=sys.stderr)
@@ -157,8 +355,11 @@ class MSSQLClient:
                 print(f"Ejecutando: {self._truncate(q, 60)}", file=sys.stderr)
 
                 if self._is_select(q):
-                    df = pd.read_sql(text(q), self.connection)
-                    self._output(df, output_format)
+                    result = self.connection.execute(text(q))
+                    if result.returns_rows:
+                        write_output(list(result.keys()), result.partitions(FETCH_SIZE), output_format)
+                    else:
+                        print("Comando ejecutado", file=sys.stderr)
                 else:
                     result = self.connection.execute(text(q))
                     if hasattr(result, 'rowcount') and result.rowcount >= 0:
@@ -171,31 +372,219 @@ class MSSQLClient:
             print(f"Error: {str(e)}", file=sys.stderr)
             return False
 
-    def _is_select(self, query: str) -> bool:
-        q = query.strip().upper()
-        return q.startswith(('SELECT', 'WITH', 'SHOW', 'EXEC', 'EXECUTE', 'SP_'))
+    def transfer_to_duckdb(self, query: str, duckdb_path: str, table: str,
+                           batch_size: int = BATCH_SIZE, append: bool = False) -> bool:
+        """
+        Copia el resultado de una consulta a una tabla DuckDB por lotes.
+
+        Las filas se leen con cursor del lado del servidor (stream_results) y
+        cada lote se convierte a Arrow antes de insertarse, de modo que la
+        memoria usada depende de batch_size y no del tamaño del resultado.
+        La carga ocurre en una sola transacción DuckDB: si falla, la tabla
+        destino queda como estaba.
+
+        Si el driver no informa tipos, cada lote se infiere por separado y
+        una columna que llega solo con NULL no fija su tipo: se crea como
+        VARCHAR y se cambia (ALTER) cuando aparece el primer valor, o cuando
+        un lote posterior necesita un tipo más amplio (int → float, decimal
+        con más dígitos). Queda VARCHAR solo si es NULL en todo el resultado.
+        """
+        if not self.connection:
+            print("Error: No hay conexión activa", file=sys.stderr)
+            return False
 
-    def _output(self, df: pd.DataFrame, fmt: str):
-        if df.empty:
-            print("(0 filas)")
-            return
-
-        if fmt == "csv":
-            df.to_csv(sys.stdout, index=False)
-        elif fmt == "json":
-            print(df.to_json(orient='records', indent=2))
-        elif fmt == "excel":
-            filename = f"resultado_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-            df.to_excel(filename, index=False)
-            print(f"Guardado en: {filename}")
-        else:
+        import time
+        import duckdb
+        import pyarrow as pa
+        from sqlalchemy import text
+
+        duck = None
+        try:
+            print(f"Ejecutando: {self._truncate(query, 60)}", file=sys.stderr)
+            result = self.connection.execution_options(
+                stream_results=True, max_row_buffer=batch_size
+            ).execute(text(query))
+            columns = list(result.keys())
+            description = result.cursor.description if result.cursor else None
+
+            duck = duckdb.connect(duckdb_path)
+            duck.execute("BEGIN TRANSACTION")
+
+            # Con append sobre una tabla existente se respetan sus tipos
+            schema_name, _, table_name = table.rpartition('.')
+            created = not append or not duck.execute(
+                "SELECT 1 FROM information_schema.tables WHERE table_name = ? "
+                "AND (? = '' OR table_schema = ?)",
+                [table_name, schema_name, schema_name],
+            ).fetchone()
+
+            schema = None
+            total = 0
+            inicio = time.perf_counter()
+            for rows in result.partitions(batch_size):
+                previous = schema
+                schema = _unify_schema(schema, _arrow_schema(columns, description, rows))
+                lote = pa.Table.from_arrays(
+                    [pa.array([r[i] for r in rows], type=f.type) for i, f in enumerate(schema)],
+                    schema=schema,
+                )
+                duck.register("lote_mssql", lote)
+                select = _select_batch(schema, "lote_mssql")
+                if total == 0 and not append:
+                    duck.execute(f"CREATE OR REPLACE TABLE {table} AS {select}")
+                elif total == 0:
+                    duck.execute(f"CREATE TABLE IF NOT EXISTS {table} AS {select} LIMIT 0")
+                    duck.execute(f"INSERT INTO {table} {select}")
+                else:
+                    if created and schema != previous:
+                        _widen_columns(duck, table, previous, schema, select)
+                    duck.execute(f"INSERT INTO {table} {select}")
+                duck.unregister("lote_mssql")
+
+                total += len(rows)
+                elapsed = time.perf_counter() - inicio
+                print(f"  → {total:,} filas ({total / max(elapsed, 1e-9):,.0f} filas/s)", file=sys.stderr)
+
+            if schema is None:
+                print("(0 filas) - no se modificó la tabla destino", file=sys.stderr)
+                duck.execute("ROLLBACK")
+                return True
+
+            duck.execute("COMMIT")
+            print(f"✓ {total:,} filas copiadas a {duckdb_path}:{table}", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
+            if duck is not None:
+                try:
+                    duck.execute("ROLLBACK")
+                except Exception:
+                    pass
+            return False
+        finally:
+            if duck is not None:
+                duck.close()
+
+    def push_from_duckdb(self, duckdb_path: str, source: str, table: str,
+                         batch_size: int = BATCH_SIZE, staging: bool = False) -> bool:
+        """
+        Publica una consulta o tabla DuckDB en una tabla del servidor.
+
+        Las filas se leen de DuckDB en lotes Arrow y se envían con arreglos de
+        parámetros: executemany con fast_executemany en pyodbc, o sentencias
+        INSERT ... VALUES multi-fila en otros drivers. Si la tabla destino no
+        existe se crea con los tipos del resultado.
+
+        Con staging=True las filas se cargan en <table>_staging y al final, en
+        una transacción, la tabla destino se reemplaza por la de staging; los
+        lectores nunca ven una tabla a medio cargar. Sin staging las filas se
+        agregan a la tabla existente.
+        """
+        if not self.connection:
+            print("Error: No hay conexión activa", file=sys.stderr)
+            return False
+
+        import time
+        import duckdb
+        import pyarrow as pa
+        from sqlalchemy import MetaData, Table, Column, insert, inspect
+        from compat_duckdb import lector_arrow, tabla_arrow
+
+        # Un nombre simple se interpreta como tabla; cualquier otra cosa como consulta
+        query = source if len(source.split()) > 1 else f"SELECT * FROM {source}"
+        schema_name, _, table_name = table.rpartition('.')
+        schema_name = schema_name or None
+        load_name = f"{table_name}_staging" if staging else table_name
+
+        duck = None
+        try:
+            duck = duckdb.connect(duckdb_path, read_only=True)
+            print(f"Ejecutando en DuckDB: {self._truncate(query, 60)}", file=sys.stderr)
+            arrow_schema = tabla_arrow(duck.execute(f"SELECT * FROM ({query}) LIMIT 0")).schema
+
+            # Largo máximo de columnas de texto para dimensionar NVARCHAR(n)
+            text_cols = [f.name for f in arrow_schema
+                         if pa.types.is_string(f.type) or pa.types.is_large_string(f.type)]
+            lengths = {}
+            if text_cols:
+                exprs = ", ".join(f'MAX(LENGTH("{c}"))' for c in text_cols)
+                row = duck.execute(f"SELECT {exprs} FROM ({query})").fetchone()
+                lengths = dict(zip(text_cols, row))
+
+            metadata = MetaData(schema=schema_name)
+            target = Table(load_name, metadata, *[
+                Column(f.name, _sqlalchemy_type(f.type, lengths.get(f.name)))
+                for f in arrow_schema
+            ])
+            exists = inspect(self.connection).has_table(load_name, schema=schema_name)
+            if staging and exists:
+                target.drop(self.connection)
+            if staging or not exists:
+                target.create(self.connection)
+                print(f"✓ Tabla creada: {target.fullname}", file=sys.stderr)
+            self.connection.commit()
+
+            reader = lector_arrow(duck.execute(query), batch_size)
+            fast = self.engine.dialect.name == 'mssql' and self.engine.dialect.driver == 'pyodbc'
+            rows_per_stmt = max(1, min(_MSSQL_MAX_VALUES_ROWS, _MSSQL_MAX_PARAMS // max(len(arrow_schema), 1)))
+
+            total = 0
+            inicio = time.perf_counter()
+            for batch in reader:
+                rows = batch.to_pylist()
+                if fast:
+                    # pyodbc con fast_executemany envía el lote como arreglo de parámetros
+                    self.connection.execute(insert(target), rows)
+                else:
+                    for i in range(0, len(rows), rows_per_stmt):
+                        self.connection.execute(insert(target).values(rows[i:i + rows_per_stmt]))
+                total += len(rows)
+                elapsed = time.perf_counter() - inicio
+                print(f"  → {total:,} filas ({total / max(elapsed, 1e-9):,.0f} filas/s)", file=sys.stderr)
+                if staging:
+                    self.connection.commit()
+
+            if staging:
+                self._swap_staging(target, table_name, schema_name)
+            self.connection.commit()
+            print(f"✓ {total:,} filas publicadas en {table}", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"Error: {str(e)}", file=sys.stderr)
             try:
-                from tabulate import tabulate
-                print(tabulate(df, headers='keys', tablefmt='grid', showindex=False))
-            except ImportError:
-                print(df.to_string(index=False))
+                self.connection.rollback()
+            except Exception:
+                pass
+            return False
+        finally:
+            if duck is not None:
+                duck.close()
+
+    def _swap_staging(self, staging_table, table_name: str, schema_name: Optional[str]):
+        """Reemplaza la tabla destino por la de staging dentro de la transacción actual"""
+        from sqlalchemy import inspect, text
+
+        preparer = self.engine.dialect.identifier_preparer
+        target = preparer.quote(table_name)
+        if schema_name:
+            target = f"{preparer.quote_schema(schema_name)}.{target}"
+
+        if inspect(self.connection).has_table(table_name, schema=schema_name):
+            self.connection.execute(text(f"DROP TABLE {target}"))
+        if self.engine.dialect.name == 'mssql':
+            self.connection.execute(
+                text("EXEC sp_rename :old, :new"),
+                {"old": staging_table.fullname, "new": table_name},
+            )
+        else:
+            self.connection.execute(
+                text(f"ALTER TABLE {preparer.format_table(staging_table)} RENAME TO {preparer.quote(table_name)}")
+            )
+        print(f"✓ Staging {staging_table.fullname} → {table_name}", file=sys.stderr)
 
-        print(f"\n({len(df)} filas)", file=sys.stderr)
+    def _is_select(self, query: str) -> bool:
+        q = query.strip().upper()
+        return q.startswith(('SELECT', 'WITH', 'SHOW', 'EXEC', 'EXECUTE', 'SP_'))
 
     def _truncate(self, s: str, max_len: int) -> str:
         s = ' '.join(s.split())
@@ -222,6 +611,15 @@ Ejemplos MSSQL (SQL Auth):
 Ejemplos MSSQL (Windows Auth):
   pysql.py -S servidor -T -Q "SELECT @@VERSION"
   pysql.py -S servidor -T -d midb -i query.sql
+
+Transferencia MSSQL → DuckDB (por lotes, memoria acotada):
+  pysql.py -S servidor -T -d midb -Q "SELECT * FROM dbo.planilla" \
+      --to-duckdb censo_2023.duckdb --table planilla
+  pysql.py --url sqlite:///prueba.db -Q "SELECT * FROM t" --to-duckdb x.duckdb --table t
+
+Publicación DuckDB → MSSQL (-Q es una consulta o tabla DuckDB):
+  pysql.py -S servidor -T -d midb --from-duckdb censo_2023.duckdb \
+      -Q brecha_corregimiento --table dbo.brecha_corregimiento --staging
         """,
         formatter_class=argparse.RawDescriptionHelpFormatter
     )
@@ -239,6 +637,22 @@ Ejemplos MSSQL (Windows Auth):
     mssql_group.add_argument('-d', '--database', default='master', help='Base de datos')
     mssql_group.add_argument('-T', '--trusted', action='store_true',
                             help='Usar Windows Authentication (trusted connection)')
+    mssql_group.add_argument('--url', metavar='URL',
+                            help='URL SQLAlchemy en lugar de -S (p.ej. sqlite:///prueba.db)')
+
+    # Grupo transferencia
+    transfer_group = parser.add_argument_group('Transferencia')
+    transfer_group.add_argument('--to-duckdb', metavar='FILE',
+                               help='Copiar el resultado de la consulta MSSQL a este archivo DuckDB')
+    transfer_group.add_argument('--from-duckdb', metavar='FILE',
+                               help='Publicar la consulta/tabla DuckDB de -Q/-i en la tabla MSSQL --table')
+    transfer_group.add_argument('--table', metavar='NAME', help='Tabla destino de la transferencia')
+    transfer_group.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                               help=f'Filas por lote (default: {BATCH_SIZE})')
+    transfer_group.add_argument('--append', action='store_true',
+                               help='Agregar filas a la tabla destino en lugar de reemplazarla')
+    transfer_group.add_argument('--staging', action='store_true',
+                               help='Con --from-duckdb: cargar en <tabla>_staging y reemplazar al final')
 
     # Opciones comunes
     parser.add_argument('-Q', '--query', help='Query SQL a ejecutar')
@@ -249,15 +663,30 @@ Ejemplos MSSQL (Windows Auth):
     args = parser.parse_args()
 
     # Validar modo de conexión
-    if args.duckdb and args.server:
+    if args.duckdb and (args.server or args.url):
         print("Error: Use --duckdb o -S, no ambos", file=sys.stderr)
         sys.exit(1)
 
-    if not args.duckdb and not args.server:
+    if not args.duckdb and not args.server and not args.url:
         print("Error: Especifique --duckdb FILE o -S servidor", file=sys.stderr)
         parser.print_help()
         sys.exit(1)
 
+    if args.to_duckdb and args.from_duckdb:
+        print("Error: Use --to-duckdb o --from-duckdb, no ambos", file=sys.stderr)
+        sys.exit(1)
+
+    if args.to_duckdb or args.from_duckdb:
+        if args.duckdb:
+            print("Error: La transferencia requiere una conexión MSSQL (-S o --url)", file=sys.stderr)
+            sys.exit(1)
+        if not args.table:
+            print("Error: La transferencia requiere --table", file=sys.stderr)
+            sys.exit(1)
+        if args.from_duckdb and not os.path.exists(args.from_duckdb):
+            print(f"Error: Archivo '{args.from_duckdb}' no existe", file=sys.stderr)
+            sys.exit(1)
+
     # Validar query
     if not args.query and not args.input_file:
         print("Error: Especifique -Q (query) o -i (archivo)", file=sys.stderr)
@@ -284,17 +713,25 @@ Ejemplos MSSQL (Windows Auth):
             sys.exit(1)
         client = DuckDBClient(args.duckdb)
     else:
-        if not args.trusted and not args.user:
+        if not args.url and not args.trusted and not args.user:
             print("Error: Se requiere -U (usuario) o -T (trusted) para MSSQL", file=sys.stderr)
             sys.exit(1)
         client = MSSQLClient(args.server, args.port, args.user, args.password,
-                            args.database, args.trusted)
+                            args.database, args.trusted, url=args.url)
 
     # Ejecutar
     try:
         if not client.connect():
             sys.exit(1)
-        if not client.execute_query(query, args.output):
+        if args.to_duckdb:
+            ok = client.transfer_to_duckdb(query, args.to_duckdb, args.table,
+                                           batch_size=args.batch_size, append=args.append)
+        elif args.from_duckdb:
+            ok = client.push_from_duckdb(args.from_duckdb, query.strip().rstrip(';'), args.table,
+                                         batch_size=args.batch_size, staging=args.staging)
+        else:
+            ok = client.execute_query(query, args.output)
+        if not ok:
             sys.exit(1)
     finally:
         client.close()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Recursos estáticos de los mapas: archivos con hash de contenido y
+variantes precomprimidas (gzip y brotli)
+
+Cada recurso se guarda como <prefijo>.<hash>.<ext> junto a <...>.gz y
+<...>.br; el nombre cambia solo si cambia el contenido, así que se puede
+cachear sin vencimiento (Cache-Control: immutable) y varios mapas del
+mismo directorio comparten la misma geometría. Si el archivo ya existe
+no se vuelve a escribir ni comprimir.
+
+brotli es opcional (pip install brotli); sin él solo se generan los .gz.
+
+Uso:
+    python recursos_web.py mapas            # servir mapas/ en http://localhost:8000
+    python recursos_web.py mapas --puerto 8080
+
+El servidor entrega la variante .br o .gz según Accept-Encoding (como
+gzip_static/brotli_static de nginx); cualquier servidor con esa opción
+sirve igual el directorio.
+"""
+
+import argparse
+import gzip
+import hashlib
+import os
+import re
+import tempfile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Subdirectorio de recursos, junto a los HTML que los usan
+DIRECTORIO = "assets"
+
+# Caracteres del hash (sha256) en el nombre del archivo
+LONGITUD_HASH = 12
+
+# Nombres versionados por contenido: <prefijo>.<hash>.<ext>
+_VERSIONADO = re.compile(r"\.[0-9a-f]{%d}\.\w+$" % LONGITUD_HASH)
+
+CACHE_INMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _escribir_atomico(ruta: str, datos: bytes):
+    """Escribe en un temporal y renombra (otro proceso nunca ve un archivo a medias)"""
+    fd, temporal = tempfile.mkstemp(dir=os.path.dirname(ruta) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.chmod(temporal, 0o644)  # mkstemp crea con 0600; el servidor web debe poder leerlo
+        os.replace(temporal, ruta)
+    except BaseException:
+        os.unlink(temporal)
+        raise
+
+
+def variantes(datos: bytes) -> dict:
+    """{extensión: bytes comprimidos}; gzip sin fecha para que sea reproducible"""
+    comprimidos = {".gz": gzip.compress(datos, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        comprimidos[".br"] = brotli.compress(datos, quality=11)
+    return comprimidos
+
+
+def escribir_recurso(directorio: str, prefijo: str, datos: bytes, extension: str = "json") -> str:
+    """Guarda datos como <prefijo>.<hash>.<extension> (más .gz/.br); retorna el nombre"""
+    os.makedirs(directorio, exist_ok=True)
+    huella = hashlib.sha256(datos).hexdigest()[:LONGITUD_HASH]
+    nombre = f"{prefijo}.{huella}.{extension}"
+    ruta = os.path.join(directorio, nombre)
+    faltan = [ext for ext in (".gz", ".br") if not os.path.exists(ruta + ext)]
+    if faltan:
+        for ext, comprimido in variantes(datos).items():
+            if ext in faltan:
+                _escribir_atomico(ruta + ext, comprimido)
+    # El original al final: si existe, las variantes ya están
+    if not os.path.exists(ruta):
+        _escribir_atomico(ruta, datos)
+    return nombre
+
+
+def tamanos(directorio: str, nombre: str) -> dict:
+    """Tamaño en bytes del recurso y de cada variante comprimida que exista"""
+    ruta = os.path.join(directorio, nombre)
+    return {ext or "original": os.path.getsize(ruta + ext)
+            for ext in ("", ".gz", ".br") if os.path.exists(ruta + ext)}
+
+
+def _codificaciones(cabecera: str) -> set:
+    """Codificaciones aceptadas en Accept-Encoding (sin las de q=0)"""
+    aceptadas = set()
+    for parte in cabecera.split(","):
+        nombre, _, parametros = parte.partition(";")
+        peso = parametros.replace(" ", "")
+        try:
+            peso = float(peso[2:]) if peso.startswith("q=") else 1.0
+        except ValueError:
+            peso = 1.0
+        if peso > 0:
+            aceptadas.add(nombre.strip().lower())
+    return aceptadas
+
+
+def servir(directorio: str, puerto: int = 8000, pagina: str = None):
+    """Servidor HTTP local que entrega las variantes precomprimidas
+
+    Con pagina (ruta relativa a directorio) la abre en el navegador.
+    """
+    import functools
+    import http.server
+    import threading
+    import webbrowser
+
+    class Manejador(http.server.SimpleHTTPRequestHandler):
+        def send_head(self):
+            ruta = self.translate_path(self.path)
+            aceptadas = _codificaciones(self.headers.get("Accept-Encoding", ""))
+            if os.path.isfile(ruta):
+                for codificacion, ext in (("br", ".br"), ("gzip", ".gz")):
+                    if codificacion in aceptadas and os.path.isfile(ruta + ext):
+                        f = open(ruta + ext, "rb")
+                        self.send_response(200)
+                        self.send_header("Content-Type", self.guess_type(ruta))
+                        self.send_header("Content-Encoding", codificacion)
+                        self.send_header("Content-Length", str(os.fstat(f.fileno()).st_size))
+                        self.end_headers()
+                        return f
+            return super().send_head()
+
+        def end_headers(self):
+            versionado = _VERSIONADO.search(self.path.split("?")[0])
+            self.send_header("Cache-Control", CACHE_INMUTABLE if versionado else "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            super().end_headers()
+
+        def log_message(self, *args):
+            pass
+
+    manejador = functools.partial(Manejador, directory=directorio)
+    with http.server.ThreadingHTTPServer(("127.0.0.1", puerto), manejador) as servidor:
+        url = f"http://localhost:{puerto}/"
+        print(f"🌐 Sirviendo {os.path.abspath(directorio)} en {url}  (Ctrl+C para terminar)")
+        if pagina:
+            threading.Timer(0.5, webbrowser.open, [url + pagina]).start()
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            print("\n👋 Servidor detenido")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Sirve un directorio de mapas con recursos precomprimidos (gzip/brotli)"
+    )
+    parser.add_argument("directorio", nargs="?", default="mapas",
+                        help="Directorio a servir (default: mapas)")
+    parser.add_argument("--puerto", type=int, default=8000, help="Puerto (default: 8000)")
+    args = parser.parse_args()
+    servir(args.directorio, args.puerto)
+
+
+if __name__ == "__main__":
+    main()
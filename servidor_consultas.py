@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Servidor HTTP local de consultas sobre censo_2023.duckdb
+
+Mantiene una sola conexión DuckDB de solo lectura (con un pool de cursores)
+para que varias personas y scripts consulten el mismo archivo sin arrancar
+DuckDB en cada proceso ni pelear por el bloqueo del archivo.
+
+Uso:
+    python servidor_consultas.py --duckdb censo_2023.duckdb --port 8765
+
+Endpoints:
+    GET  /salud                                  estado, pool y caché
+    GET  /query?sql=SELECT...&format=json        consulta ad-hoc (GET)
+    POST /query?format=csv      (cuerpo = SQL)   consulta ad-hoc (POST)
+    GET  /reportes                               reportes predefinidos
+    GET  /reportes/<nombre>?format=arrow         ejecutar un reporte
+    POST /liberar                                cerrar el archivo para recargar tablas
+    POST /recargar?espera=60                     reabrir el archivo y vaciar la caché
+
+Formatos: json (default), csv, arrow (Arrow IPC stream).
+
+Ejemplos:
+    curl 'http://localhost:8765/query?sql=SELECT+COUNT(*)+FROM+planilla'
+    curl -X POST --data-binary @consulta.sql 'http://localhost:8765/query?format=csv'
+    curl 'http://localhost:8765/reportes/brechas?format=csv' > brechas.csv
+
+Recarga de tablas sin detener el servidor: mientras está activo el archivo
+queda abierto en modo lectura y ningún proceso puede escribirlo. /liberar
+espera las consultas en curso y cierra la conexión (las consultas que no
+están en caché responden 503 hasta recargar); /recargar la reabre,
+reintentando mientras el proceso que escribe tenga el archivo, y vacía la
+caché:
+
+    curl -X POST http://localhost:8765/liberar
+    python cargar_planilla.py
+    curl -X POST http://localhost:8765/recargar
+
+La caché dura lo que dura el proceso (o hasta /recargar), con expiración
+por --ttl.
+
+Requisitos:
+    pip install duckdb pyarrow
+"""
+
+import argparse
+import io
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import duckdb
+
+from compat_duckdb import tabla_arrow
+from pysql import DuckDBClient
+from generar_excel_simple import (
+    QUERY_GAP_MENORES,
+    QUERY_PRINCIPAL,
+    QUERY_PROVINCIAS,
+    QUERY_SOBREATENCION,
+)
+
+# Reportes predefinidos (mismas consultas que el Excel de análisis)
+REPORTES = {
+    "brechas": QUERY_PRINCIPAL,
+    "provincias": QUERY_PROVINCIAS,
+    "sobreatencion": QUERY_SOBREATENCION,
+    "gap_menores": QUERY_GAP_MENORES,
+}
+
+# Segundos entre intentos de reabrir el archivo en /recargar
+REINTENTO_APERTURA = 0.5
+
+CONTENT_TYPES = {
+    "json": "application/json; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+class PoolCursores:
+    """Pool de cursores DuckDB sobre una conexión de solo lectura.
+
+    El tamaño del pool es también el límite de consultas concurrentes.
+    liberar() y abrir() cierran y reabren el archivo para que otro proceso
+    pueda escribirlo.
+    """
+
+    def __init__(self, database: str, size: int):
+        self.client = DuckDBClient(database, read_only=True)
+        self.size = size
+        self._cursores = queue.Queue(maxsize=size)
+        self._estado = threading.Lock()
+        self.liberado = True
+        self.abrir()
+
+    def abrir(self, espera: float = 0):
+        """Abre la conexión y los cursores; reintenta hasta espera segundos si el archivo está tomado"""
+        with self._estado:
+            if not self.liberado:
+                return
+            limite = time.monotonic() + espera
+            while not self.client.connect():
+                if time.monotonic() >= limite:
+                    raise RuntimeError(f"No se pudo abrir {self.client.database}")
+                time.sleep(REINTENTO_APERTURA)
+            for _ in range(self.size):
+                self._cursores.put(self.client.connection.cursor())
+            self.liberado = False
+
+    def liberar(self, timeout: float):
+        """Espera las consultas en curso y cierra cursores y conexión (el archivo queda libre)"""
+        with self._estado:
+            if self.liberado:
+                return
+            self.liberado = True
+            cursores = []
+            try:
+                for _ in range(self.size):
+                    cursores.append(self._cursores.get(timeout=timeout))
+            except queue.Empty:
+                for cursor in cursores:
+                    self._cursores.put(cursor)
+                self.liberado = False
+                raise OcupadoError(f"Consultas en curso tras {timeout:.0f}s; no se liberó el archivo")
+            for cursor in cursores:
+                cursor.close()
+            self.client.close()
+
+    def ejecutar(self, sql: str, timeout: float):
+        """Ejecuta la consulta en un cursor libre y retorna una tabla Arrow"""
+        if self.liberado:
+            raise LiberadoError("Archivo liberado para recarga; reintentar después de /recargar")
+        try:
+            cursor = self._cursores.get(timeout=timeout)
+        except queue.Empty:
+            raise OcupadoError(f"Sin cursores libres tras {timeout:.0f}s")
+        try:
+            return tabla_arrow(cursor.execute(sql))
+        finally:
+            self._cursores.put(cursor)
+
+    def disponibles(self) -> int:
+        return self._cursores.qsize()
+
+    def close(self):
+        while not self._cursores.empty():
+            self._cursores.get_nowait().close()
+        self.client.close()
+
+
+class OcupadoError(Exception):
+    """Se alcanzó el límite de concurrencia"""
+
+
+class LiberadoError(Exception):
+    """El archivo está liberado para que otro proceso lo escriba"""
+
+
+class CacheResultados:
+    """Caché LRU de respuestas ya serializadas, con expiración por TTL.
+
+    Vive lo que vive el proceso; /recargar la vacía (vaciar()).
+    """
+
+    def __init__(self, max_items: int, ttl: float):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def vaciar(self):
+        with self._lock:
+            self._items.clear()
+
+    def get(self, clave):
+        with self._lock:
+            item = self._items.get(clave)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                self._items.pop(clave, None)
+                self.misses += 1
+                return None
+            self._items.move_to_end(clave)
+            self.hits += 1
+            return item[1]
+
+    def put(self, clave, valor):
+        if self.max_items <= 0:
+            return
+        with self._lock:
+            self._items[clave] = (time.monotonic(), valor)
+            self._items.move_to_end(clave)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"items": len(self._items), "hits": self.hits, "misses": self.misses}
+
+
+def serializar(tabla, fmt: str) -> bytes:
+    """Serializa una tabla Arrow al formato pedido"""
+    if fmt == "arrow":
+        import pyarrow as pa
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+        return sink.getvalue()
+    if fmt == "csv":
+        import pyarrow.csv as pa_csv
+        sink = io.BytesIO()
+        pa_csv.write_csv(tabla, sink)
+        return sink.getvalue()
+    return json.dumps(tabla.to_pylist(), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def es_consulta_lectura(sql: str, client: DuckDBClient) -> bool:
+    """Una sola sentencia de lectura (SELECT, WITH, SHOW, DESCRIBE...)
+
+    Las sentencias las separa el parser de DuckDB (un ';' dentro de un
+    literal no cuenta); si no parsea, el error lo reporta la ejecución.
+    """
+    try:
+        sentencias = duckdb.extract_statements(sql)
+    except duckdb.ParserException:
+        return client._is_select(sql)
+    return len(sentencias) == 1 and client._is_select(sentencias[0].query)
+
+
+class ConsultasHandler(BaseHTTPRequestHandler):
+    """Atiende /salud, /query y /reportes"""
+
+    server_version = "CensoConsultas/1.0"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/salud":
+            self._json(200, {
+                "database": self.server.pool.client.database,
+                "cursores": self.server.pool.size,
+                "cursores_libres": self.server.pool.disponibles(),
+                "liberado": self.server.pool.liberado,
+                "cache": self.server.cache.stats(),
+            })
+        elif url.path == "/query":
+            self._consulta(params.get("sql", [""])[0], params)
+        elif url.path == "/reportes":
+            self._json(200, sorted(REPORTES))
+        elif url.path.startswith("/reportes/"):
+            nombre = url.path[len("/reportes/"):]
+            if nombre not in REPORTES:
+                self._json(404, {"error": f"Reporte no encontrado: {nombre}"})
+                return
+            self._consulta(REPORTES[nombre], params)
+        else:
+            self._json(404, {"error": f"Ruta no encontrada: {url.path}"})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path in ("/liberar", "/recargar"):
+            self._recarga(url.path, parse_qs(url.query))
+            return
+        if url.path != "/query":
+            self._json(404, {"error": f"Ruta no encontrada: {url.path}"})
+            return
+        largo = int(self.headers.get("Content-Length", 0))
+        sql = self.rfile.read(largo).decode("utf-8")
+        self._consulta(sql, parse_qs(url.query))
+
+    def _recarga(self, ruta: str, params: dict):
+        """/liberar cierra el archivo; /recargar lo (re)abre y vacía la caché"""
+        pool = self.server.pool
+        try:
+            espera = float(params.get("espera", [self.server.espera])[0])
+        except ValueError:
+            self._json(400, {"error": "espera debe ser un número de segundos"})
+            return
+        try:
+            pool.liberar(timeout=espera)
+            if ruta == "/recargar":
+                pool.abrir(espera=espera)
+                self.server.cache.vaciar()
+        except (OcupadoError, RuntimeError) as e:
+            self._json(503, {"error": str(e), "liberado": pool.liberado})
+            return
+        print(f"  {'🔓 Archivo liberado' if pool.liberado else '🔄 Archivo reabierto, caché vaciada'}",
+              file=sys.stderr)
+        self._json(200, {"liberado": pool.liberado})
+
+    def _consulta(self, sql: str, params: dict):
+        fmt = params.get("format", ["json"])[0]
+        if fmt not in CONTENT_TYPES:
+            self._json(400, {"error": f"Formato no válido: {fmt}"})
+            return
+        if not sql.strip() or not es_consulta_lectura(sql, self.server.pool.client):
+            self._json(400, {"error": "Solo se admite una consulta de lectura (SELECT/WITH/...)"})
+            return
+
+        inicio = time.perf_counter()
+        clave = (" ".join(sql.split()), fmt)
+        cuerpo = self.server.cache.get(clave)
+        origen = "cache"
+        if cuerpo is None:
+            origen = "duckdb"
+            try:
+                tabla = self.server.pool.ejecutar(sql, timeout=self.server.espera)
+            except (OcupadoError, LiberadoError) as e:
+                self._json(503, {"error": str(e)})
+                return
+            except Exception as e:
+                self._json(400, {"error": str(e)})
+                return
+            cuerpo = serializar(tabla, fmt)
+            self.server.cache.put(clave, cuerpo)
+
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPES[fmt])
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.send_header("X-Origen", origen)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+        ms = (time.perf_counter() - inicio) * 1000
+        print(f"  {fmt:5} {origen:6} {ms:8.1f} ms  {' '.join(sql.split())[:60]}", file=sys.stderr)
+
+    def _json(self, status: int, data):
+        cuerpo = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES["json"])
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def log_message(self, format, *args):
+        # Las consultas se registran en _consulta; silenciar el log por defecto
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Servidor HTTP local de consultas DuckDB (solo lectura)"
+    )
+    parser.add_argument("--duckdb", default="censo_2023.duckdb", metavar="FILE",
+                        help="Archivo DuckDB (default: censo_2023.duckdb)")
+    parser.add_argument("--host", default="127.0.0.1", help="Interfaz (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8765, help="Puerto (default: 8765)")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Consultas concurrentes / cursores en el pool (default: 4)")
+    parser.add_argument("--espera", type=float, default=30,
+                        help="Segundos de espera por un cursor libre antes de responder 503 (default: 30)")
+    parser.add_argument("--cache", type=int, default=256,
+                        help="Máximo de resultados en caché, 0 para desactivar (default: 256)")
+    parser.add_argument("--ttl", type=float, default=600,
+                        help="Segundos de vida de un resultado en caché (default: 600)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.duckdb):
+        print(f"❌ No se encontró: {args.duckdb}")
+        sys.exit(1)
+
+    try:
+        pool = PoolCursores(args.duckdb, args.workers)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+
+    server = ThreadingHTTPServer((args.host, args.port), ConsultasHandler)
+    server.daemon_threads = True
+    server.pool = pool
+    server.cache = CacheResultados(args.cache, args.ttl)
+    server.espera = args.espera
+
+    print(f"🚀 Sirviendo {args.duckdb} en http://{args.host}:{args.port} "
+          f"({args.workers} cursores, caché {args.cache})")
+    print(f"   Reportes: {', '.join(sorted(REPORTES))}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Deteniendo servidor...")
+    finally:
+        server.server_close()
+        pool.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Pruebas de ida y vuelta de pysql.py contra una base sqlite local (SQLAlchemy)
+
+    python -m pytest -q test_pysql.py
+"""
+
+import decimal
+import sqlite3
+
+import duckdb
+import pyarrow as pa
+import pytest
+
+from pysql import MSSQLClient, _arrow_schema, _unify_schema
+
+# id, menores (NULL en las primeras filas), monto DECIMAL, factor (int y luego
+# float), sin_datos (NULL en todas), nombre
+FILAS = [
+    (1, None, 1.50, 1, None, "a"),
+    (2, None, 2.25, 2, None, None),
+    (3, 4, 3.75, 3, None, "c"),
+    (4, None, None, 4.5, None, "d"),
+    (5, 7, 10.50, 6, None, "e"),
+]
+
+
+@pytest.fixture
+def origen(tmp_path):
+    ruta = tmp_path / "origen.db"
+    conn = sqlite3.connect(ruta)
+    conn.execute("CREATE TABLE u (id INTEGER, menores INTEGER, monto DECIMAL(10, 2), "
+                 "factor NUMERIC, sin_datos INTEGER, nombre TEXT)")
+    conn.executemany("INSERT INTO u VALUES (?, ?, ?, ?, ?, ?)", FILAS)
+    conn.commit()
+    conn.close()
+    cliente = MSSQLClient(None, None, url=f"sqlite:///{ruta}")
+    assert cliente.connect()
+    yield cliente
+    cliente.close()
+
+
+def tipos(duck, tabla):
+    return {nombre: tipo for nombre, tipo, *_ in duck.execute(f"DESCRIBE {tabla}").fetchall()}
+
+
+@pytest.mark.parametrize("batch_size", [1, 2, 3, 5, 100])
+def test_transfer_columna_que_empieza_null(origen, tmp_path, batch_size):
+    destino = str(tmp_path / "destino.duckdb")
+    assert origen.transfer_to_duckdb("SELECT * FROM u ORDER BY id", destino, "u", batch_size=batch_size)
+
+    duck = duckdb.connect(destino)
+    assert duck.execute("SELECT * FROM u ORDER BY id").fetchall() == [
+        (i, m, None if monto is None else pytest.approx(monto), pytest.approx(f), None, n)
+        for i, m, monto, f, _, n in FILAS
+    ]
+    columnas = tipos(duck, "u")
+    assert columnas["menores"] == "BIGINT"
+    assert columnas["monto"] == "DOUBLE"
+    assert columnas["sin_datos"] == "VARCHAR"
+    # factor: entero en los primeros lotes y real después
+    assert columnas["factor"] == "DOUBLE"
+
+
+def test_transfer_append_respeta_tabla_existente(origen, tmp_path):
+    destino = str(tmp_path / "destino.duckdb")
+    duck = duckdb.connect(destino)
+    duck.execute("CREATE TABLE u (id INTEGER, menores INTEGER, monto DECIMAL(10, 2), "
+                  "factor DOUBLE, sin_datos INTEGER, nombre VARCHAR)")
+    duck.close()
+
+    assert origen.transfer_to_duckdb("SELECT * FROM u", destino, "u", batch_size=2, append=True)
+    duck = duckdb.connect(destino)
+    assert duck.execute("SELECT COUNT(*), SUM(menores) FROM u").fetchone() == (5, 11)
+    assert tipos(duck, "u")["menores"] == "INTEGER"
+    assert tipos(duck, "u")["monto"] == "DECIMAL(10,2)"
+
+
+def test_esquema_decimal_se_ensancha_entre_lotes():
+    columnas = ["monto"]
+    primero = _arrow_schema(columnas, None, [(None,), (decimal.Decimal("1.50"),)])
+    segundo = _arrow_schema(columnas, None, [(decimal.Decimal("12345.25"),)])
+    assert _unify_schema(None, primero).field("monto").type == pa.decimal128(3, 2)
+    assert _unify_schema(primero, segundo).field("monto").type == pa.decimal128(7, 2)
+
+    # Con tipo del cursor (DECIMAL con precisión), no se infiere
+    descripcion = [("monto", decimal.Decimal, None, None, 10, 2, True)]
+    assert _arrow_schema(columnas, descripcion, [(None,)]).field("monto").type == pa.decimal128(10, 2)
+
+
+def test_push_staging_reemplaza_tabla(origen, tmp_path):
+    fuente = str(tmp_path / "fuente.duckdb")
+    duck = duckdb.connect(fuente)
+    duck.execute("CREATE TABLE brecha AS SELECT range AS id, range * 1.5 AS gap, "
+                 "'c' || range AS nombre FROM range(7)")
+    duck.close()
+
+    assert origen.push_from_duckdb(fuente, "brecha", "brecha", batch_size=3, staging=True)
+    # Segunda publicación: reemplaza (no agrega) y no deja la tabla de staging
+    assert origen.push_from_duckdb(fuente, "SELECT * FROM brecha WHERE id < 4", "brecha",
+                                   batch_size=3, staging=True)
+
+    from sqlalchemy import inspect, text
+    filas = origen.connection.execute(text("SELECT id, gap, nombre FROM brecha ORDER BY id")).fetchall()
+    assert [tuple(f) for f in filas] == [(i, pytest.approx(i * 1.5), f"c{i}") for i in range(4)]
+    assert not inspect(origen.connection).has_table("brecha_staging")
+
+    # Sin staging: agrega a la tabla existente
+    assert origen.push_from_duckdb(fuente, "SELECT * FROM brecha WHERE id >= 4", "brecha", batch_size=2)
+    assert origen.connection.execute(text("SELECT COUNT(*) FROM brecha")).scalar() == 7
@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Codificación TopoJSON de polígonos con arcos compartidos
+
+Los corregimientos vecinos comparten bordes; en GeoJSON cada borde se
+escribe dos veces (una por polígono). En TopoJSON cada borde se guarda una
+sola vez como "arco" y los polígonos referencian arcos por índice (~i para
+recorrerlo al revés). Además las coordenadas se cuantizan a una grilla
+entera y se codifican como diferencias (delta), que son números cortos.
+
+Pasos de codificar():
+    1. Cuantizar coordenadas: entero = round((x - x0) / escala)
+    2. Encontrar uniones: puntos donde un anillo se encuentra con vecinos
+       distintos (donde un borde compartido empieza o termina)
+    3. Cortar cada anillo en las uniones
+    4. Deduplicar arcos (mismo recorrido en cualquier sentido)
+    5. Codificar cada arco con deltas
+
+Uso:
+    from topologia import codificar, DECODIFICADOR_JS
+
+    topo = codificar(geoms, propiedades, escala=1e-5, nombre="corregimientos")
+    json.dump(topo, open("corregimientos.topojson", "w"))
+
+DECODIFICADOR_JS define topoFeatures(topo, nombre) → FeatureCollection
+GeoJSON para decodificar en el navegador sin dependencias externas.
+"""
+
+import numpy as np
+
+# Función JS que reconstruye la FeatureCollection a partir de la topología
+DECODIFICADOR_JS = """
+function topoFeatures(topo, nombre) {
+    var t = topo.transform;
+    var arcos = topo.arcs.map(function(arco) {
+        var x = 0, y = 0;
+        return arco.map(function(p) {
+            x += p[0]; y += p[1];
+            return [x * t.scale[0] + t.translate[0], y * t.scale[1] + t.translate[1]];
+        });
+    });
+    function anillo(ids) {
+        var puntos = [];
+        ids.forEach(function(i, k) {
+            var arco = i >= 0 ? arcos[i] : arcos[~i].slice().reverse();
+            puntos = puntos.concat(k ? arco.slice(1) : arco);
+        });
+        return puntos;
+    }
+    function geometria(g) {
+        if (g.type === 'Polygon') return {type: 'Polygon', coordinates: g.arcs.map(anillo)};
+        if (g.type === 'MultiPolygon') return {
+            type: 'MultiPolygon',
+            coordinates: g.arcs.map(function(p) { return p.map(anillo); })
+        };
+        return null;
+    }
+    return {
+        type: 'FeatureCollection',
+        features: topo.objects[nombre].geometries.map(function(g) {
+            return {type: 'Feature', id: g.id, properties: g.properties || {}, geometry: geometria(g)};
+        })
+    };
+}
+"""
+
+
+def _anillos(geom):
+    """Polígonos de la geometría como listas de anillos (arrays Nx2)"""
+    import shapely
+
+    if geom is None or shapely.is_empty(geom):
+        return None, []
+    tipo = shapely.get_type_id(geom)
+    if tipo == 3:  # Polygon
+        poligonos = [geom]
+    elif tipo == 6:  # MultiPolygon
+        poligonos = list(geom.geoms)
+    else:
+        raise ValueError(f"Geometría no soportada: {geom.geom_type}")
+    return ("Polygon" if tipo == 3 else "MultiPolygon"), [
+        [np.asarray(p.exterior.coords)[:, :2]] + [np.asarray(r.coords)[:, :2] for r in p.interiors]
+        for p in poligonos
+    ]
+
+
+def _cuantizar(coords, x0, y0, escala):
+    """Anillo cuantizado como tupla de puntos enteros, sin repetidos consecutivos"""
+    q = np.round((coords - (x0, y0)) / escala).astype(np.int64)
+    if len(q) > 1:
+        q = q[np.r_[True, np.any(q[1:] != q[:-1], axis=1)]]
+    puntos = list(map(tuple, q.tolist()))
+    if puntos and puntos[0] != puntos[-1]:
+        puntos.append(puntos[0])
+    return puntos
+
+
+def _uniones(anillos) -> set:
+    """Puntos donde un anillo se encuentra con vecinos distintos"""
+    vecinos = {}
+    uniones = set()
+    for anillo in anillos:
+        n = len(anillo) - 1  # el último punto repite el primero
+        for i in range(n):
+            punto = anillo[i]
+            a, b = anillo[i - 1], anillo[i + 1]
+            par = (a, b) if a <= b else (b, a)
+            previo = vecinos.setdefault(punto, par)
+            if previo != par:
+                uniones.add(punto)
+    return uniones
+
+
+def _rotar_minimo(puntos):
+    """Anillo cerrado rotado para empezar en su punto mínimo (forma canónica)"""
+    abierto = puntos[:-1]
+    k = abierto.index(min(abierto))
+    rotado = abierto[k:] + abierto[:k]
+    return rotado + [rotado[0]]
+
+
+def codificar(geoms, propiedades=None, escala: float = 1e-5, nombre: str = "corregimientos",
+              ids=None) -> dict:
+    """
+    Topología TopoJSON de una secuencia de Polygon/MultiPolygon.
+
+    escala es el paso de la grilla en unidades de las coordenadas (1e-5
+    grados ≈ 1 m); propiedades e ids son listas paralelas a geoms.
+    """
+    geoms = list(geoms)
+    propiedades = propiedades or [{} for _ in geoms]
+    ids = ids if ids is not None else list(range(len(geoms)))
+
+    estructuras = [_anillos(g) for g in geoms]
+    todos = np.vstack([a for _, polys in estructuras for p in polys for a in p]) if geoms else np.zeros((0, 2))
+    x0, y0 = (todos.min(axis=0) if len(todos) else (0.0, 0.0))
+    x0 = float(np.floor(x0 / escala) * escala)
+    y0 = float(np.floor(y0 / escala) * escala)
+
+    # 1. Cuantizar (los anillos que colapsan a menos de 4 puntos se descartan)
+    cuantizadas = []
+    for tipo, polys in estructuras:
+        nuevos = []
+        for p in polys:
+            anillos = [_cuantizar(a, x0, y0, escala) for a in p]
+            if len(anillos[0]) < 4:
+                continue
+            nuevos.append([a for a in anillos if len(a) >= 4])
+        cuantizadas.append((tipo, nuevos))
+
+    # 2. Uniones entre todos los anillos
+    uniones = _uniones(a for _, polys in cuantizadas for p in polys for a in p)
+
+    # 3-4. Cortar y deduplicar
+    indice = {}
+    arcos = []
+
+    def registrar(arco):
+        clave = tuple(arco)
+        if clave in indice:
+            return indice[clave]
+        inversa = clave[::-1]
+        if inversa in indice:
+            return ~indice[inversa]
+        indice[clave] = len(arcos)
+        arcos.append(arco)
+        return indice[clave]
+
+    def cortar(anillo):
+        abierto = anillo[:-1]
+        cortes = [i for i, p in enumerate(abierto) if p in uniones]
+        if not cortes:
+            # Anillo sin uniones (isla, o enclave idéntico al hueco del vecino)
+            canonico = _rotar_minimo(anillo)
+            inverso = _rotar_minimo(anillo[::-1])
+            if tuple(inverso) in indice and tuple(canonico) not in indice:
+                return [~indice[tuple(inverso)]]
+            return [registrar(canonico)]
+        k = cortes[0]
+        rotado = abierto[k:] + abierto[:k]
+        rotado.append(rotado[0])
+        posiciones = [i - k for i in cortes] + [len(rotado) - 1]
+        return [registrar(rotado[a:b + 1]) for a, b in zip(posiciones, posiciones[1:])]
+
+    geometrias = []
+    for (tipo, polys), props, gid in zip(cuantizadas, propiedades, ids):
+        g = {"id": gid, "properties": props}
+        if not polys:
+            g["type"] = None
+        elif tipo == "Polygon":
+            g["type"] = "Polygon"
+            g["arcs"] = [cortar(a) for a in polys[0]]
+        else:
+            g["type"] = "MultiPolygon"
+            g["arcs"] = [[cortar(a) for a in p] for p in polys]
+        geometrias.append(g)
+
+    # 5. Codificación delta
+    arcos_delta = []
+    for arco in arcos:
+        a = np.asarray(arco, dtype=np.int64)
+        a[1:] = np.diff(a, axis=0)
+        arcos_delta.append(a.tolist())
+
+    return {
+        "type": "Topology",
+        "transform": {"scale": [escala, escala], "translate": [x0, y0]},
+        "objects": {nombre: {"type": "GeometryCollection", "geometries": geometrias}},
+        "arcs": arcos_delta,
+    }
+
+
+def decodificar(topo: dict, nombre: str = "corregimientos") -> list:
+    """Geometrías shapely de un objeto de la topología (equivalente a topoFeatures)"""
+    import shapely
+
+    sx, sy = topo["transform"]["scale"]
+    tx, ty = topo["transform"]["translate"]
+    arcos = [np.cumsum(np.asarray(a, dtype=np.int64), axis=0) * (sx, sy) + (tx, ty)
+             for a in topo["arcs"]]
+
+    def anillo(ids):
+        partes = [arcos[i] if i >= 0 else arcos[~i][::-1] for i in ids]
+        return np.vstack([partes[0]] + [p[1:] for p in partes[1:]])
+
+    geoms = []
+    for g in topo["objects"][nombre]["geometries"]:
+        if g.get("type") == "Polygon":
+            anillos = [anillo(a) for a in g["arcs"]]
+            geoms.append(shapely.Polygon(anillos[0], anillos[1:]))
+        elif g.get("type") == "MultiPolygon":
+            polys = [[anillo(a) for a in p] for p in g["arcs"]]
+            geoms.append(shapely.MultiPolygon([shapely.Polygon(p[0], p[1:]) for p in polys]))
+        else:
+            geoms.append(None)
+    return geoms